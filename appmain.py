@@ -1,12 +1,8 @@
 import os
-import ssl
-import boto3
-from botocore.exceptions import ClientError
 import json
 import chainlit as cl
 from datetime import datetime
 import logging
-import pyodbc
 import asyncio
 import uuid
 from typing import List, Dict, Any, Optional
@@ -14,12 +10,12 @@ from typing import List, Dict, Any, Optional
 import re
 from dotenv import load_dotenv
 from modules.session_manager import SessionHistoryManager
-from modules.bedrock_client import BedrockChatClient
+from modules.chat_context import build_contextual_task
+from modules.stream_utils import stream_text
+from modules.log_setup import install_signal_toggle
 from modules.autogen_manager import AutoGenTeamManager
 from modules.login  import login
 from utils.jsonhelp  import save_session_history_to_json
-from autogen_agentchat.messages import TextMessage, ToolCallSummaryMessage
-from autogen_core.models._types import SystemMessage, UserMessage, AssistantMessage
 # 加载环境变量
 load_dotenv()
 import chainlit as cl
@@ -63,6 +59,8 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+# SOP 模块在工作线程中懒加载，SIGUSR1 日志级别切换需在这里（主线程）安装
+install_signal_toggle()
 
 # 配置SQLAlchemy Data Layer使用SQLite with aiosqlite
 
@@ -90,56 +88,11 @@ def get_user_metadata(user):
 
 # 初始化组件
 autogen_manager = AutoGenTeamManager()
+# 首个会话开始时是否在后台预热团队模块
+SOP_WARM_UP = os.getenv("SOP_WARM_UP", "1") == "1"
+_warm_up_task = None
 sessionHistoryManager= SessionHistoryManager()
 
-def build_contextual_task(current_message: str, conversation_history: list) -> str:
-    """
-    构建包含上下文的任务描述，用于AutoGen工作流
-    """
-    try:
-        # 获取最近的相关对话（最多查看最近5轮对话）
-        relevant_context = []
-        recent_messages = conversation_history[-10:] if conversation_history else []
-        
-        # 寻找包含工作流结果的历史消息
-        for msg in recent_messages:
-            if msg.get('role') == 'assistant':
-                content = msg.get('content', '')
-                # 检查是否包含数据分析结果或查询结果
-                if any(indicator in content.lower() for indicator in [
-                    '数据分析结果', '查询结果', '物料', 'ncm', '供应商', 
-                    'defectivepartmaterialnumber', 'ncmcount', '次数', '统计'
-                ]):
-                    relevant_context.append(content)
-                    break  # 只需要最近一次的工作流结果
-        
-        # 构建上下文任务
-        if relevant_context:
-            context_summary = relevant_context[0]
-            # 截取重要信息，避免太长
-            if len(context_summary) > 500:
-                context_summary = context_summary[:500] + "..."
-                
-            contextual_task = f"""
-基于之前的分析结果，用户现在有进一步的请求。
-
-之前的分析结果概要：
-{context_summary}
-
-用户的新请求：
-{current_message}
-
-请基于之前的分析结果，针对用户的新请求提供相应的查询和分析。如果用户需要更详细的数据，请提供完整的查询结果。如果用户需要进一步分析，请基于现有数据进行深入分析。
-"""
-            return contextual_task
-        else:
-            # 如果没有相关上下文，返回原始消息
-            return current_message
-            
-    except Exception as e:
-        logger.warning(f"Failed to build contextual task: {e}")
-        return current_message
-
 async def rebuild_context_from_thread():
     """从当前线程重建对话上下文"""
     try:
@@ -220,6 +173,11 @@ async def start():
     user_id = get_user_identifier(user)
     
     logger.info(f"Chat started for user: {user_id}")
+
+    # 团队模块在首次使用时才导入；用户开始会话时在后台预热，首个问题不必等待导入
+    global _warm_up_task
+    if SOP_WARM_UP and _warm_up_task is None:
+        _warm_up_task = asyncio.create_task(autogen_manager.warm_up())
     
     # 生成线程ID
     import uuid
@@ -305,16 +263,39 @@ async def message_handler(message: cl.Message):
 
        # 构建包含上下文的完整任务描述
         context_task = build_contextual_task(user_message, messages)
-        workflow_result = await autogen_manager.run_team_workflow(context_task, messages)
+
+        # 团队运行期间实时推送：工具进度追加在loading提示下方，答案第一个token到达时替换掉loading内容
+        answer_streamed = False
+
+        async def on_progress(text: str):
+            if not answer_streamed:
+                await assistant_message.stream_token(f"{text}\n")
+
+        async def on_token(text: str):
+            nonlocal answer_streamed
+            if not answer_streamed:
+                answer_streamed = True
+                assistant_message.content = ""
+                await assistant_message.update()
+            await assistant_message.stream_token(text)
+
+        workflow_result = await autogen_manager.run_team_workflow(
+            context_task, messages, on_token=on_token, on_progress=on_progress
+        )
         #workflow_result = "sdfsfdtestttttttttttttttttttttttttttttttttttttttttttttttttttttttttttttttttttttttttttttt"
-        
-        # 清空loading内容，显示真正的答案
-        assistant_message.content = ""
-        await assistant_message.update()
 
-        #await assistant_message.stream_token(workflow_result)
-        # 🎯 使用新的图表处理功能
-        await process_response_with_charts(workflow_result, assistant_message) 
+        if answer_streamed and "[CHART_START]" not in workflow_result:
+            # 答案已流式输出，以最终提取的答案为准校正内容，再补充自动图表
+            assistant_message.content = workflow_result
+            await send_auto_chart(workflow_result)
+        else:
+            # 清空loading内容，显示真正的答案
+            assistant_message.content = ""
+            await assistant_message.update()
+
+            #await assistant_message.stream_token(workflow_result)
+            # 🎯 使用新的图表处理功能
+            await process_response_with_charts(workflow_result, assistant_message) 
         #full_response = f"🔍 **检测到数据查询/分析请求，正在启动专业团队工作流...**\n\n📊 **团队成员**: Manager → SQL专家 → 数据分析师\n\n✅ **工作流处理完成**\n\n📋 **分析结果**:\n{workflow_result}"
         
         # 完成响应
@@ -387,6 +368,18 @@ if __name__ == "__main__":
 # 🎨 图表处理功能
 # ===============================
 
+async def send_auto_chart(response_text: str):
+    """没有图表标记时，尝试从纯文本自动解析生成一个简单柱状图"""
+    print("No charts found, attempting auto chart generation from text")
+    auto_cfg = attempt_auto_chart_from_text(response_text)
+    if auto_cfg:
+        fig = convert_echarts_to_plotly(auto_cfg)
+        if fig:
+            await cl.Message(content=" ", elements=[cl.Plotly(figure=fig, display="inline")]).send()
+            print("Auto-generated chart sent")
+    else:
+        print("Auto chart generation failed or no suitable data")
+
 async def process_response_with_charts(response_text: str, assistant_message: cl.Message):
     
     # 🔍 调试信息
@@ -401,20 +394,9 @@ async def process_response_with_charts(response_text: str, assistant_message: cl
     print(f"Found {len(charts)} charts")
     
     if not charts:
-        # 没有图表，尝试从纯文本自动解析生成一个简单柱状图
-        print("No charts found, attempting auto chart generation from text")
-        auto_cfg = attempt_auto_chart_from_text(response_text)
-        if auto_cfg:
-            fig = convert_echarts_to_plotly(auto_cfg)
-            if fig:
-                await cl.Message(content=" ", elements=[cl.Plotly(figure=fig, display="inline")]).send()
-                print("Auto-generated chart sent")
-        else:
-            print("Auto chart generation failed or no suitable data")
+        await send_auto_chart(response_text)
         # 正常流式输出原文本
-        for ch in response_text:
-            await assistant_message.stream_token(ch)
-            await asyncio.sleep(0.005)
+        await stream_text(assistant_message, response_text)
         return
     
     # 🔧 手动分割处理图表和文本
@@ -431,9 +413,7 @@ async def process_response_with_charts(response_text: str, assistant_message: cl
             if text_part.strip():
                 print(f"Processing text part: {len(text_part)} chars")
                 # 流式输出文本
-                for ch in text_part:
-                    await assistant_message.stream_token(ch)
-                    await asyncio.sleep(0.005)
+                await stream_text(assistant_message, text_part)
         
         # 处理图表部分
         chart_data = match.group(1)
@@ -477,9 +457,7 @@ async def process_response_with_charts(response_text: str, assistant_message: cl
         text_part = response_text[current_pos:]
         if text_part.strip():
             print(f"Processing final text part: {len(text_part)} chars")
-            for ch in text_part:
-                await assistant_message.stream_token(ch)
-                await asyncio.sleep(0.005)
+            await stream_text(assistant_message, text_part)
     
     print("=== 图表处理完成 ===\n")
 
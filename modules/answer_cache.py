@@ -0,0 +1,89 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from modules.sheet_cache import sheet_cache
+from modules.domain_index import COST_WORKBOOK_PATH
+from modules.fast_path import extract_slots
+
+logger = logging.getLogger(__name__)
+
+CACHE_MARKER = "📦 以下结果来自缓存（生成于 {created_at}，数据版本未变化）"
+
+
+class AnswerCache:
+    """团队工作流答案缓存：按规范化后的任务键存储，带 TTL 过期与 LRU 容量淘汰"""
+
+    def __init__(self, ttl_seconds: float = 600, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> tuple | None:
+        """命中时返回 (答案, 写入时间戳)"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now - entry[1] > self.ttl_seconds:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: tuple, answer: str) -> None:
+        with self._lock:
+            self._entries[key] = (answer, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+def normalize_task(question: str, file_path: str = COST_WORKBOOK_PATH) -> tuple | None:
+    """
+    把问题规范化为缓存键：财年、场景、职能、CC、BL 的解析结果 + 剩余文本 + 工作簿版本。
+    财年、场景、职能未能唯一确定时，问题多半依赖上下文（如“那26财年呢”），返回 None 不缓存。
+    """
+    try:
+        slots = extract_slots(question, file_path)
+        version = sheet_cache.file_version(file_path)
+    except Exception as e:
+        logger.warning(f"问题规范化失败，不使用答案缓存: {e}")
+        return None
+    if any(len(slots[name]) != 1 for name in ("years", "scenarios", "functions")):
+        return None
+    return (
+        next(iter(slots["years"])),
+        next(iter(slots["scenarios"])),
+        next(iter(slots["functions"])),
+        tuple(sorted(slots["ccs"])),
+        tuple(sorted(slots["bls"])),
+        slots["residual"],
+        version,
+    )
+
+
+def mark_cached(answer: str, created_at: float) -> str:
+    created = datetime.fromtimestamp(created_at).strftime("%Y-%m-%d %H:%M:%S")
+    return CACHE_MARKER.format(created_at=created) + "\n\n" + answer
+
+
+answer_cache = AnswerCache(
+    ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", "600")),
+    max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256")),
+)
@@ -1,8 +1,14 @@
+import os
+import sys
 import logging
+import importlib
 
 # from autogenstudio.teammanager import TeamManager
 # from modules.sop_team import run_sop_team
-from modules.CostAnalyst import run_Cost_sop_team
+from modules.fast_path import answer_allocation_question
+from modules.answer_cache import answer_cache, normalize_task, mark_cached
+from modules.executors import run_io, loop_lag_monitor
+from modules.metrics import request_trace, record_cache_hit, span
 from dotenv import load_dotenv
 
 # 加载环境变量
@@ -11,6 +17,22 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 常见分摊类问题是否走确定性快速通道（不调用大模型）
+ALLOCATION_FAST_PATH = os.getenv("ALLOCATION_FAST_PATH", "1") == "1"
+# 是否对团队工作流的答案做缓存（键为规范化后的问题 + 工作簿版本）
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+
+
+async def load_cost_sop_team():
+    """
+    首次使用时才导入成本 SOP 团队（autogen/openai 客户端与智能体定义导入较慢），
+    在线程中导入，避免阻塞事件循环；之后直接从 sys.modules 取得。
+    """
+    module = sys.modules.get("modules.CostAnalyst")
+    if module is None:
+        module = await run_io(importlib.import_module, "modules.CostAnalyst")
+    return module.run_Cost_sop_team
+
 
 # AutoGen Studio团队管理器
 class AutoGenTeamManager:
@@ -23,42 +45,78 @@ class AutoGenTeamManager:
     # logger.error(f"Failed to initialize TeamManager: {e}")
     # self.team_manager = None
 
-    async def run_team_workflow(self, task: str, context_messages: list = None) -> str:
-        """运行AutoGen团队工作流"""
+    async def warm_up(self) -> None:
+        """后台预先导入团队模块并创建模型客户端，使首个问题不必承担导入开销"""
         try:
-            logger.info(f"Running AutoGen team workflow for task: {task[:50]}...")
-
-            # 检查team_manager是否初始化成功
-            # if not hasattr(self, 'team_manager') or self.team_manager is None:
-            #    return "❌ AutoGen工作流未初始化，请检查配置。可能原因：\n1. TeamManager导入失败\n2. 配置文件缺失\n3. 依赖包未安装"
-
-            # 构建包含上下文的任务描述
-            if context_messages and len(context_messages) > 1:
-                last_user_msg = None
-                for msg in reversed(context_messages[:-1]):
-                    if msg.get("role") == "user":
-                        last_user_msg = msg.get("content", "")[:100]
-                        break
-
-                if last_user_msg:
-                    full_task = (
-                        f"基于上一轮对话: {last_user_msg}...\n\n当前任务: {task}"
-                    )
-                else:
-                    full_task = task
-            else:
-                full_task = task
+            await load_cost_sop_team()
+            sys.modules["modules.CostAnalyst"].get_model_client()
+        except Exception as e:
+            logger.warning(f"SOP team warm-up failed: {e}")
 
-            # 运行工作流
-            # result = await self.team_manager.run(
-            #     task=full_task,
-            #     team_config=self.team_config_path
-            # )
-            # 提取最终答案
-            # final_answer = self.extract_final_answer(str(result))
-            final_answer = await run_Cost_sop_team(full_task)
+    async def run_team_workflow(self, task: str, context_messages: list = None, on_token=None, on_progress=None) -> str:
+        """
+        运行AutoGen团队工作流。on_token / on_progress 会透传给团队，用于把答案 token 和工具进度实时推送给前端；
+        命中缓存或快速通道时不会回调，调用方需自行输出返回的完整答案。
+        """
+        try:
+            with request_trace("sop_request"):
+                logger.info(f"Running AutoGen team workflow for task: {task[:50]}...")
+                loop_lag_monitor.ensure_started()
+
+                # 检查team_manager是否初始化成功
+                # if not hasattr(self, 'team_manager') or self.team_manager is None:
+                #    return "❌ AutoGen工作流未初始化，请检查配置。可能原因：\n1. TeamManager导入失败\n2. 配置文件缺失\n3. 依赖包未安装"
+
+                question = context_messages[-1].get("content", task) if context_messages else task
+
+                # 答案缓存：只缓存财年、场景、职能都能从当前这句话中确定的问题
+                cache_key = None
+                if ANSWER_CACHE_ENABLED:
+                    with span("answer_cache", "lookup"):
+                        cache_key = await run_io(normalize_task, question)
+                        cached = answer_cache.get(cache_key) if cache_key else None
+                    if cached:
+                        record_cache_hit("answer")
+                        logger.info(f"Answer cache hit, team workflow skipped: {answer_cache.stats()}")
+                        return mark_cached(*cached)
+
+                # 快速通道只解析用户当前这句话，歧义或无数据时返回 None，继续走团队工作流
+                if ALLOCATION_FAST_PATH:
+                    with span("fast_path", "allocation") as attrs:
+                        fast_answer = await run_io(answer_allocation_question, question)
+                        attrs["answered"] = bool(fast_answer)
+                    if fast_answer:
+                        logger.info("Answered by allocation fast path, team workflow skipped")
+                        return fast_answer
+
+                # task 已由 chat_context.build_contextual_task 按 token 预算拼接好上下文，这里不再追加历史
+                full_task = task
 
-            return final_answer
+                # 运行工作流
+                # result = await self.team_manager.run(
+                #     task=full_task,
+                #     team_config=self.team_config_path
+                # )
+                # 提取最终答案
+                # final_answer = self.extract_final_answer(str(result))
+                with span("team", "cost_sop"):
+                    run_Cost_sop_team = await load_cost_sop_team()
+                    final_answer = await run_Cost_sop_team(full_task, on_token=on_token, on_progress=on_progress)
+                logger.info(f"Event loop lag: {loop_lag_monitor.stats()}")
+
+                # retry_policy 依赖 autogen，随成本团队一起加载后再导入
+                from modules.retry_policy import RETRY_FAILURE_PREFIX
+
+                # 未得到答案或重试预算耗尽的答复不缓存，数据更新或模型状态变化后再问可能成功
+                if (
+                    cache_key
+                    and final_answer
+                    and final_answer != "未能获取到最终答案"
+                    and not final_answer.startswith(RETRY_FAILURE_PREFIX)
+                ):
+                    answer_cache.put(cache_key, final_answer)
+
+                return final_answer
 
         except Exception as e:
             logger.error(f"AutoGen workflow error: {e}")
@@ -1,57 +1,131 @@
+import os
+import re
 import logging
 import chainlit as cl
+from modules.token_counter import count_tokens
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
-def build_contextual_task(current_message: str, conversation_history: list) -> str:
-    """
-    构建包含上下文的任务描述，用于AutoGen工作流
-    """
-    try:
-        # 获取最近的相关对话（最多查看最近5轮对话）
-        relevant_context = []
-        recent_messages = conversation_history[-10:] if conversation_history else []
-        
-        # 寻找包含工作流结果的历史消息
-        for msg in recent_messages:
-            if msg.get('role') == 'assistant':
-                content = msg.get('content', '')
-                # 检查是否包含数据分析结果或查询结果
-                if any(indicator in content.lower() for indicator in [
-                    '数据分析结果', '查询结果', '物料', 'ncm', '供应商', 
-                    'defectivepartmaterialnumber', 'ncmcount', '次数', '统计'
-                ]):
-                    relevant_context.append(content)
-                    break  # 只需要最近一次的工作流结果
-        
-        # 构建上下文任务
-        if relevant_context:
-            context_summary = relevant_context[0]
-            # 截取重要信息，避免太长
-            if len(context_summary) > 500:
-                context_summary = context_summary[:500] + "..."
-                
-            contextual_task = f"""
-基于之前的分析结果，用户现在有进一步的请求。
-
-之前的分析结果概要：
-{context_summary}
+# 拼接给团队工作流的上下文总 token 预算（含当前请求与模板）
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# 单条历史消息压缩后的 token 上限
+CONTEXT_TURN_TOKENS = int(os.getenv("CONTEXT_TURN_TOKENS", "300"))
+# 剩余预算低于该值时不再加入更早的消息（过短的摘要没有意义）
+MIN_SUMMARY_TOKENS = 30
+
+CONTEXT_TEMPLATE = """
+基于之前的对话，用户现在有进一步的请求。
+
+之前的对话（由远及近，已按长度压缩）：
+{history}
 
 用户的新请求：
 {current_message}
 
 请基于之前的分析结果，针对用户的新请求提供相应的查询和分析。如果用户需要更详细的数据，请提供完整的查询结果。如果用户需要进一步分析，请基于现有数据进行深入分析。
 """
-            return contextual_task
+
+ROLE_LABELS = {"user": "用户", "assistant": "助手"}
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """按 token 数截断文本（二分查找截断位置），截断时末尾加省略号"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid]) + 1 <= max_tokens:
+            low = mid
         else:
-            # 如果没有相关上下文，返回原始消息
+            high = mid - 1
+    return text[:low] + "…"
+
+
+def summarize_message(content: str, max_tokens: int) -> str:
+    """
+    抽取式压缩历史消息：保留首行（通常是结论/标题），再按顺序补充含数字的行（关键数据），
+    其余行丢弃，整体不超过 max_tokens。
+    """
+    if count_tokens(content) <= max_tokens:
+        return content
+    lines = [line.strip() for line in content.splitlines() if line.strip()]
+    if not lines:
+        return ""
+    kept = [truncate_to_tokens(lines[0], max_tokens)]
+    used = count_tokens(kept[0])
+    for line in lines[1:]:
+        if not re.search(r"\d", line):
+            continue
+        cost = count_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept) + " …"
+
+
+class ContextBuilder:
+    """
+    按 token 预算拼接对话上下文：当前请求始终完整保留；历史消息由近及远逐条加入，
+    用户消息截断、助手回复做抽取式摘要，每条不超过 turn_tokens 与剩余预算，预算用尽后丢弃更早的消息。
+    """
+
+    def __init__(self, budget_tokens: int = CONTEXT_TOKEN_BUDGET, turn_tokens: int = CONTEXT_TURN_TOKENS):
+        self.budget_tokens = budget_tokens
+        self.turn_tokens = turn_tokens
+
+    def build(self, current_message: str, conversation_history: list) -> str:
+        history = [
+            msg for msg in (conversation_history or [])
+            if msg.get("role") in ROLE_LABELS and msg.get("content")
+        ]
+        # chat_resumed 返回的历史以当前用户消息结尾，不重复计入
+        if history and history[-1]["role"] == "user" and current_message in history[-1]["content"]:
+            history = history[:-1]
+        if not history:
             return current_message
-            
+
+        fixed_tokens = count_tokens(CONTEXT_TEMPLATE.format(history="", current_message=current_message))
+        remaining = self.budget_tokens - fixed_tokens
+        lines = []
+        for msg in reversed(history):
+            label = ROLE_LABELS[msg["role"]]
+            max_tokens = min(self.turn_tokens, remaining - 2)
+            if msg["role"] == "user":
+                text = truncate_to_tokens(msg["content"], max_tokens)
+            else:
+                text = summarize_message(msg["content"], max_tokens)
+            cost = count_tokens(text) + 2
+            if max_tokens < MIN_SUMMARY_TOKENS or cost > remaining:
+                break
+            lines.append(f"{label}：{text}")
+            remaining -= cost
+
+        if not lines:
+            return current_message
+        logger.info(
+            f"上下文拼接完成：保留 {len(lines)}/{len(history)} 条历史消息，"
+            f"约 {self.budget_tokens - remaining} / {self.budget_tokens} tokens"
+        )
+        return CONTEXT_TEMPLATE.format(history="\n".join(reversed(lines)), current_message=current_message)
+
+
+context_builder = ContextBuilder()
+
+
+def build_contextual_task(current_message: str, conversation_history: list) -> str:
+    """
+    构建包含上下文的任务描述，用于AutoGen工作流
+    """
+    try:
+        return context_builder.build(current_message, conversation_history)
     except Exception as e:
         logger.warning(f"Failed to build contextual task: {e}")
         return current_message
 
+
 async def rebuild_context_from_thread():
     """从当前线程重建对话上下文"""
     try:
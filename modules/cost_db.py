@@ -0,0 +1,247 @@
+import os
+import glob
+import queue
+import hashlib
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+import pandas as pd
+from modules.executors import run_parse
+
+logger = logging.getLogger(__name__)
+
+MIRROR_DIR = os.getenv("COST_DB_MIRROR_DIR", "cache")
+POOL_SIZE = int(os.getenv("COST_DB_POOL_SIZE", "4"))
+META_TABLE = "_mirror_meta"
+# 镜像结构版本：索引等结构变化时递增，旧版本镜像会被自动重建
+SCHEMA_VERSION = "2"
+
+# 需要维护的索引：generate_cost_rate_sql 按 Month/Year/Scenario/Key 关联 CostDataBase 与 Table7，
+# 并按 Function/CC/BL 过滤。工作表中缺少对应列时跳过该索引
+TABLE_INDEXES = {
+    "CostDataBase": [("Year", "Scenario", "Key", "Month"), ("Function",)],
+    "Table7": [("Year", "Scenario", "Key", "Month"), ("CC",), ("BL",)],
+}
+
+
+def write_mirror_file(source_path: str, tmp_path: str, version: tuple) -> int:
+    """把工作簿的全部工作表写入 tmp_path 处的 SQLite 文件（含索引、统计信息与元数据），返回工作表数量"""
+    sheets = pd.read_excel(source_path, sheet_name=None)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        for sheet_name, df in sheets.items():
+            try:
+                df.to_sql(sheet_name, conn, index=False, if_exists="replace")
+            except Exception as e:
+                logger.warning(f"工作表 {sheet_name} 导入SQLite镜像失败，已跳过: {e}")
+                continue
+            create_indexes(conn, sheet_name, df.columns)
+        conn.execute("ANALYZE")
+        conn.execute(f"CREATE TABLE {META_TABLE} (key TEXT PRIMARY KEY, value TEXT)")
+        conn.executemany(
+            f"INSERT INTO {META_TABLE} (key, value) VALUES (?, ?)",
+            [
+                ("source_path", source_path),
+                ("mtime_ns", str(version[0])),
+                ("size", str(version[1])),
+                ("built_at", datetime.now().isoformat()),
+                ("schema", SCHEMA_VERSION),
+                ("complete", "1"),
+            ],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return len(sheets)
+
+
+def create_indexes(conn: sqlite3.Connection, table_name: str, columns) -> None:
+    available = set(columns)
+    for index_columns in TABLE_INDEXES.get(table_name, []):
+        if not available.issuperset(index_columns):
+            logger.warning(f"工作表 {table_name} 缺少列 {index_columns}，跳过索引创建")
+            continue
+        index_name = "idx_" + "_".join([table_name, *index_columns]).replace(" ", "_")
+        column_list = ", ".join(f'"{col}"' for col in index_columns)
+        conn.execute(f'CREATE INDEX "{index_name}" ON "{table_name}" ({column_list})')
+
+
+class WorkbookMirror:
+    """
+    Excel 工作簿的磁盘 SQLite 镜像：每个工作表导入为一张带类型列的表，查询走只读连接池。
+    镜像文件名包含源文件的 mtime 与大小，源文件变化后会自动重建新镜像并丢弃旧连接，
+    跨进程可直接复用已构建好的镜像文件，无需再次解析 xlsx。
+    """
+
+    def __init__(self, source_path: str, mirror_dir: str = MIRROR_DIR, pool_size: int = POOL_SIZE):
+        self.source_path = os.path.abspath(source_path)
+        self.mirror_dir = mirror_dir
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._pool = queue.LifoQueue()
+        self._version = None
+        self._db_path = None
+        self.tables = frozenset()
+        self.rebuilds = 0
+
+    # ------------------------------ 版本与路径 ------------------------------ #
+    def source_version(self) -> tuple:
+        stat = os.stat(self.source_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _file_prefix(self) -> str:
+        stem = os.path.splitext(os.path.basename(self.source_path))[0]
+        path_hash = hashlib.sha1(self.source_path.encode("utf-8")).hexdigest()[:8]
+        return os.path.join(self.mirror_dir, f"{stem}-{path_hash}")
+
+    def _db_path_for(self, version: tuple) -> str:
+        return f"{self._file_prefix()}-{version[0]}-{version[1]}.sqlite"
+
+    # ------------------------------ 构建 ------------------------------ #
+    def ensure_fresh(self) -> str:
+        """确保镜像与源工作簿一致，必要时重建；返回当前镜像文件路径"""
+        version = self.source_version()
+        if version == self._version:
+            return self._db_path
+        with self._lock:
+            if version == self._version:
+                return self._db_path
+            db_path = self._db_path_for(version)
+            if not self._is_complete(db_path):
+                self._build(db_path, version)
+            self._switch_to(db_path, version)
+        return self._db_path
+
+    @staticmethod
+    def _is_complete(db_path: str) -> bool:
+        if not os.path.exists(db_path):
+            return False
+        try:
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+            try:
+                meta = dict(conn.execute(f"SELECT key, value FROM {META_TABLE}").fetchall())
+                return meta.get("complete") == "1" and meta.get("schema") == SCHEMA_VERSION
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return False
+
+    def _build(self, db_path: str, version: tuple) -> None:
+        os.makedirs(self.mirror_dir, exist_ok=True)
+        tmp_path = f"{db_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        start = datetime.now()
+        # 解析 xlsx 与写入 SQLite 在解析进程中完成，不占用当前进程的 GIL
+        sheet_count = run_parse(write_mirror_file, self.source_path, tmp_path, version)
+        try:
+            os.replace(tmp_path, db_path)
+        except OSError:
+            # 其他进程已生成同版本镜像且正在使用（Windows 下无法覆盖），直接复用
+            os.remove(tmp_path)
+            if not self._is_complete(db_path):
+                raise
+        self.rebuilds += 1
+        elapsed = (datetime.now() - start).total_seconds()
+        logger.info(f"SQLite镜像构建完成: {db_path}，共 {sheet_count} 个工作表，耗时 {elapsed:.2f}s")
+
+    def _switch_to(self, db_path: str, version: tuple) -> None:
+        old_path = self._db_path
+        conn = self._open(db_path)
+        try:
+            names = conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name != ? AND name NOT LIKE 'sqlite_%'",
+                (META_TABLE,),
+            ).fetchall()
+        finally:
+            conn.close()
+        self._drain_pool()
+        self.tables = frozenset(name for (name,) in names)
+        self._db_path = db_path
+        self._version = version
+        self._remove_stale_files(keep=db_path, also=old_path)
+
+    def _remove_stale_files(self, keep: str, also: str | None) -> None:
+        candidates = set(glob.glob(f"{self._file_prefix()}-*.sqlite"))
+        if also:
+            candidates.add(also)
+        for path in candidates - {keep}:
+            try:
+                os.remove(path)
+            except OSError:
+                # 其他进程仍在使用旧镜像，留待下次清理
+                pass
+
+    # ------------------------------ 连接池 ------------------------------ #
+    @staticmethod
+    def _open(db_path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def _drain_pool(self) -> None:
+        while True:
+            try:
+                _, conn = self._pool.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        """借出一个只读连接，用完归还连接池；镜像重建后旧连接会被丢弃"""
+        db_path = self.ensure_fresh()
+        try:
+            owner, conn = self._pool.get_nowait()
+            if owner != db_path:
+                conn.close()
+                conn = self._open(db_path)
+        except queue.Empty:
+            conn = self._open(db_path)
+        try:
+            yield conn
+        finally:
+            if db_path == self._db_path and self._pool.qsize() < self.pool_size:
+                self._pool.put((db_path, conn))
+            else:
+                conn.close()
+
+    def query(self, sql: str) -> pd.DataFrame:
+        with self.connection() as conn:
+            return pd.read_sql_query(sql, conn)
+
+    def query_page(self, sql: str, offset: int = 0, limit: int = 100) -> tuple:
+        """
+        流式执行查询，只把 [offset, offset + limit) 范围内的行物化为 DataFrame，
+        其余行逐批读取后仅计数。返回 (当前页 DataFrame, 总行数)。
+        """
+        with self.connection() as conn:
+            cursor = conn.execute(sql)
+            columns = [col[0] for col in cursor.description or []]
+            total, rows = 0, []
+            while True:
+                batch = cursor.fetchmany(1000)
+                if not batch:
+                    break
+                start, end = offset - total, offset + limit - total
+                if end > 0 and start < len(batch):
+                    rows.extend(batch[max(start, 0) : end])
+                total += len(batch)
+            cursor.close()
+        return pd.DataFrame.from_records(rows, columns=columns), total
+
+
+_mirrors = {}
+_mirrors_lock = threading.Lock()
+
+
+def get_mirror(file_path: str) -> WorkbookMirror:
+    """返回工作簿对应的进程级镜像实例（按绝对路径复用）"""
+    abs_path = os.path.abspath(file_path)
+    with _mirrors_lock:
+        mirror = _mirrors.get(abs_path)
+        if mirror is None:
+            mirror = WorkbookMirror(abs_path)
+            _mirrors[abs_path] = mirror
+        return mirror
+
@@ -0,0 +1,53 @@
+# Cost_sop_team 的流程路由表：单独成模块，不依赖模型客户端配置，可直接导入测试
+from modules.sop_router import Transition, START, END, transfer_markers, transfer_transitions
+from modules.intent_rules import COST_DATA_CATEGORY, rule_classified_cost_data
+
+COST_SOP_AGENTS = ["intention_analyst", "excel_sql_specialist", "multi_domain_analyst", "data_analyst"]
+
+COST_SOP_MARKERS = {
+    **transfer_markers(COST_SOP_AGENTS),
+    "final": ["FINAL:RETURN"],
+    "cost_data": [f"CATEGORY:{COST_DATA_CATEGORY}"],
+    "sql_success": ["SQL_DONE", "查询成功"],
+    "sql_error": ["错误", "error", "查询过程中出现错误"],
+    "sql_empty": ["结果为空", "返回 0 行"],
+}
+
+# 成本 SOP 流程：按发言者分组、组内按顺序匹配
+COST_SOP_TRANSITIONS = [
+    Transition(START, "Manager", note="SOP流程开始 - 第一个消息，选择Manager"),
+    Transition("user", "Manager", note="用户消息 → 选择Manager处理"),
+    Transition(
+        "Manager",
+        "excel_sql_specialist",
+        exclude=("final",),
+        guard=rule_classified_cost_data,
+        note="规则分类命中 → 跳过 intention_analyst，直接进入 excel_sql_specialist",
+    ),
+    *transfer_transitions(COST_SOP_AGENTS),
+    Transition("Manager", END, require=("final",), note="Manager发出FINAL:RETURN - 流程结束"),
+    # intention_analyst 完成后，根据分类结果进入 excel_sql_specialist
+    Transition(
+        "intention_analyst",
+        "excel_sql_specialist",
+        require=("cost_data",),
+        note="意图识别为成本分析需数据 → 进入 excel_sql_specialist 生成并执行SQL",
+    ),
+    Transition("intention_analyst", "Manager", note="意图识别非成本数据分析或不清 → 返回Manager处理"),
+    # excel_sql_specialist 查询成功且有数据时返回 Manager，报错或结果为空时回到 excel_sql_specialist 重试
+    Transition(
+        "excel_sql_specialist",
+        "Manager",
+        require=("sql_success",),
+        exclude=("sql_error", "sql_empty"),
+        note="excel_sql_specialist查询成功且有数据 → 返回Manager",
+    ),
+    Transition(
+        "excel_sql_specialist",
+        "excel_sql_specialist",
+        note="excel_sql_specialist查询失败或无结果 → 重新尝试生成SQL",
+    ),
+]
+
+# 报错标记忽略大小写（error / Error 均视为失败），其余标记按原样匹配
+COST_SOP_IGNORE_CASE = ("sql_error",)
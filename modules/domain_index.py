@@ -0,0 +1,142 @@
+import bisect
+import logging
+import threading
+from collections import defaultdict
+from modules.sheet_cache import sheet_cache
+
+logger = logging.getLogger(__name__)
+
+COST_WORKBOOK_PATH = "Data/Function cost allocation analysis to IT 20260104.xlsx"
+
+
+def trigrams(text: str) -> frozenset:
+    """忽略大小写的字符三元组（首尾补空格，短字符串也能产生三元组）"""
+    padded = f"  {text.casefold().strip()} "
+    return frozenset(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+class FieldDomain:
+    """
+    单个 (工作表, 字段) 的取值域：精确匹配用 frozenset，
+    另外维护大小写折叠映射与有序列表，支持忽略大小写匹配与前缀查找，
+    以及基于三元组倒排索引的模糊匹配。
+    """
+
+    def __init__(self, values):
+        self.values = frozenset(values)
+        self._folded = {}
+        for value in sorted(self.values):
+            self._folded.setdefault(value.casefold(), []).append(value)
+        self._sorted_folded = sorted(self._folded)
+        self._grams = {folded: trigrams(folded) for folded in self._folded}
+        self._postings = defaultdict(set)
+        for folded, grams in self._grams.items():
+            for gram in grams:
+                self._postings[gram].add(folded)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def contains(self, value: str) -> bool:
+        return value in self.values
+
+    def casefold_matches(self, value: str) -> list:
+        """忽略大小写后与 value 相同的原始取值"""
+        return list(self._folded.get(value.casefold(), []))
+
+    def prefix_matches(self, prefix: str, limit: int = 10) -> list:
+        """忽略大小写，以 prefix 开头的原始取值（按字典序，最多 limit 个）"""
+        folded_prefix = prefix.casefold()
+        start = bisect.bisect_left(self._sorted_folded, folded_prefix)
+        matches = []
+        for folded in self._sorted_folded[start:]:
+            if not folded.startswith(folded_prefix) or len(matches) >= limit:
+                break
+            matches.extend(self._folded[folded])
+        return matches[:limit]
+
+    def similar(self, value: str, limit: int = 5, min_score: float = 0.3) -> list:
+        """
+        三元组 Dice 相似度最高的 limit 个原始取值，返回 [(取值, 相似度)]，按相似度降序。
+        只对与 value 至少共享一个三元组的取值打分。
+        """
+        query_grams = trigrams(value)
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for folded in self._postings.get(gram, ()):
+                shared[folded] += 1
+        scored = []
+        for folded, count in shared.items():
+            score = 2 * count / (len(query_grams) + len(self._grams[folded]))
+            if score >= min_score:
+                scored.append((score, folded))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        results = []
+        for score, folded in scored:
+            for original in self._folded[folded]:
+                results.append((original, round(score, 3)))
+        return results[:limit]
+
+
+class DomainIndex:
+    """
+    工作簿的取值域索引：每个 (工作表, 字段) 在首次使用时构建一次，
+    工作簿版本（mtime/大小）变化后整体失效重建。
+    """
+
+    def __init__(self, file_path: str = COST_WORKBOOK_PATH):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = {}
+
+    def _cached(self, key: tuple, build):
+        version = sheet_cache.file_version(self.file_path)
+        with self._lock:
+            if version != self._version:
+                self._entries = {}
+                self._version = version
+            entry = self._entries.get(key)
+        if entry is not None:
+            return entry
+
+        entry = build()
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = entry
+        return entry
+
+    def domain(self, sheet_name: str, field_name: str) -> FieldDomain:
+        def build():
+            df = sheet_cache.get(self.file_path, sheet_name)
+            domain = FieldDomain(df[field_name].dropna().astype(str))
+            logger.debug(f"取值域索引已构建: {sheet_name}.{field_name}，共 {len(domain)} 个取值")
+            return domain
+
+        return self._cached(("domain", sheet_name, field_name), build)
+
+    def mapping(self, sheet_name: str, name_field: str, value_field: str) -> dict:
+        """同一工作表中 name_field 取值（大小写折叠）到 value_field 取值列表的映射，如业务线名称 → 成本中心编码"""
+
+        def build():
+            df = sheet_cache.get(self.file_path, sheet_name)[[name_field, value_field]].dropna()
+            result = defaultdict(list)
+            for name, value in zip(df[name_field].astype(str), df[value_field].astype(str)):
+                result[name.casefold()].append(value)
+            return dict(result)
+
+        return self._cached(("mapping", sheet_name, name_field, value_field), build)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_domain_index(file_path: str = COST_WORKBOOK_PATH) -> DomainIndex:
+    """返回工作簿对应的进程级取值域索引"""
+    with _indexes_lock:
+        index = _indexes.get(file_path)
+        if index is None:
+            index = DomainIndex(file_path)
+            _indexes[file_path] = index
+        return index
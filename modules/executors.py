@@ -0,0 +1,145 @@
+import os
+import time
+import asyncio
+import logging
+import functools
+import contextvars
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from modules.metrics import span
+
+logger = logging.getLogger(__name__)
+
+# 数据工具（查询/校验/计算）使用的线程数
+DATA_IO_WORKERS = int(os.getenv("DATA_IO_WORKERS", "8"))
+# 解析 xlsx / 构建镜像使用的进程数，0 表示在调用线程内直接执行
+DATA_PARSE_WORKERS = int(os.getenv("DATA_PARSE_WORKERS", "2"))
+# 单次数据工具调用的超时（秒）
+DATA_TOOL_TIMEOUT = float(os.getenv("DATA_TOOL_TIMEOUT", "60"))
+# 单次解析任务的超时（秒），整本工作簿解析较慢
+DATA_PARSE_TIMEOUT = float(os.getenv("DATA_PARSE_TIMEOUT", "300"))
+
+_io_executor = None
+_parse_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_io_executor() -> ThreadPoolExecutor:
+    global _io_executor
+    with _executor_lock:
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(max_workers=DATA_IO_WORKERS, thread_name_prefix="data-io")
+        return _io_executor
+
+
+def get_parse_executor() -> ProcessPoolExecutor | None:
+    """
+    解析用进程池：openpyxl 解析是纯 Python 计算，放在线程里仍会长时间持有 GIL 拖慢事件循环，
+    因此放到独立进程。使用 spawn 启动，避免在多线程进程中 fork。
+    """
+    global _parse_executor
+    if DATA_PARSE_WORKERS <= 0:
+        return None
+    with _executor_lock:
+        if _parse_executor is None:
+            _parse_executor = ProcessPoolExecutor(
+                max_workers=DATA_PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _parse_executor
+
+
+def run_parse(func, *args, timeout: float = None):
+    """在解析进程池中执行 func（须为可 pickle 的模块级函数）并同步等待结果"""
+    executor = get_parse_executor()
+    if executor is None:
+        return func(*args)
+    return executor.submit(func, *args).result(timeout=timeout or DATA_PARSE_TIMEOUT)
+
+
+async def run_io(func, *args, timeout: float = None, **kwargs):
+    """
+    在数据工具线程池中执行同步函数，超时抛出 asyncio.TimeoutError（线程本身无法中止，会在后台执行完）。
+    与 asyncio.to_thread 一样复制当前 contextvars，线程内仍能记录到当前请求的链路。
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    future = loop.run_in_executor(get_io_executor(), functools.partial(context.run, func, *args, **kwargs))
+    return await asyncio.wait_for(future, timeout=timeout or DATA_TOOL_TIMEOUT)
+
+
+def async_tool(func, timeout: float = None):
+    """
+    把同步工具函数包装为协程函数（签名与注解不变，FunctionTool 会直接 await），
+    在专用线程池中执行，超时返回错误信息而不是让整个团队卡住。
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        with span("tool", func.__name__) as attrs:
+            try:
+                return await run_io(func, *args, timeout=timeout, **kwargs)
+            except asyncio.TimeoutError:
+                elapsed = time.perf_counter() - started
+                attrs["timeout"] = True
+                logger.warning(f"工具 {func.__name__} 执行超时（{elapsed:.1f}s）")
+                return f"错误：工具 {func.__name__} 执行超时（超过 {timeout or DATA_TOOL_TIMEOUT:.0f} 秒），请缩小查询范围后重试"
+
+    return wrapper
+
+
+class LoopLagMonitor:
+    """
+    事件循环延迟监控：每隔 interval 秒醒来一次，实际醒来时间与预期的差值即事件循环被阻塞的时长。
+    保留最近的采样用于统计，超过阈值时记录警告。
+    """
+
+    def __init__(self, interval: float = 0.1, warn_seconds: float = 0.5, samples: int = 600):
+        self.interval = interval
+        self.warn_seconds = warn_seconds
+        self._samples = deque(maxlen=samples)
+        self._task = None
+        self.max_lag = 0.0
+        self.stalls = 0
+
+    def ensure_started(self) -> None:
+        """在当前事件循环中启动监控（已启动则忽略）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self._samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.warn_seconds:
+                self.stalls += 1
+                logger.warning(f"事件循环被阻塞 {lag:.3f}s")
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        samples = sorted(self._samples)
+        if not samples:
+            return {"samples": 0, "p50": 0.0, "p95": 0.0, "max": 0.0, "stalls": 0}
+        return {
+            "samples": len(samples),
+            "p50": round(samples[len(samples) // 2], 4),
+            "p95": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+            "max": round(self.max_lag, 4),
+            "stalls": self.stalls,
+        }
+
+
+loop_lag_monitor = LoopLagMonitor(
+    interval=float(os.getenv("LOOP_LAG_INTERVAL", "0.1")),
+    warn_seconds=float(os.getenv("LOOP_LAG_WARN_SECONDS", "0.5")),
+)
@@ -0,0 +1,169 @@
+import re
+import logging
+from modules.cost_db import get_mirror
+from modules.domain_index import COST_WORKBOOK_PATH, get_domain_index
+from modules.tools.cost_tools import (
+    generate_cost_rate_sql,
+    calculate_monthly_cost_table,
+    caculate_yearly_cost,
+)
+
+logger = logging.getLogger(__name__)
+
+# 财年月份顺序（Oct ~ Sep）
+FISCAL_MONTHS = ["Oct", "Nov", "Dec", "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep"]
+
+FISCAL_YEAR_PATTERNS = [
+    re.compile(r"(?<![A-Za-z])FY\s*(\d{2}|20\d{2})(?!\d)", re.IGNORECASE),
+    re.compile(r"(?<!\d)(\d{2}|20\d{2})\s*财年"),
+]
+
+# 别名 → 标准取值，与“解释和逻辑”工作表中的说明保持一致
+SCENARIO_ALIASES = {
+    "Actual": ["实际", "Actual", "Act"],
+    "Budget1": ["预算", "Budget1", "Budget", "BGT1", "BGT"],
+}
+FUNCTION_ALIASES = {
+    "IT": ["IT"],
+    "HR": ["HR", "人力"],
+    "Procurement": ["Procurement", "采购"],
+}
+ALLOCATION_MARKERS = ["分摊给", "分摊到", "分配给", "allocated to", "allocation to"]
+
+# 问到具体月份/季度时需要的不是全年合计，交给团队处理
+PERIOD_PATTERN = re.compile(
+    r"\d+\s*月|Q[1-4]|季度|(?<![A-Za-z])(Oct|Nov|Dec|Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep)(?![A-Za-z])",
+    re.IGNORECASE,
+)
+CC_PATTERN = re.compile(r"(?<!\d)\d{6}(?!\d)")
+
+
+def _word_pattern(words, flags=0) -> re.Pattern:
+    """
+    匹配完整单词的交替正则：英文单词两侧不能紧跟字母，中文直接匹配；
+    词后也不能紧跟数字，避免 Budget2、BGT2 等未知版本被当作 Budget1，交给团队处理
+    """
+    alternation = "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+    return re.compile(rf"(?<![A-Za-z_])(?:{alternation})(?![A-Za-z0-9_])", flags)
+
+
+def _match_aliases(question: str, aliases: dict) -> set:
+    found = set()
+    for canonical, words in aliases.items():
+        if _word_pattern(words, re.IGNORECASE).search(question):
+            found.add(canonical)
+    return found
+
+
+def _normalize_year(raw: str) -> str:
+    return f"FY{raw[-2:]}"
+
+
+def extract_slots(question: str, file_path: str = COST_WORKBOOK_PATH) -> dict:
+    """
+    提取问题中出现的全部槽位取值（每个槽位为集合，可能为空或多个），
+    residual 为去掉这些槽位词与标点空白后的剩余文本，用于判断两个问题是否同义。
+    """
+    index = get_domain_index(file_path)
+    business_lines = index.domain("CC Mapping", "Business Line")
+    # BL 为大写代码，区分大小写匹配，避免英文问题中的 me/us 被误判
+    bl_pattern = _word_pattern(business_lines.values)
+    slot_patterns = [*FISCAL_YEAR_PATTERNS, bl_pattern, CC_PATTERN]
+    slot_patterns += [_word_pattern(w, re.IGNORECASE) for w in SCENARIO_ALIASES.values()]
+    slot_patterns += [_word_pattern(w, re.IGNORECASE) for w in FUNCTION_ALIASES.values()]
+
+    residual = question
+    for pattern in slot_patterns:
+        residual = pattern.sub(" ", residual)
+    residual = re.sub(r"[\W_]+", "", residual).casefold()
+
+    return {
+        "years": {_normalize_year(m) for p in FISCAL_YEAR_PATTERNS for m in p.findall(question)},
+        "scenarios": _match_aliases(question, SCENARIO_ALIASES),
+        "functions": _match_aliases(question, FUNCTION_ALIASES),
+        "bls": set(bl_pattern.findall(question)),
+        "ccs": set(CC_PATTERN.findall(question)),
+        "residual": residual,
+    }
+
+
+def parse_allocation_question(question: str, file_path: str = COST_WORKBOOK_PATH) -> dict | None:
+    """
+    从“25财年实际分摊给CT的IT费用是多少”这类问题中提取财年、场景、职能以及 BL/CC。
+    任何一项缺失或出现多个取值（存在歧义）时返回 None，由团队工作流处理。
+    """
+    if not any(marker.lower() in question.lower() for marker in ALLOCATION_MARKERS):
+        return None
+    if PERIOD_PATTERN.search(question):
+        return None
+
+    slots = extract_slots(question, file_path)
+    years, scenarios, functions = slots["years"], slots["scenarios"], slots["functions"]
+    bls, ccs = slots["bls"], slots["ccs"]
+    if len(years) != 1 or len(scenarios) != 1 or len(functions) != 1:
+        return None
+    cost_centers = get_domain_index(file_path).domain("CC Mapping", "CostCenterNumber")
+    if len(bls) + len(ccs) != 1 or not all(cost_centers.contains(cc) for cc in ccs):
+        return None
+
+    return {
+        "year": years.pop(),
+        "scenario": scenarios.pop(),
+        "function": functions.pop(),
+        "bl": bls.pop() if bls else "",
+        "cc": ccs.pop() if ccs else "",
+    }
+
+
+def format_allocation_answer(slots: dict, monthly_df, yearly_cost: float) -> str:
+    target = slots["bl"] or slots["cc"]
+    rows = monthly_df.copy()
+    rows["order"] = rows["month"].map({m: i for i, m in enumerate(FISCAL_MONTHS)})
+    rows = rows.sort_values("order")
+    lines = [
+        f"**{slots['year']} {slots['scenario']} 分摊给 {target} 的 {slots['function']} 费用合计：{yearly_cost:,.2f}**",
+        "",
+        "| 月份 | 费用金额 | 分摊比例 | 分摊费用 |",
+        "| --- | ---: | ---: | ---: |",
+    ]
+    for _, row in rows.iterrows():
+        lines.append(
+            f"| {row['month']} | {row['amount']:,.2f} | {row['rate']:.4%} | {row['monthly_cost']:,.2f} |"
+        )
+    lines.append("")
+    lines.append("计算方式：每月分摊费用 = 费用金额 × 分摊比例，全年合计 = Oct~Sep 各月之和。")
+    return "\n".join(lines)
+
+
+def answer_allocation_question(question: str, file_path: str = COST_WORKBOOK_PATH) -> str | None:
+    """
+    确定性快速通道：解析问题后直接执行
+    generate_cost_rate_sql → 查询 → calculate_monthly_cost_table → caculate_yearly_cost，
+    不调用大模型。无法确定解析结果或查询无数据时返回 None。
+    """
+    try:
+        slots = parse_allocation_question(question, file_path)
+        if slots is None:
+            return None
+        sql = generate_cost_rate_sql(
+            year=slots["year"],
+            scenario=slots["scenario"],
+            func=f"{slots['function']} Allocation",
+            cc=slots["cc"],
+            bl=slots["bl"],
+        )
+        if sql.startswith("错误"):
+            logger.info(f"快速通道参数未通过校验，交给团队处理: {sql}")
+            return None
+        result_df = get_mirror(file_path).query(sql)
+        if result_df.empty:
+            return None
+        monthly_df = calculate_monthly_cost_table(result_df)
+        if "monthly_cost" not in monthly_df or monthly_df["monthly_cost"].isna().all():
+            return None
+        yearly_cost = float(caculate_yearly_cost(monthly_df))
+        logger.info(f"快速通道命中: {slots}，全年合计 {yearly_cost:.2f}")
+        return format_allocation_answer(slots, monthly_df, yearly_cost)
+    except Exception as e:
+        logger.warning(f"快速通道执行失败，交给团队处理: {e}")
+        return None
@@ -0,0 +1,119 @@
+import os
+import time
+import weakref
+import logging
+import threading
+import importlib.util
+import httpx
+from modules.metrics import register_gauges
+
+logger = logging.getLogger(__name__)
+
+# 到模型服务的连接上限与空闲保活连接数
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "32"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "16"))
+# 空闲连接保活时间（秒）。httpx 默认 5 秒，SOP 两次模型调用之间常隔着工具执行，超过 5 秒就要重新握手
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "90"))
+LLM_HTTP_CONNECT_TIMEOUT = float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", "10"))
+# 是否启用 HTTP/2（需要安装 h2，未安装时使用 HTTP/1.1）
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "1") == "1"
+
+
+class PoolStatsTransport(httpx.AsyncHTTPTransport):
+    """在默认传输层上统计请求数、并发数与新建连接数（新建连接数即 TCP/TLS 握手次数）"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.new_connections = 0
+        self.wait_seconds = 0.0
+        # 持有连接对象的弱引用：连接关闭回收后自动移出，不会因 id() 被新连接复用而漏计
+        self._seen_connections = weakref.WeakSet()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        started = time.perf_counter()
+        try:
+            response = await super().handle_async_request(request)
+        finally:
+            self.in_flight -= 1
+        # 响应头到达时的耗时包含排队等连接与握手，用于观察连接池是否成为瓶颈
+        self.wait_seconds += time.perf_counter() - started
+        self._track_connections()
+        return response
+
+    def _track_connections(self) -> None:
+        for connection in self._pool.connections:
+            if connection not in self._seen_connections:
+                self._seen_connections.add(connection)
+                self.new_connections += 1
+
+    def stats(self) -> dict:
+        connections = list(self._pool.connections)
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "connections": len(connections),
+            "idle_connections": idle,
+            "new_connections": self.new_connections,
+            "reuse_rate": round(1 - self.new_connections / self.requests, 4) if self.requests else 0.0,
+            "avg_response_header_seconds": round(self.wait_seconds / self.requests, 4) if self.requests else 0.0,
+        }
+
+
+_http_client = None
+_transport = None
+_lock = threading.Lock()
+
+
+def http2_available() -> bool:
+    return LLM_HTTP2 and importlib.util.find_spec("h2") is not None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    进程内共享的模型服务 HTTP 客户端：所有模型客户端（含 SelectorGroupChat 的选择器）复用同一个连接池，
+    连接长时间保活，可用时启用 HTTP/2 在单连接上多路复用。
+    """
+    global _http_client, _transport
+    with _lock:
+        if _http_client is None:
+            limits = httpx.Limits(
+                max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+            )
+            http2 = http2_available()
+            _transport = PoolStatsTransport(limits=limits, http2=http2)
+            _http_client = httpx.AsyncClient(
+                transport=_transport,
+                limits=limits,
+                timeout=httpx.Timeout(None, connect=LLM_HTTP_CONNECT_TIMEOUT),
+                follow_redirects=True,
+            )
+            logger.info(
+                f"模型服务 HTTP 连接池已创建: max_connections={LLM_HTTP_MAX_CONNECTIONS}, "
+                f"keepalive={LLM_HTTP_MAX_KEEPALIVE}/{LLM_HTTP_KEEPALIVE_EXPIRY}s, http2={http2}"
+            )
+        return _http_client
+
+
+def http_pool_stats() -> dict:
+    """连接池使用情况；连接池尚未创建时返回空 dict"""
+    return _transport.stats() if _transport is not None else {}
+
+
+register_gauges("llm_http_pool", http_pool_stats)
+
+
+async def close_http_client() -> None:
+    global _http_client, _transport
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = _transport = None
@@ -0,0 +1,103 @@
+import os
+import re
+import math
+import logging
+from dataclasses import dataclass, field
+from modules.fast_path import FISCAL_YEAR_PATTERNS, SCENARIO_ALIASES, FUNCTION_ALIASES
+
+logger = logging.getLogger(__name__)
+
+# 是否启用本地规则分类（命中高置信度时跳过 intention_analyst 的模型调用）
+INTENT_RULES_ENABLED = os.getenv("INTENT_RULES_ENABLED", "1") == "1"
+# 判为“成本分析-需数据”所需的最低置信度，低于该值交给 intention_analyst
+INTENT_RULE_THRESHOLD = float(os.getenv("INTENT_RULE_THRESHOLD", "0.9"))
+
+COST_DATA_CATEGORY = "成本分析-需数据"
+
+# 上下文任务中当前请求的起始标记（见 chat_context.CONTEXT_TEMPLATE），只对当前请求分类
+CURRENT_REQUEST_MARKER = "用户的新请求："
+
+
+def _alternation(words) -> str:
+    return "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+
+def _aliases(aliases: dict) -> str:
+    return _alternation({w for words in aliases.values() for w in words})
+
+
+# 特征：名称 → (权重, 正则)。同一特征多次出现只计一次；负权重特征表示明显不需要查数据的请求
+FEATURES = {
+    "cost_term": (2.5, r"费用|成本|开支|支出|花费|cost|expense|spend"),
+    "allocation": (2.5, r"分摊|分配|摊销|allocat\w*|(?<![A-Za-z])rate(?![A-Za-z])"),
+    "year": (2.0, "|".join(p.pattern for p in FISCAL_YEAR_PATTERNS)),
+    "scenario": (1.5, rf"(?<![A-Za-z])(?:{_aliases(SCENARIO_ALIASES)})(?![A-Za-z])"),
+    "function": (1.0, rf"(?<![A-Za-z])(?:{_aliases(FUNCTION_ALIASES)})(?![A-Za-z])"),
+    "quantity": (
+        1.0,
+        r"多少|金额|合计|总额|总计|汇总|明细|比例|占比|每月|月度|年度|趋势|对比|同比|环比|排名|包括|包含|构成|组成|哪些"
+        r"|(?<![A-Za-z])(?:amount|total|sum|how much|breakdown|trend|compare|monthly|yearly)(?![A-Za-z])",
+    ),
+    "cost_center": (0.5, r"成本中心|(?<![A-Za-z])CC(?![A-Za-z])|(?<!\d)\d{6}(?!\d)"),
+    "meta": (-3.0, r"你好|您好|谢谢|是什么意思|什么是|定义|解释一下|介绍一下|怎么用|如何使用|能做什么|hello|help|what is|explain"),
+    "other_domain": (-3.0, r"天气|新闻|股票|翻译|写一首|写代码|SDQ|停机|downtime|供应商评分|supplier"),
+}
+BIAS = -3.0
+
+# 所有特征编译为一个带命名分组的交替正则，一次扫描得到命中的全部特征
+_FEATURE_PATTERN = re.compile("|".join(f"(?P<{name}>{regex})" for name, (_, regex) in FEATURES.items()), re.IGNORECASE)
+
+
+@dataclass
+class IntentResult:
+    category: str | None
+    confidence: float
+    features: list = field(default_factory=list)
+
+
+def current_request(task: str) -> str:
+    """从拼接了历史的上下文任务中取出当前请求"""
+    index = task.rfind(CURRENT_REQUEST_MARKER)
+    return task[index + len(CURRENT_REQUEST_MARKER) :] if index >= 0 else task
+
+
+def classify_intent(task: str, threshold: float = None) -> IntentResult:
+    """
+    对当前请求做规则打分：命中特征的权重求和后经 sigmoid 得到“成本分析-需数据”的置信度。
+    置信度达到阈值时返回该类别，否则 category 为 None，由 intention_analyst 判断。
+    """
+    threshold = INTENT_RULE_THRESHOLD if threshold is None else threshold
+    text = current_request(task)
+    hits = {match.lastgroup for match in _FEATURE_PATTERN.finditer(text)}
+    score = BIAS + sum(FEATURES[name][0] for name in hits)
+    confidence = 1 / (1 + math.exp(-score))
+    category = COST_DATA_CATEGORY if confidence >= threshold else None
+    return IntentResult(category=category, confidence=round(confidence, 4), features=sorted(hits))
+
+
+def user_task(messages) -> str:
+    """团队收到的用户任务（第一条 user 消息）"""
+    for message in messages:
+        if message.source == "user" and isinstance(getattr(message, "content", None), str):
+            return message.content
+    return ""
+
+
+def is_first_dispatch(messages) -> bool:
+    """除 user 与 Manager 外还没有其他角色发言"""
+    return all(message.source in ("user", "Manager") for message in messages)
+
+
+def rule_classified_cost_data(messages) -> bool:
+    """
+    SOP 路由表中 Manager 首次分发的 guard：本地规则判为成本数据查询时直接进入 excel_sql_specialist，
+    省去一次意图识别的模型调用
+    """
+    if not INTENT_RULES_ENABLED or not is_first_dispatch(messages):
+        return False
+    intent = classify_intent(user_task(messages))
+    if intent.category == COST_DATA_CATEGORY:
+        logger.info(f"规则分类为成本分析需数据（置信度 {intent.confidence}，特征 {intent.features}）")
+        return True
+    logger.info(f"规则分类置信度不足（{intent.confidence}），按原流程分发")
+    return False
@@ -0,0 +1,193 @@
+import os
+import copy
+import queue
+import atexit
+import random
+import signal
+import logging
+import threading
+import logging.handlers
+from datetime import datetime
+
+# 根日志级别与 SOP 流程日志（autogen trace/event 及 sop_logger）级别，可在运行时通过 set_log_level 调整
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+SOP_LOG_LEVEL = os.getenv("SOP_LOG_LEVEL", "INFO")
+# 为 0 时退回同步写日志（在调用线程内直接写控制台与文件）
+LOG_ASYNC = os.getenv("LOG_ASYNC", "1") == "1"
+# 日志队列长度上限，写满时丢弃新日志而不是阻塞事件循环
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# 流程日志文件按大小轮转
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(20 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+# autogen event 日志（每条智能体消息一条）的采样比例，WARNING 及以上不采样
+AUTOGEN_EVENT_LOG_SAMPLE_RATE = float(os.getenv("AUTOGEN_EVENT_LOG_SAMPLE_RATE", "1"))
+# 单条日志中消息内容的最大字符数
+LOG_CONTENT_CHARS = int(os.getenv("LOG_CONTENT_CHARS", "500"))
+
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+_lock = threading.Lock()
+_listener = None
+_sop_logger_names = []
+_signal_toggle_installed = False
+_exception_formatter = logging.Formatter()
+
+
+class SamplingFilter(logging.Filter):
+    """按比例随机保留低于 WARNING 的日志，WARNING 及以上全部保留"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class PrefixFilter(logging.Filter):
+    """只保留指定前缀的日志器产生的日志（流程日志文件只记录 SOP 相关日志）"""
+
+    def __init__(self, prefixes: list):
+        super().__init__()
+        self.prefixes = tuple(prefixes)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.name.startswith(self.prefixes)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """队列写满时丢弃日志并计数，保证记录日志的调用永不阻塞"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 只合并消息参数（Clipped 等在此时求值），时间格式化等留给后台线程
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _build_handlers(log_filename: str, logger_names: list) -> list:
+    formatter = logging.Formatter(LOG_FORMAT)
+    console = logging.StreamHandler()
+    console.setFormatter(formatter)
+    os.makedirs(os.path.dirname(log_filename) or ".", exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_filename, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8", delay=True
+    )
+    file_handler.setFormatter(formatter)
+    file_handler.addFilter(PrefixFilter(logger_names))
+    return [console, file_handler]
+
+
+def setup_sop_logging(trace_logger_name: str, event_logger_name: str, log_filename: str = None) -> None:
+    """
+    配置 SOP 流程日志（多次调用只生效一次）：
+    根日志器挂一个非阻塞的队列处理器，由后台线程统一写控制台和按大小轮转的流程日志文件；
+    autogen event 日志可按比例采样。之后的 logging.basicConfig 调用因根日志器已有处理器而不再生效。
+    """
+    global _listener
+    with _lock:
+        root = logging.getLogger()
+        if _sop_logger_names:
+            return
+        _sop_logger_names.extend([trace_logger_name, event_logger_name])
+        log_filename = log_filename or f"log/sop_flow_{datetime.now().strftime('%Y%m%d')}.log"
+        handlers = _build_handlers(log_filename, _sop_logger_names)
+
+        if LOG_ASYNC:
+            # 之前 basicConfig 等挂在根日志器上的同步处理器也移到队列之后，由后台线程写出
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+                handlers.append(handler)
+            queue_handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+            _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+            _listener.start()
+            atexit.register(stop_logging)
+            root.addHandler(queue_handler)
+        else:
+            for handler in handlers:
+                root.addHandler(handler)
+
+        root.setLevel(LOG_LEVEL)
+        for name in _sop_logger_names:
+            logging.getLogger(name).setLevel(SOP_LOG_LEVEL)
+        if AUTOGEN_EVENT_LOG_SAMPLE_RATE < 1:
+            logging.getLogger(event_logger_name).addFilter(SamplingFilter(AUTOGEN_EVENT_LOG_SAMPLE_RATE))
+        install_signal_toggle()
+
+
+def stop_logging() -> None:
+    """停止后台写日志线程，先写完队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def set_log_level(level, logger_name: str = None) -> None:
+    """
+    运行时调整日志级别：不指定 logger_name 时同时调整根日志器与 SOP 流程日志器。
+    level 可以是 "DEBUG" 这样的级别名或数值。
+    """
+    names = [logger_name] if logger_name is not None else [""] + _sop_logger_names
+    for name in names:
+        logging.getLogger(name or None).setLevel(level)
+    logging.getLogger(__name__).warning(f"日志级别已调整为 {level}: {names or ['root']}")
+
+
+def install_signal_toggle() -> bool:
+    """
+    收到 SIGUSR1 时在 DEBUG 与配置级别之间切换流程日志级别（仅 POSIX）。
+    信号处理只能在主线程安装：SOP 模块在工作线程中懒加载时 setup_sop_logging 装不上，
+    由应用启动代码（appmain 导入时）在主线程调用。已安装时直接返回 True。
+    """
+    global _signal_toggle_installed
+    if _signal_toggle_installed:
+        return True
+    if not hasattr(signal, "SIGUSR1") or threading.current_thread() is not threading.main_thread():
+        return False
+
+    def toggle(signum, frame):
+        # SOP 流程日志尚未配置时切换根日志器
+        names = _sop_logger_names or [""]
+        default_level = SOP_LOG_LEVEL if _sop_logger_names else LOG_LEVEL
+        debug = logging.getLogger(names[0] or None).level != logging.DEBUG
+        for name in names:
+            set_log_level(logging.DEBUG if debug else default_level, name)
+
+    try:
+        signal.signal(signal.SIGUSR1, toggle)
+    except ValueError:
+        return False
+    _signal_toggle_installed = True
+    return True
+
+
+class Clipped:
+    """
+    延迟截断写入日志的长文本（消息内容、工具结果）：作为 %s 参数传给日志器，
+    只有日志真正输出时才会转成字符串并截断，级别被关闭时几乎没有开销。
+    """
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value, limit: int = None):
+        self.value = value
+        self.limit = limit or LOG_CONTENT_CHARS
+
+    def __str__(self) -> str:
+        text = str(self.value)
+        return text if len(text) <= self.limit else f"{text[: self.limit]}...（共 {len(text)} 字符）"
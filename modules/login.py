@@ -1,5 +1,4 @@
  
-import pyodbc
 import logging
 import requests
 import uuid
@@ -51,6 +50,8 @@ class login:
     @staticmethod
     def get_user_id(username):
         """获取用户ID"""
+        import pyodbc  # 依赖系统 ODBC 驱动，只在查询用户时才导入
+
         try:
             with pyodbc.connect(DB_CONNECTION_STRING) as conn:
                 cursor = conn.cursor()
@@ -67,6 +68,8 @@ class login:
     @staticmethod
     def get_user_info(user_id):
         """获取用户信息"""
+        import pyodbc  # 依赖系统 ODBC 驱动，只在查询用户时才导入
+
         try:
             with pyodbc.connect(DB_CONNECTION_STRING) as conn:
                 cursor = conn.cursor()
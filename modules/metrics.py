@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# 每个请求的 span 明细追加写入的 JSON lines 文件，置空则不写
+SOP_METRICS_JSONL = os.getenv("SOP_METRICS_JSONL", "log/sop_metrics.jsonl")
+# Prometheus 文本格式指标文件（供 node_exporter textfile collector 采集），置空则不写
+SOP_METRICS_PROM_PATH = os.getenv("SOP_METRICS_PROM_PATH", "")
+# 每个阶段保留的最近耗时样本数，用于计算分位数
+SOP_METRICS_SAMPLES = int(os.getenv("SOP_METRICS_SAMPLES", "1000"))
+
+_current_trace = contextvars.ContextVar("sop_request_trace", default=None)
+
+
+class RequestTrace:
+    """
+    单个请求的链路记录：按发生顺序保存各阶段的 span（阶段、名称、耗时、token 数、缓存命中等属性）。
+    通过 contextvars 传递，团队运行时内部创建的任务会继承，工具与模型调用可直接记录到当前请求。
+    """
+
+    def __init__(self, name: str = "request"):
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self.cache_hits = defaultdict(int)
+
+    def add_span(self, stage: str, name: str, duration: float, **attrs) -> dict:
+        span = {"stage": stage, "name": name, "duration": round(duration, 4)}
+        span.update({k: v for k, v in attrs.items() if v is not None})
+        span["offset"] = round(time.perf_counter() - self._started - duration, 4)
+        self.spans.append(span)
+        return span
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self._started
+
+    def summary(self) -> dict:
+        """按阶段汇总：次数、总耗时、token 数"""
+        stages = {}
+        for span in self.spans:
+            entry = stages.setdefault(
+                span["stage"], {"count": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0}
+            )
+            entry["count"] += 1
+            entry["seconds"] = round(entry["seconds"] + span["duration"], 4)
+            entry["prompt_tokens"] += span.get("prompt_tokens", 0)
+            entry["completion_tokens"] += span.get("completion_tokens", 0)
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "duration": round(self.duration or 0.0, 4),
+            "stages": stages,
+            "cache_hits": dict(self.cache_hits),
+        }
+
+    def to_json(self) -> str:
+        record = self.summary()
+        record["started_at"] = self.started_at
+        record["spans"] = self.spans
+        return json.dumps(record, ensure_ascii=False)
+
+
+def current_trace() -> RequestTrace | None:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(stage: str, name: str, **attrs):
+    """
+    记录一个 span；with 块内可向返回的 dict 中补充属性（如 token 数）。
+    当前没有请求链路时只计时不记录，调用方无需判断。
+    """
+    extra = dict(attrs)
+    started = time.perf_counter()
+    try:
+        yield extra
+    finally:
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(stage, name, time.perf_counter() - started, **extra)
+
+
+def record_span(stage: str, name: str, duration: float, **attrs) -> None:
+    """记录一个已知耗时的 span（例如由事件时间差推算的智能体轮次）"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(stage, name, duration, **attrs)
+
+
+def record_cache_hit(cache: str) -> None:
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.cache_hits[cache] += 1
+    pipeline_metrics.record_cache_hit(cache)
+
+
+class PipelineMetrics:
+    """进程内的聚合指标：每个（阶段, 名称）保留最近的耗时样本计算 p50/p95，并累计 token 数与缓存命中次数"""
+
+    def __init__(self, samples: int = 1000):
+        self.samples = samples
+        self._durations = defaultdict(lambda: deque(maxlen=self.samples))
+        self._counts = defaultdict(int)
+        self._sums = defaultdict(float)
+        self._tokens = defaultdict(int)
+        self._cache_hits = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def observe(self, trace: RequestTrace) -> None:
+        with self._lock:
+            entries = [("request", trace.name, trace.duration or 0.0, {})]
+            entries += [(s["stage"], s["name"], s["duration"], s) for s in trace.spans]
+            for stage, name, duration, attrs in entries:
+                key = (stage, name)
+                self._durations[key].append(duration)
+                self._counts[key] += 1
+                self._sums[key] += duration
+                for kind in ("prompt_tokens", "completion_tokens"):
+                    if attrs.get(kind):
+                        self._tokens[key + (kind,)] += attrs[kind]
+
+    def record_cache_hit(self, cache: str) -> None:
+        with self._lock:
+            self._cache_hits[cache] += 1
+
+    @staticmethod
+    def _quantile(samples: list, q: float) -> float:
+        return samples[min(len(samples) - 1, int(len(samples) * q))] if samples else 0.0
+
+    def summary(self) -> dict:
+        """{"阶段/名称": {"count", "p50", "p95", "max"}}，以及 token 与缓存命中累计"""
+        with self._lock:
+            stages = {}
+            for (stage, name), values in self._durations.items():
+                samples = sorted(values)
+                stages[f"{stage}/{name}"] = {
+                    "count": self._counts[(stage, name)],
+                    "p50": round(self._quantile(samples, 0.5), 4),
+                    "p95": round(self._quantile(samples, 0.95), 4),
+                    "max": round(samples[-1], 4),
+                }
+            tokens = {f"{stage}/{name}/{kind}": value for (stage, name, kind), value in self._tokens.items()}
+            return {"stages": stages, "tokens": tokens, "cache_hits": dict(self._cache_hits)}
+
+    def to_prometheus(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        label = lambda value: str(value).replace("\\", "\\\\").replace('"', '\\"')  # noqa: E731
+        with self._lock:
+            lines = [
+                "# HELP sop_stage_seconds SOP 流程各阶段耗时",
+                "# TYPE sop_stage_seconds summary",
+            ]
+            for (stage, name), values in sorted(self._durations.items()):
+                samples = sorted(values)
+                labels = f'stage="{label(stage)}",name="{label(name)}"'
+                for q in (0.5, 0.95):
+                    lines.append(f'sop_stage_seconds{{{labels},quantile="{q}"}} {self._quantile(samples, q):.6f}')
+                lines.append(f"sop_stage_seconds_sum{{{labels}}} {self._sums[(stage, name)]:.6f}")
+                lines.append(f"sop_stage_seconds_count{{{labels}}} {self._counts[(stage, name)]}")
+            lines += ["# HELP sop_tokens_total 模型调用消耗的 token 数", "# TYPE sop_tokens_total counter"]
+            for (stage, name, kind), value in sorted(self._tokens.items()):
+                kind = kind.replace("_tokens", "")
+                lines.append(f'sop_tokens_total{{stage="{label(stage)}",name="{label(name)}",kind="{kind}"}} {value}')
+            lines += ["# HELP sop_cache_hits_total 各级缓存命中次数", "# TYPE sop_cache_hits_total counter"]
+            for cache, value in sorted(self._cache_hits.items()):
+                lines.append(f'sop_cache_hits_total{{cache="{label(cache)}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+pipeline_metrics = PipelineMetrics(samples=SOP_METRICS_SAMPLES)
+
+# 其他模块登记的瞬时指标（如连接池使用情况）：名称 -> 返回 {指标: 数值} 的函数，导出时才调用
+_gauge_providers = {}
+
+
+def register_gauges(name: str, provider) -> None:
+    _gauge_providers[name] = provider
+
+
+def gauges_to_prometheus() -> str:
+    lines = []
+    for name, provider in sorted(_gauge_providers.items()):
+        try:
+            values = provider() or {}
+        except Exception as e:
+            logger.warning(f"读取指标 {name} 失败: {e}")
+            continue
+        for key, value in sorted(values.items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"# TYPE sop_{name}_{key} gauge")
+                lines.append(f"sop_{name}_{key} {value}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+_export_executor = None
+_export_lock = threading.Lock()
+
+
+def _get_export_executor() -> ThreadPoolExecutor:
+    # 单个后台线程写出：请求结束时不在事件循环里做磁盘 I/O，各请求的导出串行执行，不会交错写同一文件
+    global _export_executor
+    with _export_lock:
+        if _export_executor is None:
+            _export_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sop-metrics")
+        return _export_executor
+
+
+def _export(trace: RequestTrace, jsonl_path: str, prom_path: str) -> None:
+    try:
+        if jsonl_path:
+            os.makedirs(os.path.dirname(jsonl_path) or ".", exist_ok=True)
+            with open(jsonl_path, "a", encoding="utf-8") as f:
+                f.write(trace.to_json() + "\n")
+        if prom_path:
+            # 先写临时文件再替换，避免采集到写了一半的文件
+            tmp_path = f"{prom_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(pipeline_metrics.to_prometheus() + gauges_to_prometheus())
+            os.replace(tmp_path, prom_path)
+    except OSError as e:
+        logger.warning(f"写入流程指标失败: {e}")
+
+
+def flush_exports(timeout: float = None) -> None:
+    """等待已提交的指标导出写完（测试与退出前使用）"""
+    if _export_executor is not None:
+        _export_executor.submit(lambda: None).result(timeout=timeout)
+
+
+@contextmanager
+def request_trace(name: str = "request"):
+    """开始一个请求链路；结束时汇总到全局指标、记录摘要日志并导出"""
+    trace = RequestTrace(name)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        trace.finish()
+        pipeline_metrics.observe(trace)
+        logger.info(f"请求链路摘要: {json.dumps(trace.summary(), ensure_ascii=False)}")
+        if SOP_METRICS_JSONL or SOP_METRICS_PROM_PATH:
+            _get_export_executor().submit(_export, trace, SOP_METRICS_JSONL, SOP_METRICS_PROM_PATH)
@@ -0,0 +1,47 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class ResultCursorStore:
+    """
+    查询结果游标：sqlQuery 结果超过预览行数时登记查询本身（而不是结果数据），
+    后续分页或汇总时按游标重新执行，内存中不保留大结果集。
+    游标 id 由文件路径与 SQL 决定，同一查询重复执行得到同一个游标。
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cursor_id(file_path: str, query: str) -> str:
+        raw = f"{os.path.abspath(file_path)}\n{query.strip()}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+    def register(self, file_path: str, query: str, sql_table_names: list, columns: list, total_rows: int) -> str:
+        cursor_id = self.cursor_id(file_path, query)
+        with self._lock:
+            self._entries[cursor_id] = {
+                "file_path": file_path,
+                "query": query.strip().rstrip(";"),
+                "sql_table_names": list(sql_table_names),
+                "columns": list(columns),
+                "total_rows": total_rows,
+            }
+            self._entries.move_to_end(cursor_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return cursor_id
+
+    def get(self, cursor_id: str) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(cursor_id)
+            if entry is not None:
+                self._entries.move_to_end(cursor_id)
+            return entry
+
+
+result_cursors = ResultCursorStore(max_entries=int(os.getenv("SQL_RESULT_CURSOR_MAX_ENTRIES", "4096")))
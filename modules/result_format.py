@@ -0,0 +1,110 @@
+import os
+import logging
+import functools
+import pandas as pd
+from modules.token_counter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# 浮点数最多保留的小数位（去掉末尾的 0）；分摊比例需要较多小数位，不能按金额的两位小数处理
+FLOAT_DIGITS = int(os.getenv("RESULT_FLOAT_DIGITS", "6"))
+# 工具输出给模型的默认 token 预算
+RESULT_TOKEN_BUDGET = int(os.getenv("RESULT_TOKEN_BUDGET", "3000"))
+
+
+def _format_value(value, float_digits: int) -> str:
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ""
+    if isinstance(value, float):
+        if value.is_integer():
+            return str(int(value))
+        text = f"{value:.{float_digits}f}".rstrip("0").rstrip(".")
+        return text if text not in ("", "-0") else "0"
+    return str(value).replace("\t", " ").replace("\n", " ")
+
+
+def prune_columns(df: pd.DataFrame) -> tuple:
+    """
+    去掉全为空的列；多行结果中取值完全相同的维度列（非数值列，通常是 WHERE 中的过滤条件）
+    提取为公共取值，不在每行重复。数值列保持逐行输出，便于原样传给计算工具。返回 (剩余列的 DataFrame, {列名: 公共取值})
+    """
+    df = df.dropna(axis=1, how="all")
+    constants = {}
+    if len(df) > 1:
+        for column in df.columns:
+            values = df[column]
+            if (
+                not pd.api.types.is_numeric_dtype(values)
+                and values.notna().all()
+                and values.nunique() == 1
+                and len(df.columns) - len(constants) > 1
+            ):
+                constants[column] = values.iloc[0]
+    return df.drop(columns=list(constants)), constants
+
+
+def _render(rows: list, columns: list, fmt: str) -> str:
+    if fmt == "markdown":
+        lines = ["| " + " | ".join(columns) + " |", "|" + "---|" * len(columns)]
+        lines += ["| " + " | ".join(row) + " |" for row in rows]
+        return "\n".join(lines)
+    sep = "\t" if fmt == "tsv" else ","
+    if fmt == "csv":
+        quote = lambda cell: f'"{cell}"' if ("," in cell or '"' in cell) else cell  # noqa: E731
+        rows = [[quote(cell.replace('"', '""')) for cell in row] for row in rows]
+        columns = [quote(c) for c in columns]
+    return "\n".join([sep.join(columns)] + [sep.join(row) for row in rows])
+
+
+def serialize_rows(
+    df: pd.DataFrame,
+    budget_tokens: int = None,
+    float_digits: int = FLOAT_DIGITS,
+    formats: tuple = ("tsv", "csv", "markdown"),
+) -> tuple:
+    """
+    把 DataFrame 压缩序列化给大模型：去掉空列、提取公共取值、浮点数去掉多余小数位，
+    在 TSV/CSV/Markdown 中按实测 token 数选择最紧凑的格式；
+    超出 budget_tokens 时截断行数并注明省略的行数。返回 (文本, 实际输出的行数)。
+    """
+    budget_tokens = budget_tokens or RESULT_TOKEN_BUDGET
+    pruned, constants = prune_columns(df)
+    columns = [str(c) for c in pruned.columns]
+    rows = [[_format_value(v, float_digits) for v in row] for row in pruned.itertuples(index=False, name=None)]
+
+    header = ""
+    if constants:
+        header = "各行相同：" + "，".join(f"{k}={_format_value(v, float_digits)}" for k, v in constants.items()) + "\n"
+
+    costs = {fmt: count_tokens(_render(rows, columns, fmt)) for fmt in formats}
+    fmt = min(costs, key=costs.get)
+    logger.debug(f"结果序列化各格式 token 数: {costs}，选用 {fmt}")
+
+    budget_left = budget_tokens - count_tokens(header)
+    if costs[fmt] <= budget_left or not rows:
+        return header + _render(rows, columns, fmt), len(rows)
+
+    # 按平均每行 token 数估计可容纳的行数，再逐步收缩到预算之内
+    per_row = costs[fmt] / (len(rows) + 1)
+    keep = max(1, int(budget_left / per_row) - 1)
+    while keep > 1 and count_tokens(_render(rows[:keep], columns, fmt)) > budget_left:
+        keep = int(keep * 0.9)
+    note = f"\n（超出输出预算，省略其余 {len(rows) - keep} 行）"
+    return header + _render(rows[:keep], columns, fmt) + note, keep
+
+
+def serialize_frame(df: pd.DataFrame, budget_tokens: int = None) -> str:
+    return serialize_rows(df, budget_tokens)[0]
+
+
+def compact_output(func):
+    """包装工具函数：返回 DataFrame 时改为返回压缩序列化后的文本，其余返回值不变"""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        result = func(*args, **kwargs)
+        if isinstance(result, pd.DataFrame):
+            return serialize_frame(result)
+        return result
+
+    return wrapper
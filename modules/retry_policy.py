@@ -0,0 +1,162 @@
+import os
+import re
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from typing import Sequence
+from autogen_agentchat.base import TerminatedException, TerminationCondition
+from autogen_agentchat.messages import BaseAgentEvent, BaseChatMessage, StopMessage
+from modules.metrics import record_span, register_gauges
+
+logger = logging.getLogger(__name__)
+
+# 查询失败分类：按顺序匹配，先命中的类别生效（工作表不存在的报错里也带“错误”，需排在通用错误之前）
+FAILURE_PATTERNS = {
+    "sheet_missing": r"无法读取Excel中的工作表|Worksheet named .* not found|no such table|文件 \S+ 不存在",
+    "validation": r"不在允许范围内|校验配置|不允许的操作|缺少必要列",
+    "sql_syntax": r"syntax error|no such column|unrecognized token|incomplete input|ambiguous column|misuse of aggregate"
+    r"|near \"|查询过程中出现错误",
+    "empty": r"结果为空|返回 0 行",
+    "other": r"错误|error",
+}
+SUCCESS_PATTERN = re.compile(r"SQL_DONE|查询成功")
+
+# 各类失败允许的重试次数与首次重试前的等待秒数（之后每次翻倍）。
+# 校验与语法错误的报错里带有候选值/出错位置，模型通常能改对；工作表缺失和结果为空多半重试也无用；
+# 其他错误可能是文件被占用等临时问题，等待后再试；incomplete 为既没有报错也没有查询成功标记的回复
+DEFAULT_BUDGETS = {"validation": 2, "sql_syntax": 2, "empty": 1, "sheet_missing": 1, "other": 1, "incomplete": 1}
+DEFAULT_BACKOFF = {"validation": 0, "sql_syntax": 0, "empty": 0, "sheet_missing": 0, "other": 1, "incomplete": 0}
+SQL_RETRY_BUDGETS = {
+    kind: int(os.getenv(f"SQL_RETRY_BUDGET_{kind.upper()}", str(budget))) for kind, budget in DEFAULT_BUDGETS.items()
+}
+SQL_RETRY_BACKOFF = {
+    kind: float(os.getenv(f"SQL_RETRY_BACKOFF_{kind.upper()}", str(seconds)))
+    for kind, seconds in DEFAULT_BACKOFF.items()
+}
+# 所有类别合计的重试上限
+SQL_RETRY_MAX_TOTAL = int(os.getenv("SQL_RETRY_MAX_TOTAL", "4"))
+
+# 预算耗尽时 StopMessage 的内容前缀，run_Cost_sop_team 据此从 stop_reason 中取出给用户的答复
+SQL_RETRY_STOP = "SQL_RETRY_EXHAUSTED"
+RETRY_FAILURE_PREFIX = "抱歉，数据查询未能完成"
+
+FAILURE_HINTS = {
+    "validation": "问题中的财年、场景、职能或成本中心等取值未能匹配到数据，请检查后重新提问",
+    "sql_syntax": "生成的查询语句多次执行失败，请换一种说法描述问题",
+    "empty": "没有符合条件的数据，请确认筛选条件（如财年、场景）下是否有数据",
+    "sheet_missing": "所需的数据表不存在，请确认数据文件是否已更新",
+    "other": "查询过程中出现异常，请稍后重试",
+    "incomplete": "未能生成可执行的查询，请补充财年、场景或职能等条件后重新提问",
+}
+
+_FAILURE_PATTERN = re.compile("|".join(f"(?P<{kind}>{regex})" for kind, regex in FAILURE_PATTERNS.items()), re.IGNORECASE)
+
+
+def classify_failure(content: str) -> str | None:
+    """查询结果的失败类别；查询成功且有数据时返回 None，与选择器中回到 Manager 的条件一致"""
+    kinds = {match.lastgroup for match in _FAILURE_PATTERN.finditer(content)}
+    for kind in FAILURE_PATTERNS:
+        if kind in kinds:
+            return kind
+    return None if SUCCESS_PATTERN.search(content) else "incomplete"
+
+
+class RetryStats:
+    """进程内累计的失败次数、预算耗尽次数与浪费的模型调用次数（失败轮次）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.failures = defaultdict(int)
+        self.exhausted = defaultdict(int)
+        self.wasted_calls = 0
+
+    def record(self, kind: str, exhausted: bool = False) -> None:
+        with self._lock:
+            self.failures[kind] += 1
+            self.wasted_calls += 1
+            if exhausted:
+                self.exhausted[kind] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            values = {f"failures_{kind}": count for kind, count in self.failures.items()}
+            values.update({f"exhausted_{kind}": count for kind, count in self.exhausted.items()})
+            values["wasted_calls"] = self.wasted_calls
+            return values
+
+
+retry_stats = RetryStats()
+register_gauges("sql_retry", retry_stats.stats)
+
+
+class SQLRetryPolicy(TerminationCondition):
+    """
+    作为团队终止条件，观察查询智能体每一轮的结果：失败时按类别计数，
+    未超出该类别预算时按退避时间等待后交给选择器重试，超出预算或合计上限时结束对话，
+    StopMessage 中带上给用户的说明。
+    """
+
+    def __init__(
+        self,
+        agent_name: str = "excel_sql_specialist",
+        budgets: dict = None,
+        backoff: dict = None,
+        max_total: int = None,
+    ):
+        self.agent_name = agent_name
+        self.budgets = SQL_RETRY_BUDGETS if budgets is None else budgets
+        self.backoff = SQL_RETRY_BACKOFF if backoff is None else backoff
+        self.max_total = SQL_RETRY_MAX_TOTAL if max_total is None else max_total
+        self._attempts = defaultdict(int)
+        self._terminated = False
+
+    @property
+    def terminated(self) -> bool:
+        return self._terminated
+
+    async def __call__(self, messages: Sequence[BaseAgentEvent | BaseChatMessage]) -> StopMessage | None:
+        if self._terminated:
+            raise TerminatedException("Termination condition has already been reached")
+        for message in messages:
+            if not isinstance(message, BaseChatMessage) or message.source != self.agent_name:
+                continue
+            content = message.content if isinstance(getattr(message, "content", None), str) else ""
+            kind = classify_failure(content)
+            if kind is None:
+                continue
+            self._attempts[kind] += 1
+            attempt = self._attempts[kind]
+            total = sum(self._attempts.values())
+            if attempt > self.budgets.get(kind, 0) or total > self.max_total:
+                retry_stats.record(kind, exhausted=True)
+                record_span("sql_retry", f"{kind}/exhausted", 0.0, attempt=attempt)
+                logger.warning(f"查询失败（{kind}）第 {attempt} 次，合计 {total} 次，超出重试预算，结束流程")
+                self._terminated = True
+                answer = self.failure_answer(kind, content)
+                return StopMessage(content=f"{SQL_RETRY_STOP}\n{answer}", source="SQLRetryPolicy")
+
+            retry_stats.record(kind)
+            delay = self.backoff.get(kind, 0) * 2 ** (attempt - 1)
+            logger.info(f"查询失败（{kind}）第 {attempt} 次，{delay:.1f}s 后重试")
+            if delay > 0:
+                await asyncio.sleep(delay)
+            record_span("sql_retry", kind, delay, attempt=attempt)
+        return None
+
+    def failure_answer(self, kind: str, content: str) -> str:
+        detail = content.strip().splitlines()[0][:200] if content.strip() else ""
+        answer = f"{RETRY_FAILURE_PREFIX}：{FAILURE_HINTS.get(kind, FAILURE_HINTS['other'])}。"
+        answer += f"（已尝试 {sum(self._attempts.values())} 次"
+        return answer + (f"，最后一次返回：{detail}）" if detail else "）")
+
+    async def reset(self) -> None:
+        self._attempts.clear()
+        self._terminated = False
+
+
+def retry_stop_answer(stop_reason: str | None) -> str | None:
+    """团队因重试预算耗尽而结束时，从 stop_reason 中取出给用户的答复"""
+    if not stop_reason or SQL_RETRY_STOP not in stop_reason:
+        return None
+    return stop_reason.split(SQL_RETRY_STOP, 1)[1].strip().strip(",").strip()
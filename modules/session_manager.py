@@ -1,14 +1,117 @@
+import os
 import logging
+import threading
+from collections import OrderedDict
 import chainlit as cl
 from utils.jsonhelp  import save_session_history_to_json
 from chainlit.data.sql_alchemy import SQLAlchemyDataLayer
 
 logger = logging.getLogger(__name__)
+
+# 每个线程在内存中保留的最近步骤数（chat_resumed 只使用最近 20 条消息）
+THREAD_HISTORY_CACHE_STEPS = int(os.getenv("THREAD_HISTORY_CACHE_STEPS", "100"))
+# 最多缓存的线程数，按 LRU 淘汰
+THREAD_HISTORY_CACHE_THREADS = int(os.getenv("THREAD_HISTORY_CACHE_THREADS", "256"))
+
+
+class ThreadHistoryCache:
+    """
+    按线程缓存最近的步骤（环形缓冲）：线程首次读取时从数据库整体加载一次，
+    之后数据层写入步骤时同步更新缓存（write-through），不再每条消息重新读取整个线程。
+    只更新已加载过的线程，未加载的线程下次读取时从数据库加载完整历史。
+    """
+
+    def __init__(self, max_steps: int = THREAD_HISTORY_CACHE_STEPS, max_threads: int = THREAD_HISTORY_CACHE_THREADS):
+        self.max_steps = max_steps
+        self.max_threads = max_threads
+        self._threads = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, thread_id: str) -> list | None:
+        """返回线程缓存的步骤列表（按创建顺序），未加载时返回 None"""
+        with self._lock:
+            steps = self._threads.get(thread_id)
+            if steps is None:
+                return None
+            self._threads.move_to_end(thread_id)
+            return list(steps.values())
+
+    def fill(self, thread_id: str, steps: list) -> None:
+        buffer = OrderedDict()
+        for step in steps[-self.max_steps:]:
+            buffer[step.get("id")] = self._slim(step)
+        with self._lock:
+            self._threads[thread_id] = buffer
+            self._threads.move_to_end(thread_id)
+            while len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+
+    def upsert_step(self, step: dict) -> None:
+        with self._lock:
+            buffer = self._threads.get(step.get("threadId"))
+            if buffer is None:
+                return
+            step_id = step.get("id")
+            if step_id in buffer:
+                # update_step 可能只带部分字段，保留已有的 input/output
+                merged = dict(buffer[step_id])
+                merged.update({k: v for k, v in self._slim(step).items() if v is not None})
+                buffer[step_id] = merged
+                return
+            buffer[step_id] = self._slim(step)
+            while len(buffer) > self.max_steps:
+                buffer.popitem(last=False)
+
+    def delete_step(self, step_id: str) -> None:
+        with self._lock:
+            for buffer in self._threads.values():
+                buffer.pop(step_id, None)
+
+    def drop(self, thread_id: str) -> None:
+        with self._lock:
+            self._threads.pop(thread_id, None)
+
+    @staticmethod
+    def _slim(step: dict) -> dict:
+        return {
+            "id": step.get("id"),
+            "type": step.get("type"),
+            "input": step.get("input"),
+            "output": step.get("output"),
+        }
+
+
+thread_history_cache = ThreadHistoryCache()
+
+
+class CachedSQLAlchemyDataLayer(SQLAlchemyDataLayer):
+    """写入步骤时同步更新 thread_history_cache 的数据层（update_step 内部也走 create_step）"""
+
+    async def create_step(self, step_dict):
+        await super().create_step(step_dict)
+        thread_history_cache.upsert_step(step_dict)
+
+    async def delete_step(self, step_id: str):
+        await super().delete_step(step_id)
+        thread_history_cache.delete_step(step_id)
+
+    async def delete_thread(self, thread_id: str):
+        await super().delete_thread(thread_id)
+        thread_history_cache.drop(thread_id)
+
+
+_data_layer = None
+_data_layer_lock = threading.Lock()
+
+
 @cl.data_layer
 def init_data_layer():
-    """配置SQLAlchemy数据层使用SQLite异步驱动"""
-    data_layer = SQLAlchemyDataLayer(conninfo="sqlite+aiosqlite:///./chainlit.db")
-    return data_layer
+    """配置SQLAlchemy数据层使用SQLite异步驱动；进程内共享同一个实例（及其连接池）"""
+    global _data_layer
+    with _data_layer_lock:
+        if _data_layer is None:
+            _data_layer = CachedSQLAlchemyDataLayer(conninfo="sqlite+aiosqlite:///./chainlit.db")
+        return _data_layer
 
 class SessionHistoryManager:
     def __init__(self, max_messages=10, max_message_length=2048):
@@ -27,11 +130,15 @@ class SessionHistoryManager:
 
         :param thread_id: 当前线程的ID。
         """
-        data_layer = init_data_layer()
-        thread_data = await data_layer.get_thread(thread_id)
+        steps = thread_history_cache.get(thread_id)
+        if steps is None:
+            thread_data = await init_data_layer().get_thread(thread_id)
+            steps = thread_data.get("steps", []) if thread_data else []
+            thread_history_cache.fill(thread_id, steps)
+            steps = thread_history_cache.get(thread_id)
 
         messages = []
-        for step in thread_data.get("steps", []):
+        for step in steps:
             role = "user" if step["type"] == "user_message" else "assistant"
             content = step.get("input") or step.get("output")
 
@@ -0,0 +1,162 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+import pandas as pd
+from modules.snapshot import load_snapshot_sheets
+from modules.executors import run_parse
+
+logger = logging.getLogger(__name__)
+
+
+def parse_sheets(abs_path: str, sheet_names: list) -> dict:
+    """解析指定工作表，返回 {工作表名: DataFrame}；在解析进程池中执行"""
+    return pd.read_excel(abs_path, sheet_name=sheet_names)
+
+
+class SheetCache:
+    """
+    进程级工作表缓存：以 (文件绝对路径, 工作表名, 文件mtime, 文件大小) 为键缓存解析后的 DataFrame，
+    文件被修改后键自动失效；按 LRU 淘汰，并限制缓存占用的总内存。
+    缓存中的 DataFrame 被多个调用方共享，调用方不得原地修改（需要修改时先 copy()）。
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024, max_entries: int = 64):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def file_version(file_path: str) -> tuple:
+        """返回文件版本标识 (绝对路径, mtime_ns, 文件大小)，文件不存在时抛出 FileNotFoundError"""
+        abs_path = os.path.abspath(file_path)
+        stat = os.stat(abs_path)
+        return abs_path, stat.st_mtime_ns, stat.st_size
+
+    def get(self, file_path: str, sheet_name: str) -> pd.DataFrame:
+        """读取工作表，命中缓存时直接返回已解析的 DataFrame"""
+        abs_path, mtime_ns, size = self.file_version(file_path)
+        key = (abs_path, sheet_name, mtime_ns, size)
+
+        with self._lock:
+            df = self._entries.get(key)
+            if df is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return df
+            self.misses += 1
+
+        # 解析放在锁外，避免一个慢解析阻塞其他工作表的命中
+        df = self._load(abs_path, [sheet_name])[sheet_name]
+        self._put(key, df)
+        logger.debug(f"工作表缓存未命中，已解析 {sheet_name}（{len(df)} 行）")
+        return df
+
+    def get_many(self, file_path: str, sheet_names: list) -> dict:
+        """
+        读取多个工作表，返回 {工作表名: DataFrame}。
+        未命中的工作表在一次打开工作簿的过程中一并解析，避免多表查询逐个重复打开与解析。
+        """
+        abs_path, mtime_ns, size = self.file_version(file_path)
+        result, missing = {}, []
+        with self._lock:
+            for sheet_name in dict.fromkeys(sheet_names):
+                key = (abs_path, sheet_name, mtime_ns, size)
+                df = self._entries.get(key)
+                if df is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    result[sheet_name] = df
+                else:
+                    self.misses += 1
+                    missing.append(sheet_name)
+
+        if missing:
+            loaded = self._load(abs_path, missing)
+            for sheet_name, df in loaded.items():
+                self._put((abs_path, sheet_name, mtime_ns, size), df)
+                result[sheet_name] = df
+            logger.debug(f"工作表缓存未命中，一次解析 {len(missing)} 个工作表: {missing}")
+        return result
+
+    @staticmethod
+    def _load(abs_path: str, sheet_names: list) -> dict:
+        """优先从列式快照内存映射读取，快照中没有的工作表在一次打开工作簿的过程中解析"""
+        loaded = load_snapshot_sheets(abs_path, sheet_names)
+        remaining = [name for name in sheet_names if name not in loaded]
+        if not remaining:
+            return loaded
+        try:
+            loaded.update(run_parse(parse_sheets, abs_path, remaining))
+        except Exception:
+            if len(remaining) == 1:
+                raise
+            # 某个工作表不存在等情况：逐个读取，让错误指向具体的工作表
+            for name in remaining:
+                loaded.update(run_parse(parse_sheets, abs_path, [name]))
+        return loaded
+
+    def _put(self, key: tuple, df: pd.DataFrame) -> None:
+        nbytes = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            # 同一工作表的旧版本不会再被命中，写入新版本时一并清理
+            stale = [k for k in self._entries if k[:2] == key[:2] and k != key]
+            for k in stale:
+                self._evict(k)
+            if key in self._entries:
+                return
+            if nbytes > self.max_bytes:
+                logger.warning(
+                    f"工作表 {key[1]} 占用 {nbytes} 字节，超过缓存上限 {self.max_bytes}，不缓存"
+                )
+                return
+            self._entries[key] = df
+            self._sizes[key] = nbytes
+            self.current_bytes += nbytes
+            while self._entries and (
+                self.current_bytes > self.max_bytes
+                or len(self._entries) > self.max_entries
+            ):
+                self._evict(next(iter(self._entries)))
+
+    def _evict(self, key: tuple) -> None:
+        self._entries.pop(key, None)
+        self.current_bytes -= self._sizes.pop(key, 0)
+        self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        """返回命中/未命中计数与当前占用，便于日志与监控"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+sheet_cache = SheetCache(
+    max_bytes=int(os.getenv("SHEET_CACHE_MAX_MB", "512")) * 1024 * 1024,
+    max_entries=int(os.getenv("SHEET_CACHE_MAX_ENTRIES", "64")),
+)
+
+
+def read_sheet(file_path: str, sheet_name: str) -> pd.DataFrame:
+    """通过进程级缓存读取工作表"""
+    return sheet_cache.get(file_path, sheet_name)
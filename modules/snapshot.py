@@ -0,0 +1,166 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow 未安装时快照不可用，读取路径回退到 xlsx
+    pa = None
+    feather = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.getenv("SHEET_SNAPSHOT_DIR", os.path.join("cache", "snapshots"))
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshot_path(file_path: str, snapshot_dir: str = None) -> str:
+    """工作簿对应的快照目录：{文件名}-{路径哈希前8位}"""
+    abs_path = os.path.abspath(file_path)
+    stem = os.path.splitext(os.path.basename(abs_path))[0]
+    path_hash = hashlib.sha1(abs_path.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(snapshot_dir or SNAPSHOT_DIR, f"{stem}-{path_hash}")
+
+
+def build_snapshot(file_path: str, snapshot_dir: str = None) -> dict:
+    """
+    把工作簿的每个工作表写成未压缩的 Feather（Arrow IPC）文件，可内存映射读取，
+    并写入记录源文件 sha256 / mtime / 大小的 manifest。
+    含混合类型列（报表排版类工作表）无法无损转换为 Arrow 的工作表不写快照，读取时回退到 xlsx。
+    """
+    if feather is None:
+        raise RuntimeError("生成快照需要安装 pyarrow")
+    abs_path = os.path.abspath(file_path)
+    out_dir = snapshot_path(abs_path, snapshot_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    stat = os.stat(abs_path)
+
+    sheets, skipped = {}, {}
+    for index, (sheet_name, df) in enumerate(pd.read_excel(abs_path, sheet_name=None).items()):
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            skipped[sheet_name] = str(e)
+            logger.info(f"工作表 {sheet_name} 含混合类型列，不生成快照: {e}")
+            continue
+        file_name = f"{index}.feather"
+        tmp_path = os.path.join(out_dir, file_name + ".tmp")
+        feather.write_feather(table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, os.path.join(out_dir, file_name))
+        sheets[sheet_name] = file_name
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "source": abs_path,
+        "sha256": file_sha256(abs_path),
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "sheets": sheets,
+        "skipped": skipped,
+    }
+    # manifest 最后写入：存在 manifest 即表示快照完整
+    tmp_manifest = os.path.join(out_dir, MANIFEST_NAME + ".tmp")
+    with open(tmp_manifest, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_manifest, os.path.join(out_dir, MANIFEST_NAME))
+    _manifests.pop(out_dir, None)
+    _stale.pop(out_dir, None)
+    return manifest
+
+
+# 快照目录 → (manifest, 已确认与源文件一致的 (mtime_ns, 大小))
+_manifests = {}
+# 快照目录 → 已确认快照过期时的 (源文件 mtime_ns, 大小, manifest mtime_ns)，
+# 源文件与 manifest 都未再变化时直接判为过期，不必每次读取工作表都重新计算整个文件的哈希
+_stale = {}
+
+
+def _fresh_manifest(abs_path: str, snapshot_dir: str = None) -> tuple:
+    """返回与源文件内容一致的 (快照目录, manifest)，快照不存在或已过期时返回 (快照目录, None)"""
+    out_dir = snapshot_path(abs_path, snapshot_dir)
+    stat = os.stat(abs_path)
+    current = (stat.st_mtime_ns, stat.st_size)
+    cached = _manifests.get(out_dir)
+    if cached and cached[1] == current:
+        return out_dir, cached[0]
+
+    manifest_file = os.path.join(out_dir, MANIFEST_NAME)
+    try:
+        stale_key = current + (os.stat(manifest_file).st_mtime_ns,)
+    except FileNotFoundError:
+        return out_dir, None
+    if _stale.get(out_dir) == stale_key:
+        return out_dir, None
+    with open(manifest_file, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        return out_dir, None
+    # mtime/大小不变时视为未修改；否则比较内容哈希（文件被复制或 touch 过但内容相同的情况）
+    if (manifest["mtime_ns"], manifest["size"]) != current and (
+        manifest["size"] != stat.st_size or manifest["sha256"] != file_sha256(abs_path)
+    ):
+        logger.info(f"快照已过期，源文件已修改: {abs_path}")
+        _stale[out_dir] = stale_key
+        return out_dir, None
+    _manifests[out_dir] = (manifest, current)
+    return out_dir, manifest
+
+
+def load_snapshot_sheets(file_path: str, sheet_names: list, snapshot_dir: str = None) -> dict:
+    """
+    从快照内存映射读取工作表，返回 {工作表名: DataFrame}，只包含快照中存在的工作表。
+    pyarrow 未安装、快照缺失或过期时返回空字典，由调用方回退到 xlsx 解析。
+    """
+    if feather is None:
+        return {}
+    try:
+        out_dir, manifest = _fresh_manifest(os.path.abspath(file_path), snapshot_dir)
+        if manifest is None:
+            return {}
+        result = {}
+        for sheet_name in sheet_names:
+            file_name = manifest["sheets"].get(sheet_name)
+            if file_name:
+                table = feather.read_table(os.path.join(out_dir, file_name), memory_map=True)
+                result[sheet_name] = table.to_pandas()
+        return result
+    except Exception as e:
+        logger.warning(f"读取快照失败，回退到 xlsx: {e}")
+        return {}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="把 Excel 工作簿转换为按工作表存储的 Feather 快照")
+    parser.add_argument("files", nargs="+", help="待转换的 xlsx 文件")
+    parser.add_argument("--out", default=None, help=f"快照根目录（默认 {SNAPSHOT_DIR}）")
+    args = parser.parse_args(argv)
+
+    for file_path in args.files:
+        started = time.perf_counter()
+        manifest = build_snapshot(file_path, args.out)
+        print(
+            f"{file_path} → {snapshot_path(file_path, args.out)}："
+            f"{len(manifest['sheets'])} 个工作表，跳过 {len(manifest['skipped'])} 个，"
+            f"耗时 {time.perf_counter() - started:.1f}s"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
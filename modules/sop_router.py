@@ -0,0 +1,160 @@
+import re
+import time
+import logging
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from modules.metrics import record_span
+from modules.log_setup import Clipped
+
+logger = logging.getLogger(__name__)
+
+START = "start"
+# 流程结束：selector_func 返回 None，此时消息中已含终止标记，由团队的终止条件结束对话
+END = None
+
+
+@dataclass(frozen=True)
+class Transition:
+    """
+    状态转移规则：上一位发言者为 source、消息中包含 require 中的全部标记、且不包含 exclude 中的任何标记时，
+    下一位发言者为 target（END 表示流程结束）。guard 为可选的附加条件，参数为完整消息列表。
+    """
+
+    source: str
+    target: str | None
+    require: tuple = ()
+    exclude: tuple = ()
+    guard: object = None
+    note: str = ""
+
+
+def transfer_transitions(agents: list) -> list:
+    """Manager 通过“转交给 xxx”分发任务的通用规则"""
+    return [
+        Transition("Manager", agent, require=(f"to:{agent}",), note=f"Manager → {agent}")
+        for agent in agents
+    ]
+
+
+def transfer_markers(agents: list) -> dict:
+    return {f"to:{agent}": [f"转交给 {agent}", f"转交给 **{agent}**"] for agent in agents}
+
+
+class SOPRouter:
+    """
+    表驱动的 SOP 状态机：状态为上一位发言者，按表中顺序取第一条满足条件的规则。
+    每个发言者的规则用到的标记词编译为一个交替正则，每条消息只扫描一次得到其中出现的标记集合；
+    标记词互相包含时（如“查询过程中出现错误”包含“错误”），匹配到长词即视为同时出现了被包含的标记。
+    未匹配到规则时返回 None，由 SelectorGroupChat 退回模型选择。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        markers: dict,
+        transitions: list,
+        ignore_case: tuple = (),
+        flow_logger: logging.Logger = None,
+    ):
+        self.name = name
+        self.logger = flow_logger or logger
+        self.transitions = defaultdict(list)
+        for transition in transitions:
+            self.transitions[transition.source].append(transition)
+
+        # 每个发言者只扫描其规则用到的标记词：词 → 标记集合（包含被该词包含的其他标记词对应的标记）
+        self._patterns = {}
+        for source, rules in self.transitions.items():
+            used = {marker for rule in rules for marker in rule.require + rule.exclude}
+            self._patterns[source] = self._compile({m: markers[m] for m in used}, ignore_case)
+        self._all_markers = self._compile(markers, ignore_case)
+
+        self._lock = threading.Lock()
+        self.counts = defaultdict(int)
+        self.seconds = defaultdict(float)
+
+    @staticmethod
+    def _compile(markers: dict, ignore_case: tuple = ()):
+        """
+        返回 (正则, 词 → 标记集合)。只有 ignore_case 中的标记忽略大小写（以小写为键），
+        其余按原样匹配，避免整体 IGNORECASE 让正则失去字面量前缀优化。
+        """
+        literals = {}
+        for marker, words in markers.items():
+            for word in words:
+                key = word.casefold() if marker in ignore_case else word
+                literals.setdefault(key, set()).add(marker)
+        if not literals:
+            return None, {}
+        literal_markers = {
+            word: frozenset(m for other, names in literals.items() if other in word for m in names) for word in literals
+        }
+        folded = {w.casefold() for marker in ignore_case for w in markers.get(marker, ())}
+        alternation = "|".join(
+            f"(?i:{re.escape(w)})" if w in folded else re.escape(w)
+            for w in sorted(literals, key=len, reverse=True)
+        )
+        return re.compile(alternation), literal_markers
+
+    def markers_in(self, content: str, source: str = None) -> set:
+        """消息中出现的标记集合；指定 source 时只查找该发言者规则用到的标记"""
+        if source is None:
+            pattern, literal_markers = self._all_markers
+        else:
+            pattern, literal_markers = self._patterns.get(source, (None, {}))
+        if pattern is None or not content:
+            return set()
+        found = set()
+        for word in {match.group(0) for match in pattern.finditer(content)}:
+            found |= literal_markers.get(word) or literal_markers[word.casefold()]
+        return found
+
+    def route(self, messages) -> tuple:
+        """返回 (下一位发言者, 命中的规则)；未命中任何规则时规则为 None"""
+        if not messages:
+            return self._first(START, set(), messages)
+        last_message = messages[-1]
+        content = last_message.content if isinstance(getattr(last_message, "content", None), str) else ""
+        source = last_message.source
+        return self._first(source, self.markers_in(content, source), messages)
+
+    def _first(self, source: str, markers: set, messages) -> tuple:
+        for transition in self.transitions.get(source, ()):
+            if not markers.issuperset(transition.require) or markers.intersection(transition.exclude):
+                continue
+            if transition.guard is not None and not transition.guard(messages):
+                continue
+            return transition.target, transition
+        return None, None
+
+    def select(self, messages) -> str | None:
+        """作为 SelectorGroupChat 的 selector_func 使用；每次转移计数并计时"""
+        started = time.perf_counter()
+        target, transition = self.route(messages)
+        elapsed = time.perf_counter() - started
+
+        source = messages[-1].source if messages else START
+        if transition is None:
+            key = f"{source}→model"
+            self.logger.warning(f"未匹配到明确流程规则，当前发言者: {source}")
+        else:
+            key = f"{source}→{target or 'end'}"
+            self.logger.info(transition.note or key)
+        if messages:
+            self.logger.debug("发言内容: %s", Clipped(getattr(messages[-1], "content", "")))
+
+        with self._lock:
+            self.counts[key] += 1
+            self.seconds[key] += elapsed
+        record_span("selector", key, elapsed)
+        return target
+
+    __call__ = select
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                key: {"count": count, "avg_us": round(self.seconds[key] / count * 1e6, 1)}
+                for key, count in self.counts.items()
+            }
@@ -16,39 +16,17 @@ from dotenv import load_dotenv
 import os
 from modules.tools.report_analyst_tools import sdq_tool, downtime_tool, total_score_tool, supplier_scoring_tool
 from modules.tools.chart_tools import chart_tool
+from modules.log_setup import setup_sop_logging, Clipped
+from modules.sop_router import SOPRouter
+from modules.sop_team_routes import SOP_MARKERS, SOP_TRANSITIONS
 current_dir = os.path.dirname(os.path.abspath(__file__))
 env_path = os.path.join(current_dir, '.env')
 load_dotenv(env_path)
 
-logging.basicConfig(level=logging.DEBUG)
-
-# For trace logging - 记录调试信息和执行流程
-trace_logger = logging.getLogger(TRACE_LOGGER_NAME)
-trace_logger.addHandler(logging.StreamHandler())
-trace_logger.setLevel(logging.DEBUG)
-
-# For structured message logging, such as low-level messages between agents.
-event_logger = logging.getLogger(EVENT_LOGGER_NAME)
-event_logger.addHandler(logging.StreamHandler())
-event_logger.setLevel(logging.DEBUG)
-
-
-today = datetime.now().strftime("%Y%m%d")
-log_filename = f"log/sop_flow_{today}.log"
-
-# 为 trace_logger 和 event_logger 都添加文件处理器
-file_handler_trace = logging.FileHandler(log_filename, encoding="utf-8")
-formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
-file_handler_trace.setFormatter(formatter)
-trace_logger.addHandler(file_handler_trace)
-
-file_handler_event = logging.FileHandler(log_filename, encoding="utf-8")
-file_handler_event.setFormatter(formatter)
-event_logger.addHandler(file_handler_event)
-
+# 日志经队列由后台线程写控制台与 log/sop_flow_*.log（按大小轮转），事件循环内记录日志不做磁盘 I/O
+setup_sop_logging(TRACE_LOGGER_NAME, EVENT_LOGGER_NAME)
 
 sop_logger = logging.getLogger(f"{TRACE_LOGGER_NAME}.sop_team")
-sop_logger.setLevel(logging.INFO)  
 
 # ---------- 1.  模型客户端 ----------
 
@@ -198,83 +176,8 @@ manager = EfficientAssistantAgent(
 from typing import Sequence
 from autogen_agentchat.messages import BaseAgentEvent, BaseChatMessage
 
-def sop_selector_func(messages: Sequence[BaseAgentEvent | BaseChatMessage]) -> str | None:
-    if not messages:
-        sop_logger.info("SOP流程开始 - 第一个消息，选择Manager")
-        return "Manager"
-    
-    last_message = messages[-1]
-    last_speaker = last_message.source
-    content = last_message.content if hasattr(last_message, 'content') else str(last_message)
-    
-    sop_logger.info(f"SOP流程控制 - 发言者: {last_speaker}")
-    sop_logger.info(f"发言内容: {content}")
-    
-    # 用户提问后 → Manager
-    if last_speaker == "user":
-        sop_logger.info("用户消息 → 选择Manager处理")
-        return "Manager"
-    
-    # Manager的流程分发
-    if last_speaker == "Manager":
-        if "转交给 intention_analyst" in content or "转交给 **intention_analyst**" in content:
-            sop_logger.info("Manager → intention_analyst (意图分析)")
-            return "intention_analyst"
-        elif "转交给 sql_specialist" in content or "转交给 **sql_specialist**" in content:
-            sop_logger.info("Manager → sql_specialist (数据查询)")
-            return "sql_specialist"
-        elif "转交给 multi_domain_analyst" in content or "转交给 **multi_domain_analyst**" in content:
-            sop_logger.info("Manager → multi_domain_analyst (多领域分析)")
-            return "multi_domain_analyst"
-        elif "转交给 data_analyst" in content or "转交给 **data_analyst**" in content:
-            sop_logger.info("Manager → data_analyst (数据分析)")
-            return "data_analyst"
-        elif "转交给 report_analyst" in content or "转交给 **report_analyst**" in content:
-            sop_logger.info("Manager → report_analyst (报告分析)")
-            return "report_analyst"
-        elif "FINAL:RETURN" in content:
-            sop_logger.info("Manager发出FINAL:RETURN - 流程结束")
-            return None  # 结束对话
-    
-    # intention_analyst 完成后 → Manager
-    elif last_speaker == "intention_analyst":
-        if "CATEGORY:" in content:
-            sop_logger.info("intention_analyst完成分类 → 返回Manager")
-            return "Manager"
-    
-    # sql_specialist 完成后 → Manager
-    elif last_speaker == "sql_specialist":
-        if "SQL_DONE" in content:
-            sop_logger.info("sql_specialist完成查询 → 返回Manager")
-            return "Manager"
-    
-    # report_analyst 完成后 → Manager (Manager会判断是否需要继续data_analyst)
-    elif last_speaker == "report_analyst":
-        if "SCORING_DONE" in content:
-            sop_logger.info("report_analyst完成打分 → 返回Manager")
-            return "Manager"
-        elif "需要补充" in content and ("数据" in content or "信息" in content):
-            sop_logger.info("report_analyst需要补充数据 → 转交Manager协调")
-            return "Manager"
-    
-    # data_analyst 完成后 → Manager
-    elif last_speaker == "data_analyst":
-        if "ANALYSIS_DONE" in content:
-            sop_logger.info("data_analyst完成分析 → 返回Manager")
-            return "Manager"
-        elif "需要补充数据" in content or "所需补充数据" in content:
-            sop_logger.info("data_analyst需要补充数据 → 转交Manager协调")
-            return "Manager"
-    
-    # multi_domain_analyst 完成后 → Manager
-    elif last_speaker == "multi_domain_analyst":
-        if "CONSULTATION_DONE" in content:
-            sop_logger.info("multi_domain_analyst完成咨询 → 返回Manager")
-            return "Manager"
-    
-    # 默认返回None，让模型选择
-    sop_logger.warning(f"未匹配到明确流程规则，当前发言者: {last_speaker}")
-    return None
+# 未匹配到规则时返回 None，让模型选择
+sop_selector_func = SOPRouter("sop_team", SOP_MARKERS, SOP_TRANSITIONS, flow_logger=sop_logger)
 
 class SOPTeam(SelectorGroupChat):
     def __init__(self, participants: List[AssistantAgent]):
@@ -352,7 +255,7 @@ def extract_final_answer(messages):
     
     result = final_answer if final_answer else "未能获取到最终答案"
     # 去除日志中的省略号，避免给人截断错觉
-    sop_logger.info(f"最终答案提取完成: {result}")
+    sop_logger.info("最终答案提取完成: %s", Clipped(result))
     return result
 
 
@@ -0,0 +1,46 @@
+# sop_team 的流程路由表：单独成模块，不依赖模型客户端配置，可直接导入测试
+from modules.sop_router import Transition, START, END, transfer_markers, transfer_transitions
+
+SOP_AGENTS = ["intention_analyst", "sql_specialist", "multi_domain_analyst", "data_analyst", "report_analyst"]
+
+SOP_MARKERS = {
+    **transfer_markers(SOP_AGENTS),
+    "final": ["FINAL:RETURN"],
+    "category": ["CATEGORY:"],
+    "sql_done": ["SQL_DONE"],
+    "scoring_done": ["SCORING_DONE"],
+    "analysis_done": ["ANALYSIS_DONE"],
+    "consultation_done": ["CONSULTATION_DONE"],
+    "need_more": ["需要补充"],
+    "need_more_data": ["需要补充数据", "所需补充数据"],
+    "data_word": ["数据", "信息"],
+}
+
+SOP_TRANSITIONS = [
+    Transition(START, "Manager", note="SOP流程开始 - 第一个消息，选择Manager"),
+    # 用户提问后 → Manager
+    Transition("user", "Manager", note="用户消息 → 选择Manager处理"),
+    # Manager的流程分发
+    *transfer_transitions(SOP_AGENTS),
+    Transition("Manager", END, require=("final",), note="Manager发出FINAL:RETURN - 流程结束"),
+    # 各专家完成后 → Manager（report_analyst 之后由 Manager 判断是否需要继续 data_analyst）
+    Transition("intention_analyst", "Manager", require=("category",), note="intention_analyst完成分类 → 返回Manager"),
+    Transition("sql_specialist", "Manager", require=("sql_done",), note="sql_specialist完成查询 → 返回Manager"),
+    Transition("report_analyst", "Manager", require=("scoring_done",), note="report_analyst完成打分 → 返回Manager"),
+    Transition(
+        "report_analyst",
+        "Manager",
+        require=("need_more", "data_word"),
+        note="report_analyst需要补充数据 → 转交Manager协调",
+    ),
+    Transition("data_analyst", "Manager", require=("analysis_done",), note="data_analyst完成分析 → 返回Manager"),
+    Transition(
+        "data_analyst", "Manager", require=("need_more_data",), note="data_analyst需要补充数据 → 转交Manager协调"
+    ),
+    Transition(
+        "multi_domain_analyst",
+        "Manager",
+        require=("consultation_done",),
+        note="multi_domain_analyst完成咨询 → 返回Manager",
+    ),
+]
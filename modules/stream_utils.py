@@ -0,0 +1,158 @@
+import os
+import re
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 分块方式：bytes（按字节数硬切分）、word（在空白处断开）、sentence（在句末标点/换行处断开）
+STREAM_CHUNK_MODE = os.getenv("STREAM_CHUNK_MODE", "sentence")
+# 每块最大字节数（UTF-8），单个词/句超出时按字节硬切分
+STREAM_CHUNK_BYTES = int(os.getenv("STREAM_CHUNK_BYTES", "2048"))
+# 每块之间的停顿（秒），默认不停顿
+STREAM_CHUNK_DELAY = float(os.getenv("STREAM_CHUNK_DELAY", "0"))
+
+_BREAK_PATTERNS = {
+    "word": re.compile(r"\S+\s*|\s+"),
+    "sentence": re.compile(r".*?(?:[。！？；!?;]+|[.](?=\s)|\n+|$)", re.DOTALL),
+}
+
+
+def _split_bytes(text: str, max_bytes: int) -> list:
+    """按 UTF-8 字节数切分，不会把一个字符拆开"""
+    chunks, current, size = [], [], 0
+    for ch in text:
+        width = len(ch.encode("utf-8"))
+        if current and size + width > max_bytes:
+            chunks.append("".join(current))
+            current, size = [], 0
+        current.append(ch)
+        size += width
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def split_chunks(text: str, mode: str = None, max_bytes: int = None) -> list:
+    """
+    把文本切成用于流式输出的块：按 mode 找到可断开的位置（词/句），
+    再把相邻的片段合并到不超过 max_bytes 的块中，尽量减少发送的帧数。
+    """
+    mode = mode or STREAM_CHUNK_MODE
+    max_bytes = max(1, max_bytes or STREAM_CHUNK_BYTES)
+    if not text:
+        return []
+    pattern = _BREAK_PATTERNS.get(mode)
+    if pattern is None:
+        if mode != "bytes":
+            logger.warning(f"未知的分块方式 {mode}，按字节切分")
+        return _split_bytes(text, max_bytes)
+
+    chunks, current, size = [], [], 0
+    for unit in (m.group(0) for m in pattern.finditer(text)):
+        if not unit:
+            continue
+        width = len(unit.encode("utf-8"))
+        if current and size + width > max_bytes:
+            chunks.append("".join(current))
+            current, size = [], 0
+        if width > max_bytes:
+            # 单个片段超出上限，硬切分后最后一段继续参与合并
+            *full, rest = _split_bytes(unit, max_bytes)
+            chunks.extend(full)
+            unit, width = rest, len(rest.encode("utf-8"))
+        current.append(unit)
+        size += width
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+async def stream_text(message, text: str, mode: str = None, max_bytes: int = None, delay: float = None) -> int:
+    """分块调用 message.stream_token 输出文本，返回发送的块数"""
+    delay = STREAM_CHUNK_DELAY if delay is None else delay
+    chunks = split_chunks(text, mode, max_bytes)
+    for index, chunk in enumerate(chunks):
+        await message.stream_token(chunk)
+        if delay > 0 and index < len(chunks) - 1:
+            await asyncio.sleep(delay)
+    return len(chunks)
+
+
+class FinalAnswerStream:
+    """
+    从 Manager 的流式输出中增量提取最终答案：只转发 start_marker（FINAL:RETURN）之后的内容，
+    遇到 stop_marker（TERMINATE）即停止，并去掉流程标记（与 extract_final_answer 的清理规则一致）。
+    标记可能被拆在相邻两个 token 中，因此末尾可能是标记前缀的部分先暂存，确认后再输出。
+    """
+
+    def __init__(
+        self,
+        start_marker: str = "FINAL:RETURN",
+        stop_marker: str = "TERMINATE",
+        drop_markers: tuple = ("DATA_ANALYSIS_DONE", "ANALYSIS_DONE", "SCORING_DONE", "CONSULTATION_DONE"),
+    ):
+        self.start_marker = start_marker
+        self.stop_marker = stop_marker
+        self.drop_markers = drop_markers
+        self.reset()
+
+    def reset(self) -> None:
+        """开始新的一条消息"""
+        self._buffer = ""
+        self._started = False
+        self._stopped = False
+        self._leading = True
+
+    @property
+    def started(self) -> bool:
+        return self._started
+
+    def _held_back(self, text: str, markers) -> int:
+        """text 末尾与任一标记前缀重合的最大长度"""
+        held = 0
+        for marker in markers:
+            for size in range(min(len(marker) - 1, len(text)), held, -1):
+                if text.endswith(marker[:size]):
+                    held = size
+                    break
+        return held
+
+    def feed(self, token: str) -> str:
+        """输入一个 token，返回可以立即输出的答案文本（可能为空）"""
+        if self._stopped or not token:
+            return ""
+        self._buffer += token
+        if not self._started:
+            index = self._buffer.find(self.start_marker)
+            if index < 0:
+                # 只保留可能构成起始标记的尾部
+                self._buffer = self._buffer[-(len(self.start_marker) - 1) :]
+                return ""
+            self._started = True
+            self._buffer = self._buffer[index + len(self.start_marker) :]
+
+        stop = self._buffer.find(self.stop_marker)
+        if stop >= 0:
+            self._stopped = True
+            ready, self._buffer = self._buffer[:stop], ""
+        else:
+            held = self._held_back(self._buffer, (self.stop_marker, "\\n", "\\'") + self.drop_markers)
+            ready, self._buffer = self._buffer[: len(self._buffer) - held], self._buffer[len(self._buffer) - held :]
+        return self._clean(ready)
+
+    def flush(self) -> str:
+        """消息结束时输出暂存的剩余文本"""
+        ready, self._buffer = ("" if self._stopped or not self._started else self._buffer), ""
+        self._stopped = True
+        return self._clean(ready)
+
+    def _clean(self, text: str) -> str:
+        for marker in self.drop_markers:
+            text = text.replace(marker, "")
+        text = text.replace("\\n", "\n").replace("\\'", "'")
+        if self._leading:
+            # 与 extract_final_answer 一致，去掉答案开头的空白
+            text = text.lstrip()
+            self._leading = not text
+        return text
@@ -0,0 +1,103 @@
+import os
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+# 空闲团队最多保留的数量
+SOP_TEAM_POOL_SIZE = int(os.getenv("SOP_TEAM_POOL_SIZE", "8"))
+# 同时运行的团队上限，超出的请求排队等待
+SOP_TEAM_MAX_CONCURRENCY = int(os.getenv("SOP_TEAM_MAX_CONCURRENCY", "16"))
+
+
+class TeamPool:
+    """
+    团队对象池：每个请求借出一个独立的团队（含各自的智能体与模型上下文），
+    用完后 reset() 清空对话状态再放回池中复用，避免重复构造；
+    借出数量受信号量限制，超出上限的请求排队，并记录排队与运行指标。
+    """
+
+    def __init__(self, factory, max_idle: int = SOP_TEAM_POOL_SIZE, max_concurrency: int = SOP_TEAM_MAX_CONCURRENCY):
+        self.factory = factory
+        self.max_idle = max_idle
+        self.max_concurrency = max_concurrency
+        self._idle = []
+        self._semaphore = None
+        self.created = 0
+        self.discarded = 0
+        self.completed = 0
+        self.in_flight = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # 在首次使用时创建，绑定到实际运行的事件循环
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    @asynccontextmanager
+    async def team(self):
+        """借出一个团队；with 块结束（含异常）后归还"""
+        semaphore = self._get_semaphore()
+        started = time.perf_counter()
+        if semaphore.locked():
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+            try:
+                await semaphore.acquire()
+            finally:
+                self.queued -= 1
+        else:
+            await semaphore.acquire()
+        waited = time.perf_counter() - started
+        self.total_wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        if waited > 1:
+            logger.info(f"团队排队等待 {waited:.2f}s，当前运行 {self.in_flight}，排队 {self.queued}")
+
+        self.in_flight += 1
+        team = self._idle.pop() if self._idle else self._create()
+        try:
+            yield team
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            try:
+                await self._release(team)
+            finally:
+                semaphore.release()
+
+    def _create(self):
+        self.created += 1
+        return self.factory()
+
+    async def _release(self, team) -> None:
+        try:
+            await team.reset()
+        except Exception as e:
+            # 运行中断等情况下团队状态不可用，直接丢弃
+            self.discarded += 1
+            logger.warning(f"团队重置失败，丢弃该实例: {e}")
+            return
+        if len(self._idle) < self.max_idle:
+            self._idle.append(team)
+        else:
+            self.discarded += 1
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "idle": len(self._idle),
+            "created": self.created,
+            "discarded": self.discarded,
+            "completed": self.completed,
+            "avg_wait_seconds": round(self.total_wait_seconds / self.completed, 4) if self.completed else 0.0,
+            "max_wait_seconds": round(self.max_wait_seconds, 4),
+        }
@@ -0,0 +1,48 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from modules.answer_cache import AnswerCache, normalize_task
+
+
+class AnswerCacheTest(unittest.TestCase):
+    def test_entries_expire_after_ttl(self):
+        cache = AnswerCache(ttl_seconds=10)
+        with mock.patch("modules.answer_cache.time.time", return_value=100.0):
+            cache.put(("k",), "答案")
+            self.assertEqual(cache.get(("k",)), ("答案", 100.0))
+        with mock.patch("modules.answer_cache.time.time", return_value=111.0):
+            self.assertIsNone(cache.get(("k",)))
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "entries": 0})
+
+    def test_evicts_least_recently_used(self):
+        cache = AnswerCache(max_entries=2)
+        cache.put(("a",), "A")
+        cache.put(("b",), "B")
+        cache.get(("a",))
+        cache.put(("c",), "C")
+        self.assertIsNone(cache.get(("b",)))
+        self.assertIsNotNone(cache.get(("a",)))
+
+
+class NormalizeTaskTest(unittest.TestCase):
+    def test_equivalent_questions_share_a_key(self):
+        self.assertEqual(
+            normalize_task("25财年实际分摊给CT的IT费用是多少？"),
+            normalize_task("FY25 Actual 分摊给 CT 的 IT 费用是多少"),
+        )
+        self.assertNotEqual(
+            normalize_task("25财年实际分摊给CT的IT费用是多少？"),
+            normalize_task("25财年实际分摊给XP的IT费用是多少？"),
+        )
+
+    def test_context_dependent_questions_are_not_cached(self):
+        self.assertIsNone(normalize_task("那26财年呢？"))
+
+
+if __name__ == "__main__":
+    unittest.main()
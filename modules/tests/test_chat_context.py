@@ -0,0 +1,43 @@
+import os
+import sys
+import unittest
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from modules.chat_context import ContextBuilder, summarize_message
+from modules.token_counter import count_tokens
+
+
+def make_history(turns):
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"第{i}个问题：FY25 IT 费用分摊给 CT 是多少？"})
+        answer_lines = [f"第{i}个回答：合计 -7,847,136.17"] + ["说明文字" * 20] * 10 + [f"| Oct | {i} |"] * 30
+        history.append({"role": "assistant", "content": "\n".join(answer_lines)})
+    return history
+
+
+class ContextBuilderTest(unittest.TestCase):
+    def test_without_history_returns_message(self):
+        builder = ContextBuilder()
+        self.assertEqual(builder.build("那26财年呢？", [{"role": "user", "content": "那26财年呢？"}]), "那26财年呢？")
+
+    def test_respects_budget_and_keeps_latest_turns(self):
+        builder = ContextBuilder(budget_tokens=600, turn_tokens=150)
+        history = make_history(10) + [{"role": "user", "content": "那26财年呢？"}]
+        task = builder.build("那26财年呢？", history)
+        self.assertLessEqual(count_tokens(task), 600)
+        self.assertIn("那26财年呢？", task)
+        self.assertIn("第9个回答：合计 -7,847,136.17", task)
+        self.assertNotIn("第0个问题", task)
+        # 由远及近排列：较早的问题出现在最近的回答之前
+        self.assertLess(task.index("第9个问题"), task.index("第9个回答"))
+
+    def test_summary_keeps_headline_and_numeric_lines(self):
+        content = "结论：合计 100\n无关说明\n| Oct | 1 |\n| Nov | 2 |"
+        self.assertEqual(summarize_message(content, 20), "结论：合计 100\n| Oct | 1 | …")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+import os
+import sys
+import sqlite3
+import tempfile
+import unittest
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import pandas as pd
+from modules.cost_db import WorkbookMirror
+
+
+def write_workbook(file_path, sheets):
+    with pd.ExcelWriter(file_path) as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+
+
+def bump_mtime(file_path):
+    stat = os.stat(file_path)
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+class WorkbookMirrorTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmpdir.name, "cost.xlsx")
+        self.mirror_dir = os.path.join(self.tmpdir.name, "mirror")
+        write_workbook(
+            self.file_path,
+            {
+                "CostDataBase": pd.DataFrame(
+                    {"Year": ["FY25", "FY25"], "Month": ["Oct", "Nov"], "Amount": [1.5, 2.5]}
+                ),
+                "CC Mapping": pd.DataFrame({"CostCenterNumber": [412011], "Business Line": ["CT"]}),
+            },
+        )
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_sheets_become_typed_tables(self):
+        mirror = WorkbookMirror(self.file_path, mirror_dir=self.mirror_dir)
+        mirror.ensure_fresh()
+        self.assertEqual(mirror.tables, {"CostDataBase", "CC Mapping"})
+        df = mirror.query('SELECT SUM(Amount) AS total FROM CostDataBase')
+        self.assertEqual(df["total"][0], 4.0)
+        with mirror.connection() as conn:
+            types = {row[1]: row[2] for row in conn.execute("PRAGMA table_info('CC Mapping')")}
+        self.assertEqual(types["CostCenterNumber"], "INTEGER")
+
+    def test_query_page_materializes_only_requested_rows(self):
+        mirror = WorkbookMirror(self.file_path, mirror_dir=self.mirror_dir)
+        page, total = mirror.query_page("SELECT Month, Amount FROM CostDataBase ORDER BY Amount", offset=1, limit=5)
+        self.assertEqual(total, 2)
+        self.assertEqual(page.to_dict("records"), [{"Month": "Nov", "Amount": 2.5}])
+
+    def test_connections_are_read_only(self):
+        mirror = WorkbookMirror(self.file_path, mirror_dir=self.mirror_dir)
+        with mirror.connection() as conn:
+            with self.assertRaises(sqlite3.Error):
+                conn.execute("DELETE FROM CostDataBase")
+
+    def test_existing_mirror_is_reused_and_rebuilt_on_change(self):
+        WorkbookMirror(self.file_path, mirror_dir=self.mirror_dir).ensure_fresh()
+        mirror = WorkbookMirror(self.file_path, mirror_dir=self.mirror_dir)
+        mirror.ensure_fresh()
+        self.assertEqual(mirror.rebuilds, 0)
+
+        write_workbook(
+            self.file_path,
+            {"CostDataBase": pd.DataFrame({"Year": ["FY26"], "Month": ["Oct"], "Amount": [9.0]})},
+        )
+        bump_mtime(self.file_path)
+        df = mirror.query("SELECT Year FROM CostDataBase")
+        self.assertEqual(df["Year"].tolist(), ["FY26"])
+        self.assertEqual(mirror.rebuilds, 1)
+        self.assertEqual(len(os.listdir(self.mirror_dir)), 1)
+
+
+# 与 generate_cost_rate_sql 生成的语句结构一致
+COST_RATE_SQL = """
+SELECT
+    cdb.`Month`,
+    SUM(COALESCE(t7.`RateNo`, 0)) AS `rate`,
+    cdb.`Amount` AS `amount`
+FROM
+    CostDataBase cdb
+LEFT JOIN
+    Table7 t7
+ON
+    cdb.`Month` = t7.`Month`
+    AND cdb.`Year` = t7.`Year`
+    AND cdb.`Scenario` = t7.`Scenario`
+    AND cdb.`Key` = t7.`Key`
+WHERE {where}
+GROUP BY
+    cdb.`Month`,
+    cdb.`Amount`
+ORDER BY
+    cdb.`Month`;
+"""
+
+
+class MirrorIndexTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        file_path = os.path.join(cls.tmpdir.name, "allocation.xlsx")
+        months = ["Oct", "Nov", "Dec", "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep"]
+        functions = [("IT", "WCW"), ("IT", "SAM"), ("IT Allocation", "480056 Cycle"), ("HR", "headcount")]
+        keys = [key for _, key in functions]
+        cost_rows, rate_rows = [], []
+        for year in ["FY25", "FY26"]:
+            for scenario in ["Actual", "Budget1"]:
+                for month in months:
+                    for function, key in functions:
+                        cost_rows.append([year, scenario, function, key, month, 100.0])
+                    for key in keys:
+                        for cc in range(412001, 412011):
+                            bl = "CT" if cc % 2 else "XP"
+                            rate_rows.append([bl, cc, year, scenario, month, key, 0.1])
+        write_workbook(
+            file_path,
+            {
+                "CostDataBase": pd.DataFrame(
+                    cost_rows, columns=["Year", "Scenario", "Function", "Key", "Month", "Amount"]
+                ),
+                "Table7": pd.DataFrame(
+                    rate_rows, columns=["BL", "CC", "Year", "Scenario", "Month", "Key", "RateNo"]
+                ),
+            },
+        )
+        cls.mirror = WorkbookMirror(file_path, mirror_dir=os.path.join(cls.tmpdir.name, "mirror"))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def query_plan(self, where):
+        with self.mirror.connection() as conn:
+            rows = conn.execute("EXPLAIN QUERY PLAN " + COST_RATE_SQL.format(where=where))
+            return [row[3] for row in rows]
+
+    def assert_tables_searched_by_index(self, plan):
+        table_steps = [step for step in plan if step.startswith(("SCAN", "SEARCH"))]
+        self.assertEqual(len(table_steps), 2, plan)
+        for step in table_steps:
+            self.assertIn("USING INDEX idx_", step, plan)
+
+    def test_join_uses_composite_index(self):
+        plan = self.query_plan("""cdb."Year" = 'FY25' AND cdb."Scenario" = 'Actual'""")
+        self.assert_tables_searched_by_index(plan)
+        self.assertTrue(
+            any("SEARCH t7 USING INDEX idx_Table7_Year_Scenario_Key_Month" in step for step in plan),
+            plan,
+        )
+
+    def test_filtered_join_uses_indexes(self):
+        for where in [
+            """cdb."Year" = 'FY25' AND cdb."Scenario" = 'Actual' AND cdb."Function" = 'IT' AND t7."bl" = 'CT'""",
+            """cdb."Year" = 'FY25' AND cdb."Scenario" = 'Actual' AND t7."cc" = '412003'""",
+        ]:
+            self.assert_tables_searched_by_index(self.query_plan(where))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import sys
+import tempfile
+import unittest
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import pandas as pd
+from modules.domain_index import DomainIndex, FieldDomain
+
+
+class FieldDomainTest(unittest.TestCase):
+    def setUp(self):
+        self.domain = FieldDomain(["IT", "IT Allocation", "HR", "HR Allocation", "headcount", "Headcount"])
+
+    def test_exact_membership(self):
+        self.assertTrue(self.domain.contains("IT Allocation"))
+        self.assertFalse(self.domain.contains("it allocation"))
+
+    def test_casefold_matches(self):
+        self.assertEqual(self.domain.casefold_matches("it allocation"), ["IT Allocation"])
+        self.assertEqual(self.domain.casefold_matches("HEADCOUNT"), ["Headcount", "headcount"])
+
+    def test_prefix_matches(self):
+        self.assertEqual(self.domain.prefix_matches("hr"), ["HR", "HR Allocation"])
+        self.assertEqual(self.domain.prefix_matches("it", limit=1), ["IT"])
+        self.assertEqual(self.domain.prefix_matches("zz"), [])
+
+    def test_similar_ranks_closest_values_first(self):
+        keys = FieldDomain(["480055 Cycle", "480056 Cycle", "WCW", "SAM"])
+        self.assertEqual(keys.similar("480056cycle", limit=1)[0][0], "480056 Cycle")
+        ccs = FieldDomain(["412011", "412001", "413021"])
+        self.assertEqual(ccs.similar("412O11")[0][0], "412011")
+        self.assertEqual(ccs.similar("Procurement"), [])
+
+
+class DomainIndexTest(unittest.TestCase):
+    def test_domain_uses_string_values_and_skips_blanks(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_path = os.path.join(tmpdir, "book.xlsx")
+            pd.DataFrame(
+                {"CostCenterNumber": [412011, 413001, 415005], "Business Line": ["CT", None, "MP"]}
+            ).to_excel(file_path, sheet_name="CC Mapping", index=False)
+            index = DomainIndex(file_path)
+            self.assertEqual(
+                index.domain("CC Mapping", "CostCenterNumber").values, {"412011", "413001", "415005"}
+            )
+            self.assertEqual(index.domain("CC Mapping", "Business Line").values, {"CT", "MP"})
+            self.assertEqual(
+                index.mapping("CC Mapping", "Business Line", "CostCenterNumber"),
+                {"ct": ["412011"], "mp": ["415005"]},
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
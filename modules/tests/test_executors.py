@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+import asyncio
+import inspect
+import unittest
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from modules.executors import LoopLagMonitor, async_tool
+
+
+def slow_query(query: str, delay: float = 0.0) -> str:
+    time.sleep(delay)
+    return f"查询成功: {query}"
+
+
+class AsyncToolTest(unittest.TestCase):
+    def test_wrapper_is_coroutine_with_same_signature(self):
+        tool = async_tool(slow_query)
+        self.assertTrue(inspect.iscoroutinefunction(tool))
+        self.assertEqual(inspect.signature(tool), inspect.signature(slow_query))
+        self.assertEqual(asyncio.run(tool("SELECT 1")), "查询成功: SELECT 1")
+
+    def test_timeout_returns_error_message(self):
+        tool = async_tool(slow_query, timeout=0.05)
+        self.assertIn("执行超时", asyncio.run(tool("SELECT 1", delay=0.5)))
+
+
+class LoopLagMonitorTest(unittest.TestCase):
+    def test_detects_blocking_call(self):
+        monitor = LoopLagMonitor(interval=0.01, warn_seconds=0.1)
+
+        async def scenario():
+            monitor.ensure_started()
+            await asyncio.sleep(0.05)
+            time.sleep(0.2)  # 模拟在事件循环中执行的同步解析
+            await asyncio.sleep(0.05)
+            monitor.stop()
+
+        asyncio.run(scenario())
+        stats = monitor.stats()
+        self.assertGreaterEqual(stats["max"], 0.15)
+        self.assertEqual(stats["stalls"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
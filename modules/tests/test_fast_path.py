@@ -0,0 +1,45 @@
+import os
+import sys
+import unittest
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from modules.fast_path import answer_allocation_question, parse_allocation_question
+
+
+class ParseAllocationQuestionTest(unittest.TestCase):
+    def test_parses_chinese_question(self):
+        self.assertEqual(
+            parse_allocation_question("25财年实际分摊给CT的IT费用是多少？"),
+            {"year": "FY25", "scenario": "Actual", "function": "IT", "bl": "CT", "cc": ""},
+        )
+
+    def test_parses_english_question_with_cost_center(self):
+        self.assertEqual(
+            parse_allocation_question("What was the BGT HR cost allocated to 412011 in FY26?"),
+            {"year": "FY26", "scenario": "Budget1", "function": "HR", "bl": "", "cc": "412011"},
+        )
+
+    def test_ambiguous_questions_fall_back(self):
+        for question in [
+            "25财年分摊给CT的IT费用是多少？",  # 缺少场景
+            "25财年实际分摊给CT和XP的IT费用",  # 多个BL
+            "25财年实际分摊给CT的IT费用10月是多少",  # 问的是单月
+            "25财年实际IT费用是多少？",  # 不是分摊问题
+            "25财年实际分摊给999999的IT费用",  # 成本中心不存在
+            "FY25 Budget2 IT cost allocated to CT",  # 未知的预算版本
+            "25财年BGT2分摊给CT的IT费用是多少？",  # 未知的预算版本
+        ]:
+            self.assertIsNone(parse_allocation_question(question), question)
+
+
+class AnswerAllocationQuestionTest(unittest.TestCase):
+    def test_matches_reference_answer(self):
+        # 参考答案来自工作簿“问题”页 Question3：-7847136.176222（按月保留两位小数后求和）
+        answer = answer_allocation_question("25财年实际分摊给CT的IT费用是多少？")
+        self.assertIn("-7,847,136.17", answer)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import sys
+import asyncio
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import httpx
+from modules.http_pool import PoolStatsTransport
+import modules.metrics as metrics
+from modules.metrics import gauges_to_prometheus, register_gauges
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = b'{"choices": []}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpPoolTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/v1/chat/completions"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def run_requests(self, keepalive_expiry: float, pause: float) -> dict:
+        transport = PoolStatsTransport(limits=httpx.Limits(max_connections=4, keepalive_expiry=keepalive_expiry))
+
+        async def scenario():
+            async with httpx.AsyncClient(transport=transport) as client:
+                for _ in range(3):
+                    response = await client.post(self.url, json={"messages": []})
+                    self.assertEqual(response.status_code, 200)
+                    await asyncio.sleep(pause)
+                return transport.stats()
+
+        return asyncio.run(scenario())
+
+    def test_connection_is_reused_across_turns(self):
+        stats = self.run_requests(keepalive_expiry=60, pause=0.2)
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["new_connections"], 1)
+        self.assertEqual(stats["idle_connections"], 1)
+
+    def test_expired_keepalive_reconnects(self):
+        stats = self.run_requests(keepalive_expiry=0.05, pause=0.2)
+        self.assertEqual(stats["new_connections"], 3)
+        self.assertEqual(stats["reuse_rate"], 0.0)
+
+    def test_pool_stats_are_exported_as_gauges(self):
+        register_gauges("test_pool", lambda: {"connections": 2, "reuse_rate": 0.5})
+        try:
+            text = gauges_to_prometheus()
+        finally:
+            metrics._gauge_providers.pop("test_pool")
+        self.assertIn("sop_test_pool_connections 2", text)
+        self.assertIn("sop_test_pool_reuse_rate 0.5", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
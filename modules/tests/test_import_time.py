@@ -0,0 +1,49 @@
+import os
+import sys
+import json
+import subprocess
+import unittest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+
+# import appmain 在框架（chainlit、pandas）之外允许的耗时（秒）
+APPMAIN_IMPORT_BUDGET = float(os.getenv("APPMAIN_IMPORT_BUDGET", "1.5"))
+# 这些模块只应在首次处理问题时加载
+LAZY_MODULES = ["modules.CostAnalyst", "autogen_ext.models.openai", "autogen_agentchat.agents", "boto3", "pyodbc"]
+
+PROBE = """
+import sys, json, time
+started = time.perf_counter()
+import chainlit, chainlit.server, pandas
+framework = time.perf_counter() - started
+started = time.perf_counter()
+import appmain
+elapsed = time.perf_counter() - started
+print(json.dumps({"framework": framework, "appmain": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+
+class ImportTimeTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # 在独立进程中导入，避免受其他测试已加载模块的影响
+        completed = subprocess.run(
+            [sys.executable, "-c", PROBE],
+            cwd=PROJECT_ROOT,
+            capture_output=True,
+            text=True,
+            timeout=120,
+        )
+        if completed.returncode != 0:
+            raise AssertionError(f"import appmain 失败:\n{completed.stderr[-2000:]}")
+        cls.result = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    def test_heavy_modules_are_not_imported_at_startup(self):
+        self.assertEqual(self.result["loaded"], [])
+
+    def test_import_within_budget(self):
+        self.assertLess(self.result["appmain"], APPMAIN_IMPORT_BUDGET, self.result)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from autogen_agentchat.messages import TextMessage
+
+import modules.intent_rules as intent_rules
+from modules.chat_context import CONTEXT_TEMPLATE
+from modules.intent_rules import COST_DATA_CATEGORY, classify_intent, current_request, rule_classified_cost_data
+from modules.sop_router import SOPRouter, Transition, transfer_markers, transfer_transitions
+
+
+class ClassifyIntentTest(unittest.TestCase):
+    def test_obvious_cost_questions_are_confident(self):
+        for question in [
+            "24财年IT费用包括？",
+            "FY25 IT 分摊到 CT 的实际金额为多少",
+            "请问FY26预算HR费用每月明细",
+            "查一下25财年的分摊比例",
+        ]:
+            result = classify_intent(question)
+            self.assertEqual(result.category, COST_DATA_CATEGORY, (question, result))
+
+    def test_ambiguous_or_unrelated_questions_go_to_model(self):
+        for question in ["你好，你能做什么？", "那HR呢？", "IT费用是什么意思", "帮我看一下SDQ供应商评分", "FY25 是哪一年"]:
+            result = classify_intent(question)
+            self.assertIsNone(result.category, (question, result))
+
+    def test_only_current_request_is_classified(self):
+        task = CONTEXT_TEMPLATE.format(history="用户：FY25 IT 分摊到 CT 的实际金额是多少", current_message="谢谢，你能做什么？")
+        self.assertTrue(current_request(task).strip().startswith("谢谢，你能做什么？"))
+        self.assertNotIn("分摊", current_request(task))
+        self.assertIsNone(classify_intent(task).category)
+
+
+AGENTS = ["intention_analyst", "excel_sql_specialist"]
+# 与成本 SOP 路由表中 Manager 分发部分相同的本地路由表
+ROUTER = SOPRouter(
+    "test",
+    {**transfer_markers(AGENTS), "final": ["FINAL:RETURN"]},
+    [
+        Transition("Manager", "excel_sql_specialist", exclude=("final",), guard=rule_classified_cost_data),
+        *transfer_transitions(AGENTS),
+        Transition("Manager", None, require=("final",)),
+    ],
+)
+
+
+class SelectorRoutingTest(unittest.TestCase):
+    def route(self, question, manager_reply="转交给 intention_analyst 进行意图识别"):
+        messages = [TextMessage(source="user", content=question), TextMessage(source="Manager", content=manager_reply)]
+        return ROUTER(messages)
+
+    def test_confident_question_skips_intention_analyst(self):
+        self.assertEqual(self.route("FY25 IT 分摊到 CT 的实际金额为多少"), "excel_sql_specialist")
+
+    def test_ambiguous_question_keeps_intention_analyst(self):
+        self.assertEqual(self.route("那HR呢？"), "intention_analyst")
+
+    def test_rules_can_be_disabled(self):
+        with mock.patch.object(intent_rules, "INTENT_RULES_ENABLED", False):
+            self.assertEqual(self.route("FY25 IT 分摊到 CT 的实际金额为多少"), "intention_analyst")
+
+    def test_only_first_dispatch_is_classified(self):
+        messages = [
+            TextMessage(source="user", content="FY25 IT 分摊到 CT 的实际金额为多少"),
+            TextMessage(source="Manager", content="转交给 intention_analyst"),
+            TextMessage(source="intention_analyst", content="CATEGORY:成本分析-需数据"),
+            TextMessage(source="Manager", content="转交给 intention_analyst"),
+        ]
+        self.assertEqual(ROUTER(messages), "intention_analyst")
+
+    def test_final_answer_is_not_rerouted(self):
+        self.assertIsNone(self.route("FY25 IT 分摊到 CT 的实际金额为多少", "FINAL:RETURN\n-7,847,136.17\nTERMINATE"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import sys
+import queue
+import signal
+import logging
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import modules.log_setup as log_setup
+from modules.log_setup import Clipped, DroppingQueueHandler, PrefixFilter, SamplingFilter, set_log_level
+
+
+def make_record(name="autogen_agentchat.events", level=logging.INFO, msg="消息"):
+    return logging.LogRecord(name, level, __file__, 1, msg, None, None)
+
+
+class LogSetupTest(unittest.TestCase):
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+        for _ in range(5):
+            handler.emit(make_record())
+        self.assertEqual(handler.queue.qsize(), 2)
+        self.assertEqual(handler.dropped, 3)
+
+    def test_sampling_keeps_warnings(self):
+        sampler = SamplingFilter(0.0)
+        self.assertFalse(sampler.filter(make_record(level=logging.INFO)))
+        self.assertTrue(sampler.filter(make_record(level=logging.WARNING)))
+        self.assertTrue(SamplingFilter(1.0).filter(make_record()))
+
+    def test_prefix_filter_limits_flow_file_to_sop_loggers(self):
+        prefix = PrefixFilter(["autogen_agentchat.trace", "autogen_agentchat.events"])
+        self.assertTrue(prefix.filter(make_record("autogen_agentchat.trace.Cost_sop_team")))
+        self.assertFalse(prefix.filter(make_record("httpx")))
+
+    def test_clipped_formats_only_when_emitted(self):
+        class Expensive:
+            calls = 0
+
+            def __str__(self):
+                Expensive.calls += 1
+                return "x" * 50
+
+        logger = logging.getLogger("test_log_setup.clipped")
+        logger.setLevel(logging.INFO)
+        logger.debug("发言内容: %s", Clipped(Expensive(), limit=10))
+        self.assertEqual(Expensive.calls, 0)
+        self.assertEqual(str(Clipped(Expensive(), limit=10)), "xxxxxxxxxx...（共 50 字符）")
+
+    def test_flow_log_file_rotates_by_size(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            log_file = os.path.join(tmpdir, "sop_flow.log")
+            original = (log_setup.LOG_MAX_BYTES, log_setup.LOG_BACKUP_COUNT)
+            log_setup.LOG_MAX_BYTES, log_setup.LOG_BACKUP_COUNT = 200, 2
+            try:
+                console, file_handler = log_setup._build_handlers(log_file, ["autogen_agentchat.trace"])
+                for _ in range(20):
+                    file_handler.handle(make_record("autogen_agentchat.trace", msg="x" * 50))
+                file_handler.close()
+            finally:
+                log_setup.LOG_MAX_BYTES, log_setup.LOG_BACKUP_COUNT = original
+            self.assertEqual(sorted(os.listdir(tmpdir)), ["sop_flow.log", "sop_flow.log.1", "sop_flow.log.2"])
+
+    def test_level_can_be_changed_at_runtime(self):
+        logger = logging.getLogger("test_log_setup.runtime")
+        logger.setLevel(logging.INFO)
+        set_log_level("DEBUG", "test_log_setup.runtime")
+        self.assertTrue(logger.isEnabledFor(logging.DEBUG))
+
+
+    @unittest.skipUnless(hasattr(signal, "SIGUSR1"), "SIGUSR1 仅 POSIX 可用")
+    def test_signal_toggle_is_installed_from_main_thread_only(self):
+        previous = signal.getsignal(signal.SIGUSR1)
+        try:
+            with mock.patch.object(log_setup, "_signal_toggle_installed", False):
+                # SOP 模块在工作线程中懒加载时装不上信号处理
+                results = []
+                worker = threading.Thread(target=lambda: results.append(log_setup.install_signal_toggle()))
+                worker.start()
+                worker.join()
+                self.assertEqual(results, [False])
+                self.assertTrue(log_setup.install_signal_toggle())
+                self.assertNotIn(signal.getsignal(signal.SIGUSR1), (signal.SIG_DFL, previous))
+        finally:
+            signal.signal(signal.SIGUSR1, previous)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import asyncio
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import modules.metrics as metrics
+from modules.executors import async_tool
+from modules.metrics import PipelineMetrics, record_cache_hit, request_trace, span
+
+
+def lookup_rate(function: str) -> float:
+    # 在工具线程中执行，仍应记录到发起调用的请求链路
+    record_cache_hit("tool_memo")
+    return 0.25
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.jsonl = os.path.join(self.tmpdir.name, "sop_metrics.jsonl")
+        self.patches = [
+            mock.patch.object(metrics, "SOP_METRICS_JSONL", self.jsonl),
+            mock.patch.object(metrics, "pipeline_metrics", PipelineMetrics(samples=100)),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        self.tmpdir.cleanup()
+
+    def test_spans_are_recorded_across_tool_threads(self):
+        async def scenario():
+            with request_trace("sop_request") as trace:
+                with span("model", "qwen", stream=True) as attrs:
+                    attrs["prompt_tokens"] = 120
+                    attrs["completion_tokens"] = 30
+                await async_tool(lookup_rate)("IT")
+            return trace
+
+        trace = asyncio.run(scenario())
+        stages = [s["stage"] for s in trace.spans]
+        self.assertEqual(stages, ["model", "tool"])
+        self.assertEqual(trace.cache_hits, {"tool_memo": 1})
+        summary = trace.summary()
+        self.assertEqual(summary["stages"]["model"]["prompt_tokens"], 120)
+
+        # 导出在后台线程执行，不在请求路径上写文件
+        metrics.flush_exports(timeout=5)
+        with open(self.jsonl, encoding="utf-8") as f:
+            record = json.loads(f.readline())
+        self.assertEqual(record["trace_id"], trace.trace_id)
+        self.assertEqual(len(record["spans"]), 2)
+
+    def test_spans_outside_request_are_ignored(self):
+        with span("tool", "sqlQuery"):
+            pass
+        self.assertEqual(metrics.pipeline_metrics.summary()["stages"], {})
+
+    def test_quantiles_and_prometheus_export(self):
+        for duration in range(1, 101):
+            trace = metrics.RequestTrace("sop_request")
+            trace.add_span("tool", "sqlQuery", duration / 100, prompt_tokens=0)
+            trace.finish()
+            metrics.pipeline_metrics.observe(trace)
+        metrics.pipeline_metrics.record_cache_hit("answer")
+
+        stats = metrics.pipeline_metrics.summary()["stages"]["tool/sqlQuery"]
+        self.assertEqual(stats["count"], 100)
+        self.assertAlmostEqual(stats["p50"], 0.51)
+        self.assertAlmostEqual(stats["p95"], 0.96)
+
+        text = metrics.pipeline_metrics.to_prometheus()
+        self.assertIn('sop_stage_seconds{stage="tool",name="sqlQuery",quantile="0.95"} 0.960000', text)
+        self.assertIn('sop_stage_seconds_count{stage="tool",name="sqlQuery"} 100', text)
+        self.assertIn('sop_cache_hits_total{cache="answer"} 1', text)
+
+    def test_export_runs_off_the_calling_thread(self):
+        written_by = []
+        original_export = metrics._export
+
+        def export(*args):
+            written_by.append(threading.current_thread().name)
+            original_export(*args)
+
+        with mock.patch.object(metrics, "_export", export):
+            with request_trace("sop_request"):
+                pass
+            metrics.flush_exports(timeout=5)
+        self.assertEqual(len(written_by), 1)
+        self.assertTrue(written_by[0].startswith("sop-metrics"), written_by)
+        self.assertTrue(os.path.exists(self.jsonl))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import re
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import pandas as pd
+from modules.cost_db import WorkbookMirror
+from modules.tools import cost_tools
+
+
+class SqlQueryPagingTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmpdir.name, "cost.xlsx")
+        pd.DataFrame({"Month": ["Oct", "Nov", "Dec"] * 3, "Amount": range(9)}).to_excel(
+            self.file_path, sheet_name="CostDataBase", index=False
+        )
+        mirror = WorkbookMirror(self.file_path, mirror_dir=os.path.join(self.tmpdir.name, "mirror"))
+        patches = [
+            mock.patch.object(cost_tools, "get_mirror", return_value=mirror),
+            mock.patch.object(cost_tools, "SQL_RESULT_PREVIEW_ROWS", 4),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_large_result_returns_preview_and_cursor(self):
+        result = cost_tools.sqlQuery(self.file_path, "SELECT * FROM CostDataBase", ["CostDataBase"])
+        self.assertIn("共 9 行数据，以下仅展示前 4 行", result)
+        cursor_id = re.search(r"结果游标：(\w+)", result).group(1)
+
+        self.assertIn("下一页 offset=4", result)
+
+        last_page = cost_tools.fetch_result_page(cursor_id, 8)
+        self.assertIn("第 9~9 行（共 9 行，已是最后一页）", last_page)
+        self.assertIn("8", last_page.splitlines()[-1])
+        self.assertIn("超出范围", cost_tools.fetch_result_page(cursor_id, 9))
+
+        totals = cost_tools.aggregate_result(cursor_id, "Month, SUM(Amount) AS total", "Month")
+        self.assertIn("返回 3 行数据", totals)
+        self.assertRegex(totals, r"Oct\s+9")
+
+    def test_truncated_page_resumes_at_first_unshown_row(self):
+        # 输出预算只够展示部分行时，下一页从第一条未展示的行开始
+        with mock.patch("modules.result_format.RESULT_TOKEN_BUDGET", 12):
+            result = cost_tools.sqlQuery(
+                self.file_path, "SELECT Amount * 1000003 AS Amount FROM CostDataBase", ["CostDataBase"]
+            )
+            shown = int(re.search(r"以下仅展示前 (\d+) 行", result).group(1))
+            self.assertLess(shown, 4)
+            cursor_id = re.search(r"结果游标：(\w+)", result).group(1)
+            offset = int(re.search(r"下一页 offset=(\d+)", result).group(1))
+            self.assertEqual(offset, shown)
+
+            seen = [int(v) for v in re.findall(r"^\d+$", result, re.M)]
+            while True:
+                page = cost_tools.fetch_result_page(cursor_id, offset)
+                self.assertIn(f"第 {offset + 1}~", page)
+                seen += [int(v) for v in re.findall(r"^\d+$", page, re.M)]
+                next_offset = re.search(r"下一页 offset=(\d+)", page)
+                if next_offset is None:
+                    break
+                offset = int(next_offset.group(1))
+        self.assertEqual(seen, [i * 1000003 for i in range(9)])
+
+    def test_small_result_keeps_full_output(self):
+        result = cost_tools.sqlQuery(self.file_path, "SELECT * FROM CostDataBase LIMIT 2", ["CostDataBase"])
+        self.assertTrue(result.startswith("查询成功，返回 2 行数据:"))
+        self.assertNotIn("结果游标", result)
+
+    def test_unknown_cursor(self):
+        self.assertIn("不存在", cost_tools.fetch_result_page("nope", 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
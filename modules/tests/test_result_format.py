@@ -0,0 +1,52 @@
+import os
+import sys
+import unittest
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import pandas as pd
+from modules.result_format import serialize_frame, serialize_rows
+from modules.token_counter import count_tokens, estimate_tokens
+
+
+class SerializeFrameTest(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame(
+            {
+                "Year": ["FY25"] * 3,
+                "Month": ["Oct", "Nov", "Dec"],
+                "rate": [0.336050, 0.336050, 0.336050],
+                "amount": [0.0, -2357417.4400001, 1.5],
+                "Note": [None, None, None],
+            }
+        )
+
+    def test_prunes_empty_and_constant_dimension_columns(self):
+        text = serialize_frame(self.df)
+        self.assertTrue(text.startswith("各行相同：Year=FY25\n"))
+        self.assertNotIn("Note", text)
+        # 数值列即使取值相同也逐行保留，且浮点数去掉多余小数位
+        self.assertIn("Nov\t0.33605\t-2357417.44", text)
+        self.assertIn("Oct\t0.33605\t0", text)
+
+    def test_is_denser_than_to_string(self):
+        self.assertLess(count_tokens(serialize_frame(self.df)), count_tokens(self.df.to_string()))
+
+    def test_budget_truncates_rows(self):
+        df = pd.DataFrame({"Key": [f"key{i}" for i in range(200)], "Amount": range(200)})
+        text, shown = serialize_rows(df, budget_tokens=200)
+        self.assertLess(shown, 200)
+        self.assertIn(f"省略其余 {200 - shown} 行", text)
+        self.assertLessEqual(count_tokens(text), 220)
+
+
+class EstimateTokensTest(unittest.TestCase):
+    def test_heuristic_counts(self):
+        self.assertEqual(estimate_tokens("查询成功"), 4)
+        self.assertEqual(estimate_tokens("1234567"), 3)
+        self.assertEqual(estimate_tokens("amount      rate"), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
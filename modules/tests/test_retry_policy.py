@@ -0,0 +1,102 @@
+import os
+import sys
+import asyncio
+import unittest
+from unittest import mock
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from autogen_agentchat.conditions import MaxMessageTermination
+from autogen_agentchat.messages import TextMessage
+
+from modules.metrics import request_trace
+from modules.retry_policy import (
+    RETRY_FAILURE_PREFIX,
+    SQLRetryPolicy,
+    classify_failure,
+    retry_stats,
+    retry_stop_answer,
+)
+
+
+def sql_reply(content):
+    return [TextMessage(source="excel_sql_specialist", content=content)]
+
+
+class ClassifyFailureTest(unittest.TestCase):
+    def test_failure_classes(self):
+        cases = {
+            "错误：无法读取Excel中的工作表 CostDataBase，详情：Worksheet named 'CostDataBase' not found": "sheet_missing",
+            "错误：function字段值 'ITT' 不在允许范围内，请重新解析用户输入生成新的sql语句后再调用本函数": "validation",
+            "查询过程中出现错误: (sqlite3.OperationalError) no such column: Amout": "sql_syntax",
+            "查询成功，但结果为空": "empty",
+            "错误：结果游标 abc 不存在，请重新执行 sqlQuery": "other",
+            "我需要先确认财年": "incomplete",
+        }
+        for content, kind in cases.items():
+            self.assertEqual(classify_failure(content), kind, content)
+
+    def test_success_is_not_a_failure(self):
+        self.assertIsNone(classify_failure("查询成功，共 12 行\n| Month | Amount |\nSQL_DONE"))
+
+
+class SQLRetryPolicyTest(unittest.TestCase):
+    def test_budget_per_class_then_stop(self):
+        policy = SQLRetryPolicy(budgets={"empty": 1, "validation": 2}, backoff={}, max_total=10)
+
+        async def run():
+            first = await policy(sql_reply("查询成功，但结果为空"))
+            validation = [await policy(sql_reply("错误：scenario字段值 'ACT' 不在允许范围内")) for _ in range(2)]
+            second = await policy(sql_reply("查询成功，但结果为空"))
+            return first, validation, second
+
+        before = retry_stats.stats().get("exhausted_empty", 0)
+        first, validation, second = asyncio.run(run())
+        self.assertIsNone(first)
+        self.assertEqual(validation, [None, None])
+        self.assertTrue(policy.terminated)
+        answer = retry_stop_answer(second.content)
+        self.assertTrue(answer.startswith(RETRY_FAILURE_PREFIX), answer)
+        self.assertIn("已尝试 4 次", answer)
+        self.assertEqual(retry_stats.stats()["exhausted_empty"], before + 1)
+
+        asyncio.run(policy.reset())
+        self.assertFalse(policy.terminated)
+
+    def test_total_budget_and_other_agents(self):
+        policy = SQLRetryPolicy(budgets={"sql_syntax": 5}, backoff={}, max_total=1)
+
+        async def run():
+            ignored = await policy([TextMessage(source="Manager", content="错误")])
+            first = await policy(sql_reply("查询过程中出现错误: syntax error"))
+            second = await policy(sql_reply("查询过程中出现错误: syntax error"))
+            return ignored, first, second
+
+        ignored, first, second = asyncio.run(run())
+        self.assertIsNone(ignored)
+        self.assertIsNone(first)
+        self.assertIsNotNone(second)
+
+    def test_backoff_doubles_and_is_traced(self):
+        policy = SQLRetryPolicy(budgets={"other": 2}, backoff={"other": 0.5}, max_total=10)
+        sleep = mock.AsyncMock()
+
+        async def run():
+            for _ in range(2):
+                await policy(sql_reply("错误：结果游标 abc 不存在"))
+
+        with mock.patch("modules.retry_policy.asyncio.sleep", sleep), request_trace("test") as trace:
+            asyncio.run(run())
+        self.assertEqual([c.args[0] for c in sleep.await_args_list], [0.5, 1.0])
+        self.assertEqual([s["name"] for s in trace.spans if s["stage"] == "sql_retry"], ["other", "other"])
+
+    def test_stop_answer_survives_or_termination(self):
+        condition = MaxMessageTermination(1) | SQLRetryPolicy(budgets={}, backoff={})
+        stop = asyncio.run(condition(sql_reply("查询成功，但结果为空")))
+        self.assertTrue(retry_stop_answer(stop.content).startswith(RETRY_FAILURE_PREFIX))
+        self.assertIsNone(retry_stop_answer("Maximum number of messages 20 reached"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import sys
+import asyncio
+import unittest
+from unittest import mock
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from chainlit.data.sql_alchemy import SQLAlchemyDataLayer
+from modules import session_manager
+from modules.session_manager import CachedSQLAlchemyDataLayer, SessionHistoryManager, ThreadHistoryCache
+
+
+def step(step_id, step_type, thread_id="t1", **fields):
+    return {"id": step_id, "type": step_type, "threadId": thread_id, **fields}
+
+
+class ThreadHistoryCacheTest(unittest.TestCase):
+    def test_ring_buffer_keeps_latest_steps(self):
+        cache = ThreadHistoryCache(max_steps=2)
+        cache.fill("t1", [step("a", "user_message", input="q1")])
+        cache.upsert_step(step("b", "assistant_message", output="a1"))
+        cache.upsert_step(step("c", "user_message", input="q2"))
+        self.assertEqual([s["id"] for s in cache.get("t1")], ["b", "c"])
+
+    def test_update_merges_and_unloaded_threads_are_ignored(self):
+        cache = ThreadHistoryCache()
+        cache.fill("t1", [step("a", "assistant_message", output="")])
+        cache.upsert_step(step("a", "assistant_message", output="完整回答"))
+        cache.upsert_step(step("x", "user_message", thread_id="t2", input="q"))
+        self.assertEqual(cache.get("t1")[0]["output"], "完整回答")
+        self.assertIsNone(cache.get("t2"))
+
+
+class LoadFromThreadTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = ThreadHistoryCache()
+        self.data_layer = CachedSQLAlchemyDataLayer(conninfo="sqlite+aiosqlite:///:memory:")
+        self.data_layer.get_thread = mock.AsyncMock(
+            return_value={"steps": [step("a", "user_message", input="q1"), step("b", "run", output="a1")]}
+        )
+        for patch in [
+            mock.patch.object(session_manager, "thread_history_cache", self.cache),
+            mock.patch.object(session_manager, "init_data_layer", return_value=self.data_layer),
+            mock.patch.object(SQLAlchemyDataLayer, "create_step", mock.AsyncMock()),
+        ]:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_thread_is_read_once_then_served_from_cache(self):
+        manager = SessionHistoryManager()
+        first = asyncio.run(manager.load_from_thread_id("t1"))
+        asyncio.run(self.data_layer.create_step(step("c", "user_message", input="q2")))
+        second = asyncio.run(manager.load_from_thread_id("t1"))
+
+        self.assertEqual(first, [{"role": "user", "content": "q1"}, {"role": "assistant", "content": "a1"}])
+        self.assertEqual(second[-1], {"role": "user", "content": "q2"})
+        self.data_layer.get_thread.assert_awaited_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
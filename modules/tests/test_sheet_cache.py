@@ -0,0 +1,74 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import pandas as pd
+from modules.sheet_cache import SheetCache
+from modules.executors import run_parse
+
+
+class SheetCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmpdir.name, "book.xlsx")
+        self._write({"A": pd.DataFrame({"x": [1, 2, 3]}), "B": pd.DataFrame({"y": ["a"]})})
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write(self, sheets):
+        with pd.ExcelWriter(self.file_path) as writer:
+            for name, df in sheets.items():
+                df.to_excel(writer, sheet_name=name, index=False)
+
+    def test_hit_and_miss_counters(self):
+        cache = SheetCache()
+        first = cache.get(self.file_path, "A")
+        second = cache.get(self.file_path, "A")
+        self.assertIs(first, second)
+        cache.get(self.file_path, "B")
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 2)
+        self.assertEqual(stats["entries"], 2)
+
+    def test_modified_file_is_reparsed(self):
+        cache = SheetCache()
+        self.assertEqual(len(cache.get(self.file_path, "A")), 3)
+        self._write({"A": pd.DataFrame({"x": [1]}), "B": pd.DataFrame({"y": ["a"]})})
+        # 保证 mtime 变化（部分文件系统时间精度较粗）
+        stat = os.stat(self.file_path)
+        os.utime(self.file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertEqual(len(cache.get(self.file_path, "A")), 1)
+        self.assertEqual(cache.stats()["entries"], 1)
+
+    def test_get_many_parses_missing_sheets_in_one_open(self):
+        cache = SheetCache()
+        cache.get(self.file_path, "A")
+        with mock.patch("modules.sheet_cache.run_parse", wraps=run_parse) as parse:
+            sheets = cache.get_many(self.file_path, ["A", "B"])
+        self.assertEqual(set(sheets), {"A", "B"})
+        parse.assert_called_once()
+        self.assertEqual(parse.call_args.args[2], ["B"])
+        self.assertIs(cache.get(self.file_path, "B"), sheets["B"])
+
+    def test_get_many_reports_missing_sheet(self):
+        with self.assertRaisesRegex(ValueError, "Worksheet named 'C' not found"):
+            SheetCache().get_many(self.file_path, ["A", "C"])
+
+    def test_lru_eviction_respects_entry_cap(self):
+        cache = SheetCache(max_entries=1)
+        cache.get(self.file_path, "A")
+        cache.get(self.file_path, "B")
+        stats = cache.stats()
+        self.assertEqual(stats["entries"], 1)
+        self.assertEqual(stats["evictions"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
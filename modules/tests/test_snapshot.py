@@ -0,0 +1,62 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import pandas as pd
+import modules.snapshot as snapshot
+from modules.snapshot import build_snapshot, load_snapshot_sheets
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmpdir.name, "book.xlsx")
+        self.snapshot_dir = os.path.join(self.tmpdir.name, "snapshots")
+        self.table = pd.DataFrame({"Month": ["Oct", "Nov"], "Amount": [1.5, -2.0], "CC": [412011, 413001]})
+        with pd.ExcelWriter(self.file_path) as writer:
+            self.table.to_excel(writer, sheet_name="Table7", index=False)
+            pd.DataFrame({"note": ["合计", 3]}).to_excel(writer, sheet_name="Report", index=False)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_round_trip_and_mixed_sheets_are_skipped(self):
+        manifest = build_snapshot(self.file_path, self.snapshot_dir)
+        self.assertEqual(list(manifest["sheets"]), ["Table7"])
+        self.assertIn("Report", manifest["skipped"])
+
+        loaded = load_snapshot_sheets(self.file_path, ["Table7", "Report"], self.snapshot_dir)
+        self.assertEqual(list(loaded), ["Table7"])
+        pd.testing.assert_frame_equal(loaded["Table7"], pd.read_excel(self.file_path, sheet_name="Table7"))
+
+    def test_modified_source_invalidates_snapshot(self):
+        build_snapshot(self.file_path, self.snapshot_dir)
+        with pd.ExcelWriter(self.file_path) as writer:
+            self.table.head(1).to_excel(writer, sheet_name="Table7", index=False)
+        self.assertEqual(load_snapshot_sheets(self.file_path, ["Table7"], self.snapshot_dir), {})
+
+    def test_stale_snapshot_is_hashed_once(self):
+        build_snapshot(self.file_path, self.snapshot_dir)
+        # 大小不变、内容改变：只能靠内容哈希判断过期
+        with open(self.file_path, "r+b") as f:
+            f.seek(100)
+            byte = f.read(1)
+            f.seek(100)
+            f.write(bytes([byte[0] ^ 0xFF]))
+        os.utime(self.file_path, ns=(1, 1))
+        with mock.patch.object(snapshot, "file_sha256", wraps=snapshot.file_sha256) as sha256:
+            for _ in range(3):
+                self.assertEqual(load_snapshot_sheets(self.file_path, ["Table7"], self.snapshot_dir), {})
+        self.assertEqual(sha256.call_count, 1)
+
+    def test_missing_snapshot_returns_nothing(self):
+        self.assertEqual(load_snapshot_sheets(self.file_path, ["Table7"], self.snapshot_dir), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
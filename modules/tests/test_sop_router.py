@@ -0,0 +1,179 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from autogen_agentchat.messages import TextMessage
+
+import modules.intent_rules as intent_rules
+from modules.cost_sop_routes import COST_SOP_MARKERS, COST_SOP_TRANSITIONS, COST_SOP_IGNORE_CASE
+from modules.metrics import request_trace
+from modules.sop_router import SOPRouter, Transition, START, END
+from modules.sop_team_routes import SOP_MARKERS, SOP_TRANSITIONS
+
+
+def legacy_cost_route(messages):
+    """改为表驱动之前 select_next_speaker 的子串判断（不含规则分类），用于对照"""
+    if not messages:
+        return "Manager"
+    speaker, content = messages[-1].source, messages[-1].content
+    if speaker == "user":
+        return "Manager"
+    if speaker == "Manager":
+        for agent in ["intention_analyst", "excel_sql_specialist", "multi_domain_analyst", "data_analyst"]:
+            if f"转交给 {agent}" in content or f"转交给 **{agent}**" in content:
+                return agent
+        return None
+    if speaker == "intention_analyst":
+        return "excel_sql_specialist" if "CATEGORY:成本分析-需数据" in content else "Manager"
+    if speaker == "excel_sql_specialist":
+        has_success = "SQL_DONE" in content or "查询成功" in content
+        has_error = "错误" in content or "error" in content.lower() or "查询过程中出现错误" in content
+        is_empty = "结果为空" in content or "返回 0 行" in content
+        return "Manager" if has_success and not has_error and not is_empty else "excel_sql_specialist"
+    return None
+
+
+class CostRouterTest(unittest.TestCase):
+    CASES = [
+        ("user", "FY25 IT 费用是多少"),
+        ("Manager", "转交给 intention_analyst 进行意图识别"),
+        ("Manager", "请 转交给 **excel_sql_specialist** 查询"),
+        ("Manager", "转交给 multi_domain_analyst"),
+        ("Manager", "转交给 data_analyst 做分析"),
+        ("Manager", "FINAL:RETURN\n结果\nTERMINATE"),
+        ("Manager", "我再想想"),
+        ("intention_analyst", "CATEGORY:成本分析-需数据"),
+        ("intention_analyst", "CATEGORY:成本分析-不需数据"),
+        ("excel_sql_specialist", "查询成功，共 3 行 SQL_DONE"),
+        ("excel_sql_specialist", "SQL_DONE 但查询过程中出现错误"),
+        ("excel_sql_specialist", "SQL_DONE Error: no such column"),
+        ("excel_sql_specialist", "查询成功，结果为空"),
+        ("excel_sql_specialist", "查询成功，返回 0 行"),
+        ("excel_sql_specialist", "正在生成SQL"),
+        ("data_analyst", "DATA_ANALYSIS_DONE"),
+    ]
+
+    def setUp(self):
+        self.router = SOPRouter("test", COST_SOP_MARKERS, COST_SOP_TRANSITIONS, ignore_case=COST_SOP_IGNORE_CASE)
+
+    def test_matches_legacy_substring_rules(self):
+        router = self.router
+        with mock.patch.object(intent_rules, "INTENT_RULES_ENABLED", False):
+            self.assertEqual(router([]), legacy_cost_route([]))
+            for source, content in self.CASES:
+                messages = [TextMessage(source=source, content=content)]
+                self.assertEqual(router(messages), legacy_cost_route(messages), (source, content))
+
+    def test_transitions_are_counted_and_traced(self):
+        router = self.router
+        with mock.patch.object(intent_rules, "INTENT_RULES_ENABLED", False), request_trace("test") as trace:
+            router([TextMessage(source="user", content="FY25 IT 费用")])
+            router([TextMessage(source="intention_analyst", content="CATEGORY:成本分析-需数据")])
+            router([TextMessage(source="Manager", content="我再想想")])
+        self.assertEqual(
+            [s["name"] for s in trace.spans if s["stage"] == "selector"],
+            ["user→Manager", "intention_analyst→excel_sql_specialist", "Manager→model"],
+        )
+        self.assertEqual(router.stats()["user→Manager"]["count"], 1)
+
+
+def legacy_sop_team_route(messages):
+    """改为表驱动之前 sop_team.sop_selector_func 的子串判断，用于对照"""
+    if not messages:
+        return "Manager"
+    speaker, content = messages[-1].source, messages[-1].content
+    if speaker == "user":
+        return "Manager"
+    if speaker == "Manager":
+        for agent in ["intention_analyst", "sql_specialist", "multi_domain_analyst", "data_analyst", "report_analyst"]:
+            if f"转交给 {agent}" in content or f"转交给 **{agent}**" in content:
+                return agent
+        return None
+    if speaker == "intention_analyst" and "CATEGORY:" in content:
+        return "Manager"
+    if speaker == "sql_specialist" and "SQL_DONE" in content:
+        return "Manager"
+    if speaker == "report_analyst":
+        if "SCORING_DONE" in content:
+            return "Manager"
+        if "需要补充" in content and ("数据" in content or "信息" in content):
+            return "Manager"
+    if speaker == "data_analyst":
+        if "ANALYSIS_DONE" in content or "需要补充数据" in content or "所需补充数据" in content:
+            return "Manager"
+    if speaker == "multi_domain_analyst" and "CONSULTATION_DONE" in content:
+        return "Manager"
+    return None
+
+
+class SOPTeamRouterTest(unittest.TestCase):
+    CASES = [
+        ("user", "帮我看一下SDQ供应商评分"),
+        ("Manager", "转交给 intention_analyst"),
+        ("Manager", "转交给 **sql_specialist** 查询数据"),
+        ("Manager", "转交给 multi_domain_analyst"),
+        ("Manager", "转交给 data_analyst"),
+        ("Manager", "请 转交给 **report_analyst** 打分"),
+        ("Manager", "FINAL:RETURN 结果 TERMINATE"),
+        ("Manager", "继续"),
+        ("intention_analyst", "CATEGORY:供应商评分"),
+        ("intention_analyst", "无法判断"),
+        ("sql_specialist", "SQL_DONE"),
+        ("sql_specialist", "查询失败"),
+        ("report_analyst", "SCORING_DONE"),
+        ("report_analyst", "需要补充数据"),
+        ("report_analyst", "还需要补充停机时间的信息"),
+        ("report_analyst", "需要补充说明"),
+        ("report_analyst", "数据不完整"),
+        ("data_analyst", "DATA_ANALYSIS_DONE"),
+        ("data_analyst", "所需补充数据：停机记录"),
+        ("data_analyst", "需要补充信息"),
+        ("multi_domain_analyst", "CONSULTATION_DONE"),
+        ("multi_domain_analyst", "咨询中"),
+    ]
+
+    def test_matches_legacy_substring_rules(self):
+        router = SOPRouter("sop_team", SOP_MARKERS, SOP_TRANSITIONS)
+        self.assertEqual(router([]), legacy_sop_team_route([]))
+        for source, content in self.CASES:
+            messages = [TextMessage(source=source, content=content)]
+            self.assertEqual(router(messages), legacy_sop_team_route(messages), (source, content))
+
+
+class SOPRouterTest(unittest.TestCase):
+    def test_nested_markers_are_all_reported(self):
+        router = SOPRouter(
+            "test",
+            {"need_more": ["需要补充"], "need_more_data": ["需要补充数据"], "data_word": ["数据", "信息"]},
+            [],
+        )
+        self.assertEqual(router.markers_in("需要补充数据"), {"need_more", "need_more_data", "data_word"})
+        self.assertEqual(router.markers_in("需要补充相关信息"), {"need_more", "data_word"})
+        self.assertEqual(router.markers_in("无关内容"), set())
+
+    def test_rules_are_tried_in_order_with_guard(self):
+        guard = mock.Mock(return_value=False)
+        router = SOPRouter(
+            "test",
+            {"done": ["DONE"], "retry": ["RETRY"]},
+            [
+                Transition(START, "a"),
+                Transition("a", "b", guard=guard),
+                Transition("a", "a", require=("retry",)),
+                Transition("a", END, require=("done",), exclude=("retry",)),
+            ],
+        )
+        self.assertEqual(router([]), "a")
+        self.assertEqual(router([TextMessage(source="a", content="DONE")]), END)
+        self.assertEqual(router([TextMessage(source="a", content="done, RETRY")]), "a")
+        self.assertIsNone(router([TextMessage(source="a", content="进行中")]))
+        self.assertEqual(guard.call_count, 3)
+        self.assertEqual(router.stats()["a→model"]["count"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
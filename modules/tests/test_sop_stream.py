@@ -0,0 +1,111 @@
+import os
+import sys
+import asyncio
+import unittest
+from unittest import mock
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from autogen_agentchat.base import TaskResult
+from autogen_agentchat.messages import (
+    ModelClientStreamingChunkEvent,
+    TextMessage,
+    ToolCallExecutionEvent,
+    ToolCallRequestEvent,
+)
+from autogen_core import FunctionCall
+from autogen_core.models import FunctionExecutionResult, RequestUsage
+
+import modules.CostAnalyst as CostAnalyst
+import modules.metrics as metrics
+from modules.metrics import request_trace
+from modules.team_pool import TeamPool
+
+FINAL = "FINAL:RETURN\nFY25 IT 分摊到 CT 的实际金额为 -7,847,136.17\nTERMINATE"
+
+
+class FakeStreamingTeam:
+    """按 SelectorGroupChat.run_stream 的顺序产出事件"""
+
+    def __init__(self):
+        self.events = [
+            TextMessage(source="user", content="FY25 IT 分摊到 CT 多少？"),
+            TextMessage(source="Manager", content="转交给 excel_sql_specialist"),
+            ToolCallRequestEvent(
+                source="excel_sql_specialist",
+                content=[FunctionCall(id="1", name="sqlQuery", arguments="{}")],
+                models_usage=RequestUsage(prompt_tokens=200, completion_tokens=40),
+            ),
+            ToolCallExecutionEvent(
+                source="excel_sql_specialist",
+                content=[FunctionExecutionResult(call_id="1", name="sqlQuery", content="查询成功", is_error=False)],
+            ),
+            TextMessage(source="excel_sql_specialist", content="查询成功 SQL_DONE"),
+        ]
+        self.events += [ModelClientStreamingChunkEvent(source="Manager", content=FINAL[i : i + 7]) for i in range(0, len(FINAL), 7)]
+        final_message = TextMessage(source="Manager", content=FINAL)
+        self.events += [final_message, TaskResult(messages=self.events[:] + [final_message])]
+
+    async def run_stream(self, task):
+        for event in self.events:
+            yield event
+
+    async def reset(self):
+        pass
+
+
+class RunStreamTest(unittest.TestCase):
+    def test_answer_tokens_and_progress_are_forwarded(self):
+        tokens, progress = [], []
+
+        async def on_token(text):
+            tokens.append(text)
+
+        async def on_progress(text):
+            progress.append(text)
+
+        async def scenario():
+            with mock.patch.object(metrics, "SOP_METRICS_JSONL", ""), request_trace("test") as trace:
+                answer = await CostAnalyst.run_Cost_sop_team("任务", on_token=on_token, on_progress=on_progress)
+            return answer, trace
+
+        with mock.patch.object(CostAnalyst, "cost_team_pool", TeamPool(FakeStreamingTeam)):
+            answer, trace = asyncio.run(scenario())
+
+        self.assertEqual(answer, "FY25 IT 分摊到 CT 的实际金额为 -7,847,136.17")
+        self.assertEqual("".join(tokens).strip(), answer)
+        self.assertGreater(len(tokens), 1)
+        self.assertEqual(len(progress), 2)
+        self.assertIn("sqlQuery", progress[0])
+        agent_turns = [(s["name"], s.get("prompt_tokens")) for s in trace.spans if s["stage"] == "agent"]
+        self.assertEqual(
+            agent_turns, [("Manager", 0), ("excel_sql_specialist", 200), ("Manager", 0)]
+        )
+
+
+class LazyAgentTest(unittest.TestCase):
+    def test_module_helpers_resolve_lazy_agents(self):
+        # 模块内的调试函数经 _agent 取得懒加载的智能体，与外部属性访问得到同一个实例
+        agent = CostAnalyst._agent("excel_sql_specialist_agent")
+        self.assertIs(agent, CostAnalyst.excel_sql_specialist_agent)
+        self.assertIs(CostAnalyst._agent("excel_sql_specialist_agent"), agent)
+
+
+class ModelConfigTest(unittest.TestCase):
+    def test_config_is_checked_on_first_client(self):
+        # 导入模块不校验配置，缺失时在首次创建模型客户端时报错
+        with mock.patch.object(CostAnalyst, "_model_client", None), mock.patch.object(
+            CostAnalyst, "sf_api_key", None
+        ):
+            with self.assertRaises(RuntimeError):
+                CostAnalyst.get_model_client()
+            self.assertIsNone(CostAnalyst._model_client)
+
+    def test_base_url_is_normalized(self):
+        with mock.patch.object(CostAnalyst, "sf_base_url", " https://api.siliconflow.cn/ "):
+            self.assertEqual(CostAnalyst._siliconflow_base_url(), "https://api.siliconflow.cn/v1")
+
+
+if __name__ == "__main__":
+    unittest.main()
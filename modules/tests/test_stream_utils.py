@@ -0,0 +1,69 @@
+import os
+import sys
+import asyncio
+import unittest
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from modules.stream_utils import FinalAnswerStream, split_chunks, stream_text
+
+TEXT = "2025财年 IT 分摊到 CT 的实际金额为 -7,847,136.17。数据来源：Allocation 表。\n\n如需明细请继续提问！"
+
+
+class RecordingMessage:
+    def __init__(self):
+        self.tokens = []
+
+    async def stream_token(self, token):
+        self.tokens.append(token)
+
+
+class SplitChunksTest(unittest.TestCase):
+    def test_chunks_reassemble_to_original(self):
+        for mode in ("sentence", "word", "bytes"):
+            for max_bytes in (1, 7, 40, 4096):
+                chunks = split_chunks(TEXT, mode, max_bytes)
+                self.assertEqual("".join(chunks), TEXT, (mode, max_bytes))
+
+    def test_chunks_respect_byte_limit(self):
+        for mode in ("sentence", "word", "bytes"):
+            for chunk in split_chunks(TEXT, mode, 20):
+                self.assertLessEqual(len(chunk.encode("utf-8")), 20)
+
+    def test_sentence_mode_breaks_after_punctuation(self):
+        chunks = split_chunks(TEXT, "sentence", 70)
+        self.assertEqual(chunks[0], "2025财年 IT 分摊到 CT 的实际金额为 -7,847,136.17。")
+
+    def test_long_answer_fits_in_few_frames(self):
+        report = TEXT * 40
+        self.assertLessEqual(len(split_chunks(report, "sentence", 2048)), 4)
+
+
+class StreamTextTest(unittest.TestCase):
+    def test_streams_without_delay_by_default(self):
+        message = RecordingMessage()
+        count = asyncio.run(stream_text(message, TEXT, max_bytes=4096))
+        self.assertEqual(count, 1)
+        self.assertEqual(message.tokens, [TEXT])
+
+
+class FinalAnswerStreamTest(unittest.TestCase):
+    def feed_all(self, tokens):
+        stream = FinalAnswerStream()
+        return "".join(stream.feed(token) for token in tokens) + stream.flush()
+
+    def test_only_text_after_marker_is_forwarded(self):
+        tokens = ["数据已核对。FIN", "AL:RE", "TURN\n", "IT 分摊金额为 ", "-7,847,136.17", "\nTERM", "INATE"]
+        self.assertEqual(self.feed_all(tokens), "IT 分摊金额为 -7,847,136.17\n")
+
+    def test_markers_split_across_tokens_are_removed(self):
+        tokens = ["FINAL:RETURN 合计 100", "\\", "n来源 Allocation ANALY", "SIS_DONE", " TERMINATE 多余内容"]
+        self.assertEqual(self.feed_all(tokens), "合计 100\n来源 Allocation  ")
+
+    def test_message_without_marker_yields_nothing(self):
+        self.assertEqual(self.feed_all(["转交给 excel_sql_specialist", "，请查询 FY25 数据"]), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import sys
+import asyncio
+import unittest
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from modules.team_pool import TeamPool
+
+
+class FakeTeam:
+    def __init__(self, fail_reset=False):
+        self.resets = 0
+        self.fail_reset = fail_reset
+
+    async def reset(self):
+        if self.fail_reset:
+            raise RuntimeError("team is running")
+        self.resets += 1
+
+
+class TeamPoolTest(unittest.TestCase):
+    def test_teams_are_reset_and_reused(self):
+        pool = TeamPool(FakeTeam, max_idle=2, max_concurrency=2)
+
+        async def scenario():
+            async with pool.team() as first:
+                pass
+            async with pool.team() as second:
+                pass
+            return first, second
+
+        first, second = asyncio.run(scenario())
+        self.assertIs(first, second)
+        self.assertEqual(first.resets, 2)
+        self.assertEqual(pool.stats()["created"], 1)
+
+    def test_concurrency_is_bounded_and_queueing_is_measured(self):
+        pool = TeamPool(FakeTeam, max_idle=4, max_concurrency=2)
+        peak = 0
+
+        async def request():
+            nonlocal peak
+            async with pool.team() as team:
+                peak = max(peak, pool.in_flight)
+                await asyncio.sleep(0.01)
+                return team
+
+        async def scenario():
+            return await asyncio.gather(*(request() for _ in range(6)))
+
+        teams = asyncio.run(scenario())
+        stats = pool.stats()
+        self.assertEqual(peak, 2)
+        self.assertEqual(len(set(map(id, teams))), 2)
+        self.assertEqual(stats["max_queued"], 4)
+        self.assertEqual(stats["completed"], 6)
+        self.assertGreater(stats["max_wait_seconds"], 0)
+
+    def test_team_that_cannot_reset_is_discarded(self):
+        pool = TeamPool(lambda: FakeTeam(fail_reset=True))
+
+        async def scenario():
+            async with pool.team():
+                pass
+
+        asyncio.run(scenario())
+        self.assertEqual(pool.stats()["idle"], 0)
+        self.assertEqual(pool.stats()["discarded"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import sys
+import tempfile
+import unittest
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from modules.tool_memo import ToolMemo, memoize_tool
+
+
+class MemoizeToolTest(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmpdir.name, "book.xlsx")
+        with open(self.file_path, "wb") as f:
+            f.write(b"v1")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _tool(self, memo):
+        def lookup(file_path: str, query: str, sql_table_names: list) -> str:
+            self.calls.append(query)
+            return "错误：表不存在" if "missing" in query else f"查询成功: {query}"
+
+        return memoize_tool(lookup, memo)
+
+    def test_identical_calls_run_once(self):
+        memo = ToolMemo()
+        tool = self._tool(memo)
+        tool(self.file_path, "SELECT 1", ["A", "B"])
+        result = tool(file_path=self.file_path, query="SELECT 1", sql_table_names=["A", "B"])
+        self.assertEqual(result, "查询成功: SELECT 1")
+        self.assertEqual(self.calls, ["SELECT 1"])
+        self.assertEqual(memo.stats()["hits"], 1)
+
+    def test_errors_are_not_cached(self):
+        tool = self._tool(ToolMemo())
+        tool(self.file_path, "SELECT missing", [])
+        tool(self.file_path, "SELECT missing", [])
+        self.assertEqual(len(self.calls), 2)
+
+    def test_workbook_change_invalidates(self):
+        tool = self._tool(ToolMemo())
+        tool(self.file_path, "SELECT 1", [])
+        with open(self.file_path, "wb") as f:
+            f.write(b"version 2")
+        tool(self.file_path, "SELECT 1", [])
+        self.assertEqual(len(self.calls), 2)
+
+    def test_keeps_name_and_signature_for_function_tool(self):
+        tool = self._tool(ToolMemo())
+        self.assertEqual(tool.__name__, "lookup")
+        self.assertEqual(list(tool.__annotations__), ["file_path", "query", "sql_table_names", "return"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import re
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "cl100k_base")
+
+# 启发式切分：中日韩字符、数字串、字母串、空白串、其他符号
+_HEURISTIC_PATTERN = re.compile(
+    r"(?P<cjk>[\u3000-\u303f\u3400-\u9fff\uff00-\uffef])|(?P<digits>\d+)|(?P<letters>[A-Za-z]+)|(?P<space>\s+)|(?P<other>.)",
+    re.DOTALL,
+)
+
+_encoding = None
+_encoding_failed = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """懒加载 tiktoken 编码；tiktoken 未安装或编码文件无法下载（离线环境）时返回 None，只尝试一次"""
+    global _encoding, _encoding_failed
+    if _encoding is not None or _encoding_failed:
+        return _encoding
+    with _encoding_lock:
+        if _encoding is None and not _encoding_failed:
+            try:
+                import tiktoken
+
+                _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+            except Exception as e:
+                _encoding_failed = True
+                logger.info(f"tiktoken 编码 {TOKEN_ENCODING} 不可用，使用启发式估算 token 数: {e}")
+    return _encoding
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    无分词器时的 token 估算：中文每字 1 个，数字每 3 位 1 个，英文每 4 个字母 1 个，
+    每段连续空白与每个符号各 1 个。与 BPE 分词结果同量级，用于比较不同格式的相对大小。
+    """
+    count = 0
+    for match in _HEURISTIC_PATTERN.finditer(text):
+        kind = match.lastgroup
+        length = match.end() - match.start()
+        if kind == "digits":
+            count += -(-length // 3)
+        elif kind == "letters":
+            count += -(-length // 4)
+        else:
+            count += 1
+    return count
+
+
+def count_tokens(text: str) -> int:
+    """文本的 token 数：优先使用 tiktoken，不可用时使用启发式估算"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return estimate_tokens(text)
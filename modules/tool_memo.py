@@ -0,0 +1,131 @@
+import os
+import copy
+import json
+import inspect
+import logging
+import threading
+import functools
+from collections import OrderedDict
+import pandas as pd
+from modules.sheet_cache import sheet_cache
+from modules.domain_index import COST_WORKBOOK_PATH
+from modules.metrics import record_cache_hit
+
+logger = logging.getLogger(__name__)
+
+# 这些前缀的字符串结果视为失败，不写入缓存（可能是临时性错误，重试时应重新执行）
+ERROR_PREFIXES = ("错误", "查询过程中出现错误", "文件验证失败")
+
+
+class ToolMemo:
+    """
+    工具调用结果缓存：以 (工具名, 规范化参数, 工作簿版本) 为键，LRU 淘汰。
+    团队重试时智能体经常以完全相同的参数重复调用工具，命中后直接返回上次的结果。
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple):
+        """命中时返回 (True, 结果副本)，否则返回 (False, None)"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            result = self._entries[key]
+        return True, _copy_result(result)
+
+    def put(self, key: tuple, result) -> None:
+        with self._lock:
+            self._entries[key] = _copy_result(result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+def _copy_result(result):
+    """缓存中的结果与调用方互不共享，避免调用方原地修改污染缓存"""
+    if isinstance(result, pd.DataFrame):
+        return result.copy()
+    if isinstance(result, (dict, list)):
+        return copy.deepcopy(result)
+    return result
+
+
+def _is_cacheable(result) -> bool:
+    if isinstance(result, str):
+        return not result.startswith(ERROR_PREFIXES)
+    if isinstance(result, dict):
+        return "error" not in result
+    if isinstance(result, pd.DataFrame):
+        return "monthly_cost" not in result or not result["monthly_cost"].isna().all()
+    return True
+
+
+def canonical_args(args: tuple, kwargs: dict, signature) -> str | None:
+    """把调用参数绑定到函数签名后序列化为有序 JSON；参数无法序列化时返回 None（不缓存）"""
+    try:
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return json.dumps(bound.arguments, sort_keys=True, ensure_ascii=False)
+    except (TypeError, ValueError):
+        return None
+
+
+def memoize_tool(func, memo: "ToolMemo" = None):
+    """
+    包装同步工具函数，保留原函数名、签名与注解（FunctionTool 据此生成参数模型）。
+    工作簿版本取自调用参数中的 file_path，没有该参数时使用成本工作簿。
+    """
+    memo = memo or tool_memo
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not TOOL_MEMO_ENABLED:
+            return func(*args, **kwargs)
+        args_key = canonical_args(args, kwargs, signature)
+        try:
+            arguments = signature.bind_partial(*args, **kwargs).arguments
+            version = sheet_cache.file_version(arguments.get("file_path", COST_WORKBOOK_PATH))
+        except (OSError, TypeError):
+            version = None
+        if args_key is None or version is None:
+            return func(*args, **kwargs)
+
+        key = (func.__name__, args_key, version)
+        hit, result = memo.get(key)
+        if hit:
+            record_cache_hit("tool_memo")
+            logger.info(f"工具调用命中缓存: {func.__name__}，{memo.stats()}")
+            return result
+        result = func(*args, **kwargs)
+        if _is_cacheable(result):
+            memo.put(key, result)
+        return result
+
+    return wrapper
+
+
+TOOL_MEMO_ENABLED = os.getenv("TOOL_MEMO_ENABLED", "1") == "1"
+tool_memo = ToolMemo(max_entries=int(os.getenv("TOOL_MEMO_MAX_ENTRIES", "512")))
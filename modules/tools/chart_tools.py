@@ -5,6 +5,7 @@ import math
 from typing import List, Dict, Any, Optional
 from autogen_core.tools import FunctionTool
 import json
+from modules.tool_memo import memoize_tool
 
 REQUIRED_FIELDS = {
     "pie": ["labels", "values"],  # 占位，仅用于存在性快速判断；实际逻辑在后续单独处理
@@ -101,7 +102,7 @@ def build_chart_from_type(
 
 # 将工具改为接受 'type' 参数，避免使用者误传 'chart_type'
 chart_tool = FunctionTool(
-    build_chart_from_type,
+    memoize_tool(build_chart_from_type),
     description="生成规范图表片段。使用参数: type(图表类型), title, 以及对应所需字段。支持: pie, bar, line, stacked_bar, grouped_bar, bar_line, histogram。返回带[CHART_START]/[CHART_END]包装的JSON字符串。错误时返回包含error的dict。务必始终返回一个包装JSON。"
 )
 
@@ -0,0 +1,491 @@
+import os
+import logging
+from typing import Any, Annotated
+import pandas as pd
+from pandasql import sqldf
+from autogen_agentchat import TRACE_LOGGER_NAME
+from modules.sheet_cache import sheet_cache
+from modules.cost_db import get_mirror
+from modules.domain_index import get_domain_index
+from modules.result_cursor import result_cursors
+from modules.result_format import serialize_rows
+
+sop_logger = logging.getLogger(f"{TRACE_LOGGER_NAME}.Cost_sop_team")
+
+# sqlQuery 返回给模型的最大行数，超出部分通过结果游标分页获取
+SQL_RESULT_PREVIEW_ROWS = int(os.getenv("SQL_RESULT_PREVIEW_ROWS", "100"))
+
+
+# ------------------------------------Data Query Tools------------------------------------#
+def read_excel(file_path: str, sheet_name: str) -> pd.DataFrame:
+    try:
+        return pd.read_excel(file_path, sheet_name=sheet_name)
+    except Exception as e:
+        raise ValueError(f"读取Excel文件失败: {str(e)}")
+
+
+def extract_table_name(query: str) -> list:
+    """
+    辅助函数：提取SQL查询中的所有表名（简化实现，适配常规SELECT查询）
+    注：如需更精准的表名提取，可引入SQL解析库（如sqlparse）
+    """
+    query_upper = query.strip().upper()
+    # 移除SELECT ... FROM 前缀，提取表名相关部分
+    from_index = query_upper.find("FROM")
+    if from_index == -1:
+        return []
+    from_content = query_upper[from_index + 4 :]
+
+    # 移除WHERE/GROUP BY/ORDER BY等后续子句
+    for keyword in ["WHERE", "GROUP BY", "ORDER BY", "JOIN", "LEFT JOIN", "RIGHT JOIN"]:
+        kw_index = from_content.find(keyword)
+        if kw_index != -1:
+            from_content = from_content[:kw_index]
+
+    # 提取表名（去重、去除空值和多余空格）
+    table_names = [tbl.strip() for tbl in from_content.split(",") if tbl.strip()]
+    return list(dict.fromkeys(table_names))  # 去重并保留原有顺序
+
+
+def _query_page(file_path: str, query: str, sql_table_names: list, offset: int, limit: int):
+    """
+    执行查询并返回 (offset 起 limit 行的 DataFrame, 总行数)；工作表不存在时返回错误信息字符串。
+    优先在工作簿的 SQLite 镜像上流式执行（只读连接池，源文件变化时自动重建），镜像不可用时回退到 pandasql。
+    """
+    try:
+        mirror = get_mirror(file_path)
+        mirror.ensure_fresh()
+    except Exception as mirror_e:
+        logging.warning(f"SQLite镜像不可用，回退到pandasql：{str(mirror_e)}")
+        mirror = None
+
+    if mirror is not None:
+        for table_name in sql_table_names:
+            if table_name not in mirror.tables:
+                return f"错误：无法读取Excel中的工作表 {table_name}，详情：Worksheet named '{table_name}' not found"
+        return mirror.query_page(query, offset, limit)
+
+    # 回退：工作表名 = SQL中的表名，所有工作表在一次打开工作簿时经进程级缓存读取
+    try:
+        query_env = sheet_cache.get_many(file_path, sql_table_names)
+    except Exception as sheet_e:
+        return f"错误：无法读取Excel中的工作表，详情：{str(sheet_e)}"
+    for table_name, df in query_env.items():
+        logging.debug(f"成功加载工作表 {table_name} 为DataFrame，数据行数：{len(df)}")
+    logging.debug(f"工作表缓存统计: {sheet_cache.stats()}")
+    result_df = sqldf(query, query_env)
+    return result_df.iloc[offset : offset + limit].reset_index(drop=True), len(result_df)
+
+
+def sqlQuery(file_path: str, query: str, sql_table_names: list) -> str:
+    """
+    执行SQL多表联合查询并返回结果（动态识别表名，支持多工作表映射，取消sheet_name参数）
+    args:
+    file_path (str): Excel文件路径（包含所有待查询工作表，工作表名需与SQL中的表名一致）
+    query (str): SQL查询语句（支持多表联合查询，表名需与Excel工作表名一一对应）
+    sql_table_names (list): SQL查询中涉及的所有表名列表
+    returns: str: 查询结果或错误信息
+    """
+    try:
+        # 1. 危险操作校验：禁止破坏性SQL操作
+        query_upper = query.strip().upper()
+        dangerous_patterns = [
+            "DROP",
+            "DELETE",
+            "INSERT",
+            "UPDATE",
+            "ALTER",
+            "EXEC",
+            "TRUNCATE",
+            "MERGE",
+            "REPLACE",
+        ]
+        for pattern in dangerous_patterns:
+            if pattern in query_upper:
+                return f"错误：查询中包含不允许的操作: {pattern}"
+
+        # 2. 提取SQL中的所有表名（支持多表）
+        # sql_table_names = extract_table_name(query)
+        # if not sql_table_names:
+        #     return "错误：未从SQL查询中提取到有效表名"
+        # logging.debug(f"从SQL中提取到的表名列表: {sql_table_names}")
+
+        # 3. 执行查询，只取前 SQL_RESULT_PREVIEW_ROWS 行，其余行仅计数
+        result = _query_page(file_path, query, sql_table_names, 0, SQL_RESULT_PREVIEW_ROWS)
+        if isinstance(result, str):
+            return result
+        result_df, total_rows = result
+
+        # 4. 结果格式化返回：超出预览行数时附带字段与结果游标，后续按需分页/汇总
+        if total_rows == 0:
+            return "查询成功，但结果为空"
+        text, shown_rows = serialize_rows(result_df)
+        if total_rows <= shown_rows:
+            return f"查询成功，返回 {total_rows} 行数据:\n" + text
+        cursor_id = result_cursors.register(
+            file_path, query, sql_table_names, list(result_df.columns), total_rows
+        )
+        return (
+            f"查询成功，共 {total_rows} 行数据，以下仅展示前 {shown_rows} 行"
+            f"（字段：{', '.join(map(str, result_df.columns))}；结果游标：{cursor_id}；下一页 offset={shown_rows}，"
+            f"可调用 fetch_result_page 获取后续行，或调用 aggregate_result 汇总）:\n"
+            + text
+        )
+
+    except Exception as e:
+        error_msg = f"查询过程中出现错误: {str(e)}"
+        logging.error(f"调试信息：{error_msg}")
+        return error_msg
+
+
+def fetch_result_page(cursor_id: str, offset: int) -> str:
+    """
+    按结果游标从第 offset 行（从 0 开始）起获取 sqlQuery 结果，每次最多 SQL_RESULT_PREVIEW_ROWS 行
+    args:
+    cursor_id (str): sqlQuery 返回的结果游标
+    offset (int): 起始行，取 sqlQuery 或上一次 fetch_result_page 返回的“下一页 offset”
+    （输出超出预算时实际展示的行数可能少于每页行数，按返回的 offset 续取不会漏行）
+    returns: str: 当页数据或错误信息
+    """
+    cursor = result_cursors.get(cursor_id)
+    if cursor is None:
+        return f"错误：结果游标 {cursor_id} 不存在，请重新执行 sqlQuery"
+    if offset < 0 or offset >= cursor["total_rows"]:
+        return f"错误：offset {offset} 超出范围，共 {cursor['total_rows']} 行（offset 从 0 开始）"
+    try:
+        result = _query_page(
+            cursor["file_path"], cursor["query"], cursor["sql_table_names"], offset, SQL_RESULT_PREVIEW_ROWS
+        )
+        if isinstance(result, str):
+            return result
+        page_df, total_rows = result
+        text, shown_rows = serialize_rows(page_df)
+        next_offset = offset + shown_rows
+        next_hint = f"下一页 offset={next_offset}" if next_offset < total_rows else "已是最后一页"
+        return f"第 {offset + 1}~{next_offset} 行（共 {total_rows} 行，{next_hint}）:\n" + text
+    except Exception as e:
+        error_msg = f"查询过程中出现错误: {str(e)}"
+        logging.error(f"调试信息：{error_msg}")
+        return error_msg
+
+
+def aggregate_result(cursor_id: str, select_expr: str, group_by: str = "") -> str:
+    """
+    在结果游标对应的完整结果上做汇总，等价于 SELECT select_expr FROM (原查询) [GROUP BY group_by]
+    args:
+    cursor_id (str): sqlQuery 返回的结果游标
+    select_expr (str): 汇总表达式，如 "Month, SUM(amount) AS amount"
+    group_by (str): 分组字段，如 "Month"，可为空
+    returns: str: 汇总结果或错误信息
+    """
+    cursor = result_cursors.get(cursor_id)
+    if cursor is None:
+        return f"错误：结果游标 {cursor_id} 不存在，请重新执行 sqlQuery"
+    query = f"SELECT {select_expr} FROM ({cursor['query']}) AS result"
+    if group_by.strip():
+        query += f" GROUP BY {group_by}"
+    return sqlQuery(cursor["file_path"], query, cursor["sql_table_names"])
+
+
+validate_field_range_list = [
+    {
+        "field_name": "cc",
+        "target_sheet": "CC Mapping",
+        "target_field": "CostCenterNumber",
+        # 同表中的名称字段：被拒绝的 cc 可能是业务线名称，据此给出对应编码
+        "name_field": "Business Line",
+    },
+    {
+        "field_name": "key",
+        "target_sheet": "CostDataBase",
+        "target_field": "Key",
+    },
+    {
+        "field_name": "func",
+        "target_sheet": "CostDataBase",
+        "target_field": "Function",
+    },
+]
+
+
+def validate_field_range(
+    field_value: str, target_sheet: str, target_field: str
+) -> bool:
+    """校验字段值是否在指定范围内（取值域按工作簿版本预先构建）"""
+    try:
+        domain = get_domain_index().domain(target_sheet, target_field)
+        return domain.contains(str(field_value))
+    except Exception as e:
+        logging.error(f"校验字段范围时出错: {str(e)}")
+        return False
+
+
+def suggest_field_values(
+    field_value: str, target_sheet: str, target_field: str, limit: int = 5
+) -> list:
+    """为未通过校验的字段值给出候选：依次为忽略大小写精确匹配、前缀匹配、三元组模糊匹配"""
+    try:
+        domain = get_domain_index().domain(target_sheet, target_field)
+    except Exception as e:
+        logging.error(f"获取字段候选值时出错: {str(e)}")
+        return []
+    value = str(field_value).strip()
+    candidates = domain.casefold_matches(value)
+    if value:
+        candidates += domain.prefix_matches(value, limit=limit)
+        candidates += [candidate for candidate, _ in domain.similar(value, limit=limit)]
+    return list(dict.fromkeys(candidates))[:limit]
+
+
+def suggest_by_name(
+    field_value: str, target_sheet: str, name_field: str, target_field: str, limit: int = 3
+) -> str:
+    """被拒绝的值若与同表名称字段（如 CC Mapping 的 Business Line）相近，返回名称及其对应编码的提示"""
+    try:
+        index = get_domain_index()
+        names = index.domain(target_sheet, name_field)
+        name_to_values = index.mapping(target_sheet, name_field, target_field)
+    except Exception as e:
+        logging.error(f"按名称匹配候选值时出错: {str(e)}")
+        return ""
+    hints = []
+    for name, _ in names.similar(str(field_value), limit=limit, min_score=0.5):
+        values = name_to_values.get(name.casefold(), [])
+        shown = ", ".join(values[:5]) + (f" 等 {len(values)} 个" if len(values) > 5 else "")
+        hints.append(f"{name_field} '{name}' 对应 {target_field}：{shown}")
+    return "；".join(hints)
+
+
+def generate_cost_rate_sql(
+    year: Annotated[str, "年份条件（如 'FY25'、'FY26'）"],
+    scenario: Annotated[str, "场景条件（如 'Actual'、'Budget1'）"],
+    cost_db_table: Annotated[str, "主表名，默认 'CostDataBase'"] = "CostDataBase",
+    table7: Annotated[str, "关联表名，默认 'Table7'"] = "Table7",
+    func: Annotated[str, "Function筛选条件，默认 ''"] = "",
+    key: Annotated[str, "Key筛选条件，默认 ''"] = "",
+    cc: Annotated[str, "CC筛选条件，默认 ''"] = "",
+    bl: Annotated[str, "BL筛选条件，默认 ''"] = "",
+) -> str:
+    """
+    动态生成成本费率查询SQL语句，提取核心可变参数，支持默认值简化调用
+    cc字段必须是CC Mapping表中的成本中心编码/名称 如果不是则需要先查询CC Mapping表获取对应的编码/名称再传入该函数
+    key字段必须是CostDataBase表中的Key值 如果不是则需要先查询CostDataBase表获取对应的Key值再传入该函数
+    不得忽略传的空值参数
+    Args:
+        year (str): 年份条件（如 'FY25'、'FY26'）
+        scenario (str): 场景条件（如 'Actual'、'Budget1'）
+        cost_db_table (str, optional): 主表名，默认 "CostDataBase"
+        table7 (str, optional): 关联表名，默认 "Table7"
+        func (str, optional): Function筛选条件，默认 ""
+        key (str, optional): Key筛选条件，默认 ""
+        cc (str, optional): CC筛选条件，默认 ""
+        bl (str, optional): BL筛选条件，默认 ""
+    Returns:
+        str: 生成的完整SQL查询字符串（直接可执行，无参数元组）
+    """
+    # 1. 构建待校验字段清单（字段名: 字段值），统一处理
+    field_validate_map = [("cc", cc), ("key", key), ("func", func)]
+
+    # 2. 循环遍历执行校验，消除重复代码
+    for field_name, field_value in field_validate_map:
+        if not field_value:
+            continue  # 跳过空值，无需校验
+        # 查找对应配置
+        field_config = [
+            item
+            for item in validate_field_range_list
+            if item["field_name"] == field_name
+        ]
+        if not field_config:
+            return f"错误：未找到{field_name}字段的校验配置"
+        # 提取配置参数
+        target_sheet = field_config[0]["target_sheet"]
+        target_field = field_config[0]["target_field"]
+        # 执行校验并返回错误
+        if not validate_field_range(field_value, target_sheet, target_field):
+            error_msg = f"错误：{field_name}字段值 '{field_value}' 不在允许范围内，请重新解析用户输入生成新的sql语句后再调用本函数"
+            candidates = suggest_field_values(field_value, target_sheet, target_field)
+            if candidates:
+                error_msg += f"。候选值：{', '.join(candidates)}"
+            name_field = field_config[0].get("name_field")
+            if name_field:
+                name_hint = suggest_by_name(
+                    field_value, target_sheet, name_field, target_field
+                )
+                if name_hint:
+                    error_msg += f"。该值接近{target_sheet}中的名称（{name_hint}），如需按业务线筛选请改用 bl 参数"
+            return error_msg
+
+    # 3. 关键修复：安全嵌入参数，避免语法错误（解决no such column问题）
+    # 步骤1：对字符串参数进行单引号转义（防止参数内的单引号闭合SQL字符串）
+    def escape_single_quote(s: str) -> str:
+        return str(s).replace("'", "''")  # SQLite3中用两个单引号转义一个单引号
+
+    # 转义所有需要嵌入SQL的字符串参数
+    escaped_year = escape_single_quote(year)
+    escaped_scenario = escape_single_quote(scenario)
+    escaped_func = escape_single_quote(func)
+    escaped_key = escape_single_quote(key)
+    escaped_cc = escape_single_quote(cc)
+    escaped_cost_db_table = escape_single_quote(cost_db_table)
+    escaped_table7 = escape_single_quote(table7)
+    escaped_bl = escape_single_quote(bl)
+    # 3. 核心修改：动态构建WHERE子句（仅拼接非空字段的条件）
+    # 步骤3.1：初始化条件列表（存储合法的查询条件）
+    where_conditions = []
+
+    # 步骤3.2：逐个判断字段值是否存在，存在则添加对应条件
+    # 规则：字段值非空（非None、非空字符串）才拼接
+    if escaped_year:
+        where_conditions.append(f"cdb.\"Year\" = '{escaped_year}'")
+    if escaped_scenario:
+        where_conditions.append(f"cdb.\"Scenario\" = '{escaped_scenario}'")
+    if escaped_func:
+        where_conditions.append(f"cdb.\"Function\" = '{escaped_func}'")
+    if escaped_key:
+        where_conditions.append(f"cdb.\"Key\" = '{escaped_key}'")
+    if escaped_cc:
+        where_conditions.append(f"t7.\"cc\" = '{escaped_cc}'")
+    if escaped_bl:
+        where_conditions.append(f"t7.\"bl\" = '{escaped_bl}'")
+
+    # 步骤3.3：拼接WHERE子句（无合法条件时，不添加WHERE关键字）
+    where_clause = ""
+    if where_conditions:
+        # 用" AND "连接所有条件，组成完整WHERE子句
+        where_clause = "WHERE " + " AND ".join(where_conditions)
+
+    # 4. 拼接完整SQL语句（嵌入动态生成的WHERE子句）
+    sql = f"""
+    SELECT
+        cdb.`Month`,
+        SUM(COALESCE(t7.`RateNo`, 0)) AS `rate`,
+        cdb.`Amount` AS `amount`
+    FROM
+        {escaped_cost_db_table} cdb  
+    LEFT JOIN
+        {escaped_table7} t7  
+    ON
+        cdb.`Month` = t7.`Month`
+        AND cdb.`Year` = t7.`Year`
+        AND cdb.`Scenario` = t7.`Scenario`
+        AND cdb.`Key` = t7.`Key`
+    {where_clause}
+    GROUP BY
+        cdb.`Month`,
+        cdb.`Amount`
+    ORDER BY
+        cdb.`Month`;
+    """
+
+    # 4. 返回格式化后的完整SQL字符串（去除多余空白，直接可执行）
+    return sql.strip()
+
+
+def calculate_monthly_cost_table(df: Any) -> Any:
+    """
+    批量计算整张数据表的每月费用（入参和返回值均为Any，内部完成类型转换与校验）
+    Args:
+        df (Any): 输入数据（支持DataFrame、字典、Excel/CSV文件路径）
+    Returns:
+        Any: 计算结果（成功返回带monthly_cost列的DataFrame，失败返回对应错误信息/空DataFrame）
+    """
+    # 第一步：内部类型转换与校验，将任意输入转为合法的pandas DataFrame
+    try:
+        # 分支1：输入已是DataFrame，直接使用（先复制避免修改原数据）
+        if isinstance(df, pd.DataFrame):
+            df_input = df.copy()
+            logging.info("输入数据为DataFrame类型，直接复制使用")
+
+        # 分支2：输入是字典（符合DataFrame构造格式），转为DataFrame
+        elif isinstance(df, dict):
+            df_input = pd.DataFrame(df)
+            logging.info("输入数据为字典类型，已转换为DataFrame")
+
+        # 分支3：输入是字符串（判断为文件路径，支持Excel/CSV）
+        elif isinstance(df, str):
+            if df.endswith((".xlsx", ".xls")):
+                df_input = pd.read_excel(df)
+                logging.info(f"输入数据为Excel文件路径，已读取：{df}")
+            elif df.endswith(".csv"):
+                df_input = pd.read_csv(df, encoding="utf-8")
+                logging.info(f"输入数据为CSV文件路径，已读取：{df}")
+            else:
+                raise ValueError("字符串输入非支持的文件格式（仅支持.xlsx/.xls/.csv）")
+
+        # 分支4：不支持的输入类型，抛出异常
+        else:
+            raise TypeError(
+                f"不支持的输入类型：{type(df).__name__}，支持类型：pd.DataFrame、dict、Excel/CSV文件路径字符串"
+            )
+
+    except Exception as e:
+        error_msg = f"类型转换失败：{str(e)}"
+        logging.error(error_msg)
+        # 返回统一格式的空DataFrame，保证后续处理兼容性
+        return pd.DataFrame(columns=["month", "amount", "rate", "monthly_cost"])
+    df_input.columns = [col.lower() for col in df_input.columns]
+
+    # 第二步：校验DataFrame是否包含必要列
+    required_columns = ["month", "amount", "rate"]
+    if not all(col in df_input.columns for col in required_columns):
+        missing_cols = [col for col in required_columns if col not in df_input.columns]
+        error_msg = f"输入数据缺少必要列：{', '.join(missing_cols)}，必须包含 {', '.join(required_columns)}"
+        logging.error(error_msg)
+        # 补充缺失列并设为NaN，返回完整结构的DataFrame
+        for col in missing_cols:
+            df_input[col] = pd.NA
+        df_input["monthly_cost"] = pd.NA
+        return df_input
+
+    # 第三步：批量计算每月费用（包含数值类型转换，保证计算准确性）
+    sop_logger.info(f"开始批量计算每月费用{df_input}")
+    try:
+        # 转换金额和分摊比例为数值类型，非数值数据自动转为NaN
+        df_input["amount"] = pd.to_numeric(df_input["amount"], errors="coerce")
+        df_input["rate"] = pd.to_numeric(df_input["rate"], errors="coerce")
+
+        # 计算每月费用，保留2位小数（与原函数逻辑一致）
+        df_input["monthly_cost"] = (df_input["amount"] * df_input["rate"]).round(2)
+
+        logging.info("整张表每月费用计算完成")
+        return df_input
+
+    except Exception as e:
+        error_msg = f"批量计算每月费用时出错：{str(e)}"
+        logging.error(error_msg)
+        # 异常时返回包含原始数据且monthly_cost列为NaN的DataFrame，保证格式统一
+        df_input["monthly_cost"] = pd.NA
+        return df_input
+
+
+def caculate_yearly_cost(df: Any) -> float:
+    """
+    计算年度费用总额
+    Args:
+        df (Any): 包含monthly_cost列的DataFrame
+    Returns:
+        float: 年度费用总额
+    """
+    try:
+        yearly_cost = df["monthly_cost"].sum()
+        return yearly_cost
+    except Exception as e:
+        logging.error(f"计算年度费用总额时出错: {str(e)}")
+        return 0.0
+
+
+def dbConnect(file_path: str) -> str:
+    try:
+        if not os.path.exists(file_path):
+            return f"错误：文件 {file_path} 不存在"
+
+        if not file_path.lower().endswith((".xls", ".xlsx")):
+            return "错误：仅支持Excel文件（.xls, .xlsx）"
+
+        with open(file_path, "rb") as f:
+            f.read(4)
+
+        return "Excel文件验证成功"
+    except Exception as e:
+        return f"文件验证失败: {str(e)}"